@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+benchmarks.metrics_memory
+=========================
+Benchmark memory and construction time of metric objects.
+
+Compares metric classes with __slots__ to equivalent classes with
+an instance __dict__ (as metrics were defined before), and creating
+metrics by the validating constructor to _from_trusted().
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+from __future__ import print_function
+
+import sys
+import gc
+import tracemalloc
+from os.path import dirname
+from timeit import repeat
+
+project_dir = dirname(dirname(__file__))
+if project_dir not in sys.path:
+    sys.path.insert(0, project_dir)
+
+from statsdmetrics import Counter, Timer, Gauge, GaugeDelta, Set
+
+INSTANCES = 100000
+
+
+class DictCounter(Counter):
+    """Counter with an instance __dict__, since subclasses without __slots__ have one"""
+
+
+class DictTimer(Timer):
+    pass
+
+
+class DictGauge(Gauge):
+    pass
+
+
+class DictGaugeDelta(GaugeDelta):
+    pass
+
+
+class DictSet(Set):
+    pass
+
+
+CLASSES = (
+    (DictCounter, Counter, ("event.login", 1, 0.5)),
+    (DictTimer, Timer, ("db.query", 12.5, 1)),
+    (DictGauge, Gauge, ("memory.used", 1024, 1)),
+    (DictGaugeDelta, GaugeDelta, ("memory.used", -128, 1)),
+    (DictSet, Set, ("users", "12345", 1)),
+)
+
+
+def memory_per_instance(metric_class, args, instances=INSTANCES):
+    """Return the average bytes allocated per instance of metric_class"""
+
+    gc.collect()
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    metrics = [metric_class._from_trusted(*args) for _ in range(instances)]
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # exclude the list holding the metrics
+    return (end - start - sys.getsizeof(metrics)) / float(len(metrics))
+
+
+def construction_time(function, args, number=INSTANCES):
+    """Return the best time in nanoseconds to call function(*args)"""
+
+    return min(repeat(lambda: function(*args), number=number, repeat=5)) / number * 1e9
+
+
+def main():
+    print("{:<12} {:>14} {:>14} {:>16} {:>18}".format(
+        "metric", "dict (bytes)", "slots (bytes)", "__init__ (ns)", "_from_trusted (ns)"))
+    for dict_class, slots_class, args in CLASSES:
+        print("{:<12} {:>14,.0f} {:>14,.0f} {:>16,.0f} {:>18,.0f}".format(
+            slots_class.__name__,
+            memory_per_instance(dict_class, args),
+            memory_per_instance(slots_class, args),
+            construction_time(slots_class, args),
+            construction_time(slots_class._from_trusted, args),
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+"""
+benchmarks.server_load
+======================
+Load test the statsd server, with sender processes blasting UDP datagrams at it.
+
+The server runs in its own process (a single core), and sender processes send
+datagrams of newline delimited metrics (counters, timers, gauges and sets)
+as fast as they can for the duration. The number of metrics the server aggregated
+is compared to the number of sent metrics, UDP datagrams the server could not
+keep up with are dropped by the kernel.
+
+Senders can be paced to a total rate of metrics per second, to find the rate
+the server keeps up with. On machines with few cores the senders compete with
+the server for the CPU, so unpaced results are lower than the server can handle.
+
+With more than one worker, the multi process server is benchmarked, running
+worker processes that share the port by SO_REUSEPORT. Each sender uses its own
+socket, so use at least as many senders as workers to spread the load.
+
+The aggregator is benchmarked alone too (parsing and aggregating payloads in memory),
+which is the upper bound of the server throughput.
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+from __future__ import print_function
+
+import sys
+import socket
+from time import sleep
+from argparse import ArgumentParser
+from multiprocessing import Process, Pipe
+from os.path import dirname
+from threading import Thread
+
+try:
+    from time import perf_counter
+except ImportError:
+    from time import time as perf_counter  # type: ignore
+
+project_dir = dirname(dirname(__file__))
+if project_dir not in sys.path:
+    sys.path.insert(0, project_dir)
+
+from statsdmetrics.server import Server, AbstractBackend
+from statsdmetrics.server.aggregation import Aggregator
+from statsdmetrics.server.multiprocess import MultiProcessServer
+
+DEFAULT_SENDERS = 2
+DEFAULT_DURATION = 5
+DEFAULT_LINES = 20
+AGGREGATOR_PAYLOADS = 5000
+
+
+def create_payload(lines=DEFAULT_LINES, offset=0):
+    """Return a datagram of lines of mixed metrics"""
+
+    requests = []
+    for index in range(lines):
+        kind = (index + offset) % 5
+        if kind == 0:
+            requests.append("api.requests.{}:1|c".format(index % 10))
+        elif kind == 1:
+            requests.append("api.latency.{}:{}|ms".format(index % 10, index * 3 % 500))
+        elif kind == 2:
+            requests.append("memory.used:{}|g".format(1024 + index))
+        elif kind == 3:
+            requests.append("api.users:{}|s".format(offset * lines + index))
+        else:
+            requests.append("api.errors:1|c|@0.1|#endpoint:/api/users")
+    return "\n".join(requests).encode()
+
+
+class CountingBackend(AbstractBackend):
+    """Count the aggregated metrics of all the flushes"""
+
+    def __init__(self):
+        self.metrics = 0
+
+    def flush(self, summary):
+        self.metrics += summary.metrics
+
+
+def run_server(connection, workers=1):
+    backend = CountingBackend()
+    if workers > 1:
+        server = MultiProcessServer(backends=[backend], port=0, flush_interval=1000, workers=workers)
+        server.start()
+    else:
+        server = Server(backends=[backend], port=0, flush_interval=1000)
+    connection.send(server.address)
+
+    def wait_for_shutdown():
+        connection.recv()
+        server.shutdown()
+
+    waiter = Thread(target=wait_for_shutdown)
+    waiter.daemon = True
+    waiter.start()
+    server.serve_forever()
+    bad_lines = server.bad_lines if workers > 1 else server.aggregator.bad_lines
+    connection.send((backend.metrics, server.datagrams, bad_lines))
+    server.close()
+
+
+def run_sender(address, duration, lines, index, rate, connection):
+    payload = create_payload(lines, index)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sendto = sock.sendto
+    datagrams = 0
+    start = perf_counter()
+    deadline = start + duration
+    while perf_counter() < deadline:
+        for _ in range(100):
+            try:
+                sendto(payload, address)
+            except socket.error:
+                continue
+            datagrams += 1
+        if rate:
+            # pace the sender to send rate metrics per second
+            ahead = datagrams * lines / float(rate) - (perf_counter() - start)
+            if ahead > 0:
+                sleep(ahead)
+    connection.send(datagrams)
+    sock.close()
+
+
+def benchmark_aggregator(lines=DEFAULT_LINES, payloads=AGGREGATOR_PAYLOADS):
+    """Return the number of metrics per second the aggregator parses and aggregates"""
+
+    aggregator = Aggregator()
+    batch = [create_payload(lines, index) for index in range(payloads)]
+    start = perf_counter()
+    for payload in batch:
+        aggregator.add_payload(payload)
+    aggregator.flush()
+    return lines * payloads / (perf_counter() - start)
+
+
+def benchmark_server(senders=DEFAULT_SENDERS, duration=DEFAULT_DURATION, lines=DEFAULT_LINES, rate=0,
+                     workers=1):
+    """Return a tuple of (sent metrics, aggregated metrics, bad lines).
+
+    Senders send rate metrics per second in total, or as fast as they can if rate is 0.
+    """
+
+    server_connection, child_connection = Pipe()
+    server = Process(target=run_server, args=(child_connection, workers))
+    server.start()
+    address = server_connection.recv()
+    processes = []
+    for index in range(senders):
+        parent, child = Pipe()
+        process = Process(target=run_sender,
+                          args=(address, duration, lines, index, rate / float(senders), child))
+        process.start()
+        processes.append((process, parent))
+    datagrams = 0
+    for process, connection in processes:
+        datagrams += connection.recv()
+        process.join()
+    server_connection.send("shutdown")
+    aggregated, _, bad_lines = server_connection.recv()
+    server.join()
+    return datagrams * lines, aggregated, bad_lines
+
+
+def main(args=None):
+    parser = ArgumentParser(description="Load test the statsd server")
+    parser.add_argument("-s", "--senders", type=int, default=DEFAULT_SENDERS,
+                        help="number of sender processes")
+    parser.add_argument("-d", "--duration", type=float, default=DEFAULT_DURATION,
+                        help="seconds to send metrics")
+    parser.add_argument("-l", "--lines", type=int, default=DEFAULT_LINES,
+                        help="metrics per datagram")
+    parser.add_argument("-r", "--rate", type=int, default=0,
+                        help="metrics per second sent by all the senders, 0 for as fast as possible")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="number of server worker processes sharing the port by SO_REUSEPORT")
+    options = parser.parse_args(args)
+
+    print("{:<34} {:>18,.0f} metrics/s".format("Aggregator.add_payload", benchmark_aggregator(options.lines)))
+    sent, aggregated, bad_lines = benchmark_server(
+        options.senders, options.duration, options.lines, options.rate, options.workers)
+    print("{:<34} {:>18,.0f} metrics/s".format("senders", sent / options.duration))
+    print("{:<34} {:>18,.0f} metrics/s".format("Server", aggregated / options.duration))
+    print("{:<34} {:>17.1f}%".format("dropped", 100.0 * (sent - aggregated) / sent if sent else 0))
+    if bad_lines:
+        print("{:<34} {:>18,}".format("bad lines", bad_lines))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,378 @@
+#!/usr/bin/env python
+"""
+benchmarks.suite
+================
+Benchmark the hot paths of metrics and clients.
+
+Clients send metrics to local UDP/TCP sinks, so the suite runs offline.
+Results are written as JSON, and can be compared with the results of
+a previous run (i.e of the last release) to catch regressions.
+
+    python benchmarks/suite.py --output current.json
+    python benchmarks/suite.py --compare baseline.json --threshold 0.1
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+from __future__ import print_function
+
+import sys
+import gc
+import json
+import socket
+import platform
+from argparse import ArgumentParser
+from datetime import datetime
+from os.path import dirname
+from threading import Thread
+
+try:
+    from time import perf_counter
+except ImportError:
+    from time import time as perf_counter  # type: ignore
+
+project_dir = dirname(dirname(__file__))
+if project_dir not in sys.path:
+    sys.path.insert(0, project_dir)
+
+import statsdmetrics
+from statsdmetrics import (Counter, Timer, Gauge, GaugeDelta, Set,
+                           normalize_metric_name, parse_metric_from_request, parse_metrics)
+from statsdmetrics.client import Client, BatchClient
+from statsdmetrics.client.tcp import TCPClient, TCPBatchClient, NonBlockingTCPClient
+from statsdmetrics.client.sampling import CountingSampler
+from statsdmetrics.client.encoding import TagSet
+from statsdmetrics.sketches import DDSketch, HyperLogLog
+from statsdmetrics.server.aggregation import TimerSamples
+
+DEFAULT_REPEAT = 5
+DEFAULT_DURATION = 0.2
+DEFAULT_THRESHOLD = 0.1
+FLUSH_BATCH_SIZES = (64, 512, 1432, 8192)
+FLUSH_METRICS = 1000
+PARSE_LINES = 1000
+
+
+class UDPSink(object):
+    """Local UDP server that receives and discards requests"""
+
+    def __init__(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.bind(("127.0.0.1", 0))
+        self._socket.settimeout(0.2)
+        self.port = self._socket.getsockname()[1]
+        self._running = True
+        self._thread = Thread(target=self._receive)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _receive(self):
+        while self._running:
+            try:
+                self._socket.recv(65536)
+            except socket.timeout:
+                pass
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        self._socket.close()
+
+
+class TCPSink(object):
+    """Local TCP server that accepts connections and discards requests"""
+
+    def __init__(self):
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.bind(("127.0.0.1", 0))
+        self._socket.listen(8)
+        self._socket.settimeout(0.2)
+        self.port = self._socket.getsockname()[1]
+        self._running = True
+        self._thread = Thread(target=self._accept)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _accept(self):
+        while self._running:
+            try:
+                connection, _ = self._socket.accept()
+            except socket.timeout:
+                continue
+            thread = Thread(target=self._receive, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def _receive(self, connection):
+        try:
+            while connection.recv(65536):
+                pass
+        finally:
+            connection.close()
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        self._socket.close()
+
+
+def measure(operation, operations_per_call=1, repeat=DEFAULT_REPEAT, duration=DEFAULT_DURATION):
+    """Time calls to the operation, and return stats in nanoseconds per operation.
+
+    The number of calls in each round is calibrated so a round
+    takes about duration seconds.
+    """
+
+    calls = 1
+    while True:
+        elapsed = _time_calls(operation, calls)
+        if elapsed >= duration / 10:
+            break
+        calls *= 10
+    calls = max(1, int(calls * duration / elapsed))
+    timings = sorted(_time_calls(operation, calls) for _ in range(repeat))
+    operations = float(calls * operations_per_call)
+    per_operation = [timing / operations * 1e9 for timing in timings]
+    return {
+        "operations": int(operations),
+        "repeat": repeat,
+        "min_ns": per_operation[0],
+        "median_ns": per_operation[len(per_operation) // 2],
+        "max_ns": per_operation[-1],
+        "ops_per_sec": 1e9 / per_operation[0],
+    }
+
+
+def _time_calls(operation, calls):
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = perf_counter()
+        for _ in range(calls):
+            operation()
+        return perf_counter() - start
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def metric_benchmarks():
+    """Yield tuples of (name, operation, operations per call) for metrics"""
+
+    yield "normalize_metric_name.valid", lambda: normalize_metric_name("page.views.total"), 1
+    yield "normalize_metric_name.ascii", lambda: normalize_metric_name("page.views count/total"), 1
+    yield "normalize_metric_name.unicode", lambda: normalize_metric_name(u"påge.views count"), 1
+
+    metrics = (
+        Counter("page.views", 3, 0.5),
+        Timer("db.query", 128),
+        Gauge("memory.used", 102400.5),
+        GaugeDelta("memory.used", -128),
+        Set("users", "12345"),
+    )
+    for metric in metrics:
+        yield "{}.to_request".format(metric.__class__.__name__), metric.to_request, 1
+
+    for metric in metrics:
+        yield ("parse_metric_from_request.{}".format(metric.__class__.__name__),
+               _bind(parse_metric_from_request, metric.to_request()), 1)
+
+    counters = b"\n".join("page.views.{}:1|c".format(index).encode() for index in range(PARSE_LINES))
+    yield "parse_metrics.Counter", lambda: _consume(parse_metrics(counters)), PARSE_LINES
+    mixed = b"".join(metric.to_request().encode() + b"\n" for metric in metrics) * (PARSE_LINES // len(metrics))
+    yield "parse_metrics.mixed", lambda: _consume(parse_metrics(mixed)), PARSE_LINES
+    tagged = b"\n".join("page.views:1|c|#env:prod,host:web{}".format(index % 10).encode()
+                        for index in range(PARSE_LINES))
+    yield "parse_metrics.tagged", lambda: _consume(parse_metrics(tagged)), PARSE_LINES
+
+    yield "TimerSamples.add", _bind(TimerSamples().add, 128), 1
+    yield "DDSketch.add", _bind(DDSketch().add, 128), 1
+    sketch = DDSketch()
+    sketch.update(range(1, 10001))
+    yield "DDSketch.stats", sketch.stats, 1
+    yield "HyperLogLog.add", _bind(HyperLogLog().add, "12345"), 1
+    unique_counter = HyperLogLog()
+    unique_counter.update(range(100000))
+    yield "HyperLogLog.count", unique_counter.count, 1
+
+
+def client_benchmarks(udp_sink, tcp_sink):
+    """Yield tuples of (name, operation, operations per call) for clients"""
+
+    client = Client("127.0.0.1", udp_sink.port)
+    yield "Client.increment", lambda: client.increment("page.views"), 1
+    yield "Client.timing", lambda: client.timing("db.query", 128, 0.5), 1
+    client_counter_handle = client.counter_handle("page.views")
+    yield "CounterHandle.inc[Client]", lambda: client_counter_handle.inc(), 1
+
+    tcp_client = TCPClient("127.0.0.1", tcp_sink.port)
+    yield "TCPClient.increment", lambda: tcp_client.increment("page.views"), 1
+    non_blocking_tcp_client = NonBlockingTCPClient("127.0.0.1", tcp_sink.port)
+    yield "NonBlockingTCPClient.increment", lambda: non_blocking_tcp_client.increment("page.views"), 1
+
+    batch_client = BatchClient("127.0.0.1", udp_sink.port)
+    request = b"page.views:1|c"
+
+    def batch_request():
+        # clear batches once in a while, so memory does not grow in long runs
+        batch_client._request(request)
+        if len(batch_client._batches) > 1000:
+            batch_client.clear()
+
+    yield "BatchClient._request", batch_request, 1
+    yield "BatchClient.increment", lambda: batch_client.increment("page.views"), 1
+    counter_handle = batch_client.counter_handle("page.views")
+
+    def batch_counter_handle_inc():
+        counter_handle.inc(3)
+        if len(batch_client._batches) > 1000:
+            batch_client.clear()
+
+    def batch_increment():
+        batch_client.increment("page.views", 3)
+        if len(batch_client._batches) > 1000:
+            batch_client.clear()
+
+    yield "BatchClient.increment[count]", batch_increment, 1
+    yield "CounterHandle.inc[BatchClient]", batch_counter_handle_inc, 1
+    yield "BatchClient.increment[rate]", lambda: batch_client.increment("page.views", rate=0.1), 1
+    tagged_batch_client = BatchClient("127.0.0.1", udp_sink.port)
+    tagged_batch_client.tags = {"env": "prod", "host": "web1"}
+    tag_set = TagSet({"endpoint": "/api/users", "status": 200})
+    tag_dict = {"endpoint": "/api/users", "status": 200}
+
+    def tagged_batch_increment(tags):
+        def increment():
+            tagged_batch_client.increment("page.views", tags=tags)
+            if len(tagged_batch_client._batches) > 1000:
+                tagged_batch_client.clear()
+        return increment
+
+    yield "BatchClient.increment[constant tags]", tagged_batch_increment(None), 1
+    yield "BatchClient.increment[TagSet]", tagged_batch_increment(tag_set), 1
+    yield "BatchClient.increment[dict tags]", tagged_batch_increment(tag_dict), 1
+    counting_batch_client = BatchClient("127.0.0.1", udp_sink.port)
+    counting_batch_client.sampler = CountingSampler()
+
+    def counting_batch_increment():
+        counting_batch_client.increment("page.views", rate=0.1)
+        if len(counting_batch_client._batches) > 1000:
+            counting_batch_client.clear()
+
+    yield "BatchClient.increment[rate,CountingSampler]", counting_batch_increment, 1
+
+    for size in FLUSH_BATCH_SIZES:
+        yield ("BatchClient.flush[{}]".format(size),
+               _buffer_and_flush(BatchClient("127.0.0.1", udp_sink.port, batch_size=size)),
+               FLUSH_METRICS)
+        yield ("TCPBatchClient.flush[{}]".format(size),
+               _buffer_and_flush(TCPBatchClient("127.0.0.1", tcp_sink.port, batch_size=size)),
+               FLUSH_METRICS)
+
+
+def _consume(iterator):
+    for _ in iterator:
+        pass
+
+
+def _bind(function, *args):
+    return lambda: function(*args)
+
+
+def _buffer_and_flush(client, metrics=FLUSH_METRICS):
+    requests = ["page.views.{}:1|c".format(index % 50).encode() for index in range(metrics)]
+
+    def buffer_and_flush():
+        for request in requests:
+            client._request(request)
+        client.flush()
+
+    return buffer_and_flush
+
+
+def run(repeat=DEFAULT_REPEAT, duration=DEFAULT_DURATION, name_filter=None, verbose=False):
+    """Run the benchmarks and return the results as a dict"""
+
+    results = {}
+    udp_sink = UDPSink()
+    tcp_sink = TCPSink()
+    try:
+        benchmarks = list(metric_benchmarks())
+        benchmarks.extend(client_benchmarks(udp_sink, tcp_sink))
+        for name, operation, operations_per_call in benchmarks:
+            if name_filter and name_filter not in name:
+                continue
+            results[name] = measure(operation, operations_per_call, repeat, duration)
+            if verbose:
+                print("{:<40} {:>12,.1f} ns {:>14,.0f} ops/s".format(
+                    name, results[name]["min_ns"], results[name]["ops_per_sec"]),
+                    file=sys.stderr)
+    finally:
+        udp_sink.close()
+        tcp_sink.close()
+    return {
+        "metadata": {
+            "statsdmetrics": statsdmetrics.__version__,
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "date": datetime.utcnow().isoformat(),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Return a list of (name, baseline ns, current ns, change) of benchmarks
+    that are slower than the baseline by more than threshold ratio.
+    """
+
+    regressions = []
+    for name, result in sorted(current["results"].items()):
+        if name not in baseline["results"]:
+            continue
+        baseline_ns = baseline["results"][name]["min_ns"]
+        change = result["min_ns"] / baseline_ns - 1
+        if change > threshold:
+            regressions.append((name, baseline_ns, result["min_ns"], change))
+    return regressions
+
+
+def main(args=None):
+    parser = ArgumentParser(description="Benchmark statsdmetrics hot paths")
+    parser.add_argument("-o", "--output", help="write JSON results to the file, instead of stdout")
+    parser.add_argument("-r", "--repeat", type=int, default=DEFAULT_REPEAT,
+                        help="number of rounds to run each benchmark")
+    parser.add_argument("-d", "--duration", type=float, default=DEFAULT_DURATION,
+                        help="approximate duration of each round in seconds")
+    parser.add_argument("-f", "--filter", help="only run benchmarks with names containing this")
+    parser.add_argument("-c", "--compare", help="JSON results of a baseline run to compare with")
+    parser.add_argument("-t", "--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="ratio of slow down to report as regression when comparing")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not print progress")
+    options = parser.parse_args(args)
+
+    results = run(options.repeat, options.duration, options.filter, not options.quiet)
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, "w") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+    if options.compare:
+        with open(options.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(baseline, results, options.threshold)
+        for name, baseline_ns, current_ns, change in regressions:
+            print("regression: {} {:,.1f} ns -> {:,.1f} ns (+{:.0%})".format(
+                name, baseline_ns, current_ns, change), file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+benchmarks.thread_contention
+============================
+Benchmark batch clients shared between multiple threads.
+
+Compares the thread safe batch client (buffer per thread) with
+a batch client serialized by a global lock, sending metrics
+to a local UDP socket.
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+from __future__ import print_function
+
+import sys
+import socket
+from os.path import dirname
+from threading import Thread, Event, Lock
+from time import time
+
+project_dir = dirname(dirname(__file__))
+if project_dir not in sys.path:
+    sys.path.insert(0, project_dir)
+
+from statsdmetrics.client import BatchClient, ThreadSafeBatchClient
+
+THREADS = (1, 4, 16, 64)
+METRICS_PER_THREAD = 20000
+
+
+class LockedBatchClient(BatchClient):
+    """Batch client serialized by a global lock"""
+
+    def __init__(self, *args, **kwargs):
+        BatchClient.__init__(self, *args, **kwargs)
+        self._lock = Lock()
+
+    def _request(self, data):
+        with self._lock:
+            BatchClient._request(self, data)
+
+    def _flush(self):
+        with self._lock:
+            BatchClient._flush(self)
+
+
+def create_sink():
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))
+    return sink
+
+
+def run(client_class, threads, metrics_per_thread=METRICS_PER_THREAD):
+    """Return the number of metrics per second sent by all threads"""
+
+    sink = create_sink()
+    client = client_class("127.0.0.1", sink.getsockname()[1])
+    start = Event()
+    stop = Event()
+
+    def send_metrics():
+        start.wait()
+        increment = client.increment
+        for _ in range(metrics_per_thread):
+            increment("benchmark.event")
+
+    def flush_periodically():
+        while not stop.wait(0.01):
+            client.flush()
+
+    workers = [Thread(target=send_metrics) for _ in range(threads)]
+    flusher = Thread(target=flush_periodically)
+    for worker in workers:
+        worker.start()
+    flusher.start()
+    start_time = time()
+    start.set()
+    for worker in workers:
+        worker.join()
+    stop.set()
+    flusher.join()
+    client.flush()
+    duration = time() - start_time
+    sink.close()
+    return threads * metrics_per_thread / duration
+
+
+def main():
+    print("{:>8} {:>22} {:>22}".format("threads", "global lock (m/s)", "thread buffers (m/s)"))
+    for threads in THREADS:
+        locked = run(LockedBatchClient, threads)
+        thread_safe = run(ThreadSafeBatchClient, threads)
+        print("{:>8} {:>22,.0f} {:>22,.0f}".format(threads, locked, thread_safe))
+
+
+if __name__ == '__main__':
+    main()
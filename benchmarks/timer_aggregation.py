@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""
+benchmarks.timer_aggregation
+============================
+Benchmark summarizing timers of large flush windows, by the Python aggregator
+and the NumPy vectorized aggregator (and its pure Python fallback).
+
+Samples are added to the timers of each aggregator, then the time to summarize
+all the timers (count, sum, min, max, mean and percentiles) on flush is measured.
+
+    python benchmarks/timer_aggregation.py --samples 1000000 --names 1000
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+from __future__ import print_function
+
+import sys
+import random
+from argparse import ArgumentParser
+from os.path import dirname
+
+try:
+    from time import perf_counter
+except ImportError:
+    from time import time as perf_counter  # type: ignore
+
+project_dir = dirname(dirname(__file__))
+if project_dir not in sys.path:
+    sys.path.insert(0, project_dir)
+
+from statsdmetrics.server.aggregation import Aggregator
+from statsdmetrics.server.vectorized import VectorizedAggregator, numpy_available
+
+DEFAULT_SAMPLES = 1000000
+DEFAULT_NAMES = 1000
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class PythonFallbackAggregator(VectorizedAggregator):
+    """Vectorized aggregator summarizing timers as if NumPy was not installed"""
+
+    def summarize_timers(self, timers):
+        return Aggregator.summarize_timers(self, timers)
+
+
+def create_samples(samples=DEFAULT_SAMPLES, names=DEFAULT_NAMES):
+    """Return a list of (name, milliseconds) of timer samples"""
+
+    generator = random.Random(1)
+    timer_names = ["api.latency.{}".format(index) for index in range(names)]
+    return [(timer_names[index % names], generator.lognormvariate(3, 1)) for index in range(samples)]
+
+
+def benchmark(aggregator, samples):
+    """Return a tuple of seconds to add the samples, and seconds to summarize them"""
+
+    aggregates = aggregator.aggregates
+    timers = aggregates.timers
+    timer_factory = aggregates.timer_factory
+    start = perf_counter()
+    for name, milliseconds in samples:
+        key = (name, ())
+        timer = timers.get(key)
+        if timer is None:
+            timer = timers[key] = timer_factory()
+        timer.add(milliseconds)
+    added = perf_counter()
+    summary = aggregator.flush()
+    assert len(summary.timers) == len(set(name for name, _ in samples))
+    return added - start, perf_counter() - added
+
+
+def main(args=None):
+    parser = ArgumentParser(description="Benchmark summarizing timers of large flush windows")
+    parser.add_argument("-s", "--samples", type=int, default=DEFAULT_SAMPLES,
+                        help="number of timer samples")
+    parser.add_argument("-n", "--names", type=int, default=DEFAULT_NAMES,
+                        help="number of timer names")
+    options = parser.parse_args(args)
+
+    samples = create_samples(options.samples, options.names)
+    print("{:,} samples over {:,} timers".format(options.samples, options.names))
+    print("{:<34} {:>12} {:>12}".format("", "add (s)", "flush (s)"))
+    aggregators = [
+        ("Aggregator", Aggregator(PERCENTILES)),
+        ("VectorizedAggregator[Python]", PythonFallbackAggregator(PERCENTILES)),
+    ]
+    if numpy_available:
+        aggregators.append(("VectorizedAggregator[NumPy]", VectorizedAggregator(PERCENTILES)))
+    else:
+        print("NumPy is not available, skipped the vectorized aggregator")
+    for name, aggregator in aggregators:
+        add_seconds, flush_seconds = benchmark(aggregator, samples)
+        print("{:<34} {:>12.3f} {:>12.3f}".format(name, add_seconds, flush_seconds))
+
+
+if __name__ == '__main__':
+    main()
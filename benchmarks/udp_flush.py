@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+benchmarks.udp_flush
+====================
+Benchmark flushing UDP batch clients with sendmmsg, and with sendto.
+
+Buffered datagrams are flushed to a local UDP socket, that is not read
+from, so the receiving side does not compete with the client for CPU.
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+from __future__ import print_function
+
+import sys
+import socket
+from os.path import dirname
+from time import time
+
+project_dir = dirname(dirname(__file__))
+if project_dir not in sys.path:
+    sys.path.insert(0, project_dir)
+
+from statsdmetrics.client import BatchClient
+from statsdmetrics.client import datagrams
+
+DATAGRAMS = (10, 100, 1000, 5000)
+DATAGRAM_SIZES = (64, 512, 1432)
+ROUNDS = 20
+
+
+def run(datagram_count, datagram_size, use_sendmmsg, rounds=ROUNDS):
+    """Return the number of datagrams per second sent by flush"""
+
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))
+    client = BatchClient("127.0.0.1", sink.getsockname()[1], batch_size=datagram_size)
+    request = b"x" * (datagram_size - 2)
+    available = datagrams.sendmmsg_available
+    datagrams.sendmmsg_available = use_sendmmsg and available
+    duration = 0.0
+    try:
+        for _ in range(rounds):
+            for _ in range(datagram_count):
+                client._buffer(request)
+            start = time()
+            client.flush()
+            duration += time() - start
+    finally:
+        datagrams.sendmmsg_available = available
+        sink.close()
+    return datagram_count * rounds / duration
+
+
+def main():
+    if not datagrams.sendmmsg_available:
+        print("sendmmsg is not available on this platform, only sendto is benchmarked")
+    print("{:>10} {:>6} {:>20} {:>20}".format("datagrams", "size", "sendto (dgram/s)", "sendmmsg (dgram/s)"))
+    for size in DATAGRAM_SIZES:
+        for count in DATAGRAMS:
+            print("{:>10} {:>6} {:>20,.0f} {:>20,.0f}".format(
+                count, size, run(count, size, False), run(count, size, True)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+"""
+benchmarks.unix_socket
+======================
+Benchmark the throughput of Unix domain datagram clients, compared to UDP clients on loopback.
+
+Clients send metrics to local servers that receive and discard them in
+a background thread. Unix domain datagram clients drop metrics when the
+server is not keeping up, so the dropped metrics are reported too
+(UDP datagrams are dropped by the kernel without the client knowing).
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import shutil
+import socket
+import tempfile
+from os.path import dirname
+from threading import Thread
+
+try:
+    from time import perf_counter
+except ImportError:
+    from time import time as perf_counter  # type: ignore
+
+project_dir = dirname(dirname(__file__))
+if project_dir not in sys.path:
+    sys.path.insert(0, project_dir)
+
+from statsdmetrics.client import Client, BatchClient
+from statsdmetrics.client.unix import UnixDatagramClient, UnixDatagramBatchClient
+
+METRICS = 100000
+BATCH_SIZES = (512, 1432, 8192)
+ROUNDS = 5
+
+
+class Sink(object):
+    """Local datagram server that receives and discards requests"""
+
+    def __init__(self, family, address):
+        self._socket = socket.socket(family, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self._socket.bind(address)
+        self._socket.settimeout(0.2)
+        self.address = self._socket.getsockname()
+        self._running = True
+        self._thread = Thread(target=self._receive)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _receive(self):
+        while self._running:
+            try:
+                self._socket.recv(65536)
+            except socket.timeout:
+                pass
+
+    def close(self):
+        self._running = False
+        self._thread.join()
+        self._socket.close()
+
+
+def run_unit(client, metrics=METRICS, rounds=ROUNDS):
+    """Return the best number of metrics per second sent by the client"""
+
+    best = 0.0
+    increment = client.increment
+    for _ in range(rounds):
+        start = perf_counter()
+        for _ in range(metrics):
+            increment("page.views")
+        best = max(best, metrics / (perf_counter() - start))
+    return best
+
+
+def run_batch(client, metrics=METRICS, rounds=ROUNDS):
+    """Return the best number of metrics per second buffered and flushed by the batch client"""
+
+    best = 0.0
+    increment = client.increment
+    for _ in range(rounds):
+        start = perf_counter()
+        for _ in range(metrics):
+            increment("page.views")
+        client.flush()
+        best = max(best, metrics / (perf_counter() - start))
+    return best
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    udp_sink = Sink(socket.AF_INET, ("127.0.0.1", 0))
+    unix_sink = Sink(socket.AF_UNIX, os.path.join(directory, "statsd.sock"))
+    try:
+        host, port = udp_sink.address
+        path = unix_sink.address
+        print("{:<34} {:>18} {:>12}".format("client", "metrics/s", "dropped"))
+        results = [
+            ("Client (UDP)", run_unit(Client(host, port)), None),
+        ]
+        unix_client = UnixDatagramClient(path)
+        results.append(("UnixDatagramClient", run_unit(unix_client), unix_client.socket.dropped))
+        for size in BATCH_SIZES:
+            results.append(("BatchClient[{}] (UDP)".format(size),
+                            run_batch(BatchClient(host, port, batch_size=size)), None))
+            unix_batch_client = UnixDatagramBatchClient(path, batch_size=size)
+            results.append(("UnixDatagramBatchClient[{}]".format(size),
+                            run_batch(unix_batch_client), unix_batch_client.socket.dropped))
+        for name, metrics_per_second, dropped_metrics in results:
+            print("{:<34} {:>18,.0f} {:>12}".format(
+                name, metrics_per_second, "-" if dropped_metrics is None else "{:,}".format(dropped_metrics)))
+    finally:
+        udp_sink.close()
+        unix_sink.close()
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
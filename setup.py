@@ -63,7 +63,7 @@ setup_params = dict(
     zip_safe=True
 )  # type: Dict[str, Any]
 
-setup_params["extras_require"] = {"dev": ["pytest", "mock", "typing"]}
+setup_params["extras_require"] = {"dev": ["pytest", "mock", "typing"], "numpy": ["numpy"]}
 
 if distutilazy:
     setup_params["cmdclass"] = dict(
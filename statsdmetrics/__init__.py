@@ -11,7 +11,9 @@ https://opensource.org/licenses/MIT.
 from .metrics import (Counter, Timer, Gauge,
                       Set, GaugeDelta,
                       normalize_metric_name,
+                      normalize_tags,
                       parse_metric_from_request,
+                      parse_metrics,
                       )
 
 __version__ = '2.0.2'
@@ -19,4 +21,6 @@ __version__ = '2.0.2'
 __all__ = ['Counter', 'Timer', 'Gauge',
            'Set', 'GaugeDelta',
            'normalize_metric_name',
-           'parse_metric_from_request']
+           'normalize_tags',
+           'parse_metric_from_request',
+           'parse_metrics']
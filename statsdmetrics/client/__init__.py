@@ -11,21 +11,33 @@ https://opensource.org/licenses/MIT.
 import socket
 from abc import ABCMeta
 from random import random
-from collections import deque
+from collections import deque, OrderedDict
+from threading import Lock, current_thread, local
 from time import time
 
 from datetime import datetime
 
 try:
-    from typing import Tuple, Union
+    from typing import Any, Dict, Sequence, Tuple, Union
 except ImportError:
-    Tuple, Union = None, None
+    Any, Dict, Sequence, Tuple, Union = None, None, None, None, None
 
 from .timing import Chronometer, Stopwatch
-from ..metrics import (Counter, Timer, Gauge, GaugeDelta, Set,
-                       normalize_metric_name, is_numeric)
+from .aggregation import AggregatingClientMixIn
+from .flusher import (BackgroundFlusher, DROP_NEWEST, DROP_OLDEST,
+                      DEFAULT_FLUSH_INTERVAL, DEFAULT_QUEUE_SIZE)
+from .encoding import (encode_counter, encode_timer, encode_gauge,
+                       encode_gauge_delta, encode_set, TagSet, create_tag_set,
+                       MAX_CACHED_TAG_SETS)
+from . import datagrams
+from .datagrams import sendmmsg, supports_sendmmsg
+from .resolver import Resolver, address_family
+from .sampling import AbstractSampler
+from .handles import CounterHandle, TimerHandle, GaugeHandle, SetHandle
+from ..metrics import normalize_metric_name, is_numeric
 
 DEFAULT_PORT = 8125
+DEFAULT_NAME_CACHE_SIZE = 1024
 
 
 class AutoClosingSharedSocket(object):
@@ -87,6 +99,24 @@ class AutoClosingSharedSocket(object):
         if len(self._clients) < 1:
             self.close()
 
+    @property
+    def supports_sendmmsg(self):
+        # type: () -> bool
+        return supports_sendmmsg(self._socket)
+
+    @property
+    def supports_sendmsg(self):
+        # type: () -> bool
+        return isinstance(self._socket, socket.SocketType) and hasattr(self._socket, 'sendmsg')
+
+    def sendmmsg(self, datagrams, address):
+        # type: (Sequence[bytes], Tuple[str, int]) -> int
+        """Send multiple datagrams in as few system calls as possible,
+        and return the number of datagrams sent.
+        """
+
+        return sendmmsg(self._socket, datagrams, address)
+
     def __del__(self):
         self.close()
 
@@ -94,17 +124,191 @@ class AutoClosingSharedSocket(object):
         return getattr(self._socket, name)
 
 
+class AutoClosingSharedDatagramSocket(AutoClosingSharedSocket):
+    """Auto closing shared UDP socket, that is opened for the family
+    (IPv4 or IPv6) of the address that datagrams are sent to.
+    """
+
+    def __init__(self):
+        # type: () -> None
+        AutoClosingSharedSocket.__init__(self, None)
+        self._address = None  # type: Tuple
+        self._family = None  # type: int
+
+    def close(self):
+        # type: () -> None
+        if self._closed:
+            return
+        if self._socket is not None:
+            self._socket.close()
+        self._closed = True
+
+    def sendto(self, data, address):
+        # type: (bytes, Tuple) -> int
+        if address is not self._address:
+            self._open_for(address)
+        return self._socket.sendto(data, address)
+
+    @property
+    def supports_sendmmsg(self):
+        # type: () -> bool
+        if self._socket is None:
+            # the socket is checked again when it's opened for sending
+            return datagrams.sendmmsg_available
+        return supports_sendmmsg(self._socket)
+
+    def sendmmsg(self, payloads, address):
+        # type: (Sequence[bytes], Tuple) -> int
+        if address is not self._address:
+            self._open_for(address)
+        if not supports_sendmmsg(self._socket):
+            raise NotImplementedError("sendmmsg is not supported by the socket")
+        return sendmmsg(self._socket, payloads, address)
+
+    def _open_for(self, address):
+        # type: (Tuple) -> None
+        family = address_family(address)
+        if family != self._family:
+            if self._socket is not None:
+                self._socket.close()
+            self._socket = socket.socket(family, socket.SOCK_DGRAM)
+            self._family = family
+        self._address = address
+
+    def __getattr__(self, name):
+        if name.startswith('_') or self._socket is None:
+            raise AttributeError("'{}' has no attribute '{}' before sending".format(
+                self.__class__.__name__, name))
+        return getattr(self._socket, name)
+
+
+class MetricNameCache(object):
+    """Bounded cache of normalized metric names, with LRU eviction.
+
+    Normalizing a metric name is relatively expensive, while applications
+    usually send the same few metric names over and over. The cache keeps
+    the prefixed normalized names, so each name is normalized once as
+    long as it's frequently used.
+
+    The cache is shared between clients created from each other (i.e by
+    batch_client() and unit_client()), and is safe to use from multiple threads.
+    A cache with size 0 does not store any names.
+    """
+
+    def __init__(self, size=DEFAULT_NAME_CACHE_SIZE):
+        # type: (int) -> None
+        size = int(size)
+        assert size >= 0, "Metric name cache size should not be negative"
+        self._size = size  # type: int
+        self._names = OrderedDict()  # type: OrderedDict
+        self._lock = Lock()  # type: Lock
+        self._hits = 0  # type: int
+        self._misses = 0  # type: int
+        try:
+            self._move_to_end = self._names.move_to_end
+        except AttributeError:
+            self._move_to_end = self._move_to_end_with_lock
+
+    @property
+    def size(self):
+        # type: () -> int
+        return self._size
+
+    @property
+    def hits(self):
+        # type: () -> int
+        return self._hits
+
+    @property
+    def misses(self):
+        # type: () -> int
+        return self._misses
+
+    def get(self, name, prefix=''):
+        # type: (str, str) -> str
+        """Return the prefixed normalized metric name"""
+
+        key = (prefix, name)
+        try:
+            result = self._names[key]
+        except KeyError:
+            return self._add(key)[0]
+        self._hit(key)
+        return result[0]
+
+    def get_encoded(self, name, prefix=''):
+        # type: (str, str) -> bytes
+        """Return the prefixed normalized metric name, encoded to bytes"""
+
+        key = (prefix, name)
+        try:
+            result = self._names[key]
+        except KeyError:
+            return self._add(key)[1]
+        self._hit(key)
+        return result[1]
+
+    def _hit(self, key):
+        # type: (Tuple[str, str]) -> None
+        # cache hits do not lock, the counters are approximate when
+        # the cache is used by multiple threads
+        self._hits += 1
+        try:
+            self._move_to_end(key)
+        except KeyError:
+            pass  # evicted by another thread
+
+    def _add(self, key):
+        # type: (Tuple[str, str]) -> Tuple[str, bytes]
+        prefix, name = key
+        normalized_name = prefix + normalize_metric_name(name)
+        result = (normalized_name, normalized_name.encode())
+        names = self._names
+        with self._lock:
+            self._misses += 1
+            if self._size > 0:
+                names[key] = result
+                while len(names) > self._size:
+                    names.popitem(last=False)
+        return result
+
+    def _move_to_end_with_lock(self, key):
+        # type: (Tuple[str, str]) -> None
+        with self._lock:
+            self._names[key] = self._names.pop(key)
+
+    def clear(self):
+        # type: () -> MetricNameCache
+        """Remove all cached names and reset hit/miss counters"""
+
+        with self._lock:
+            self._names.clear()
+            self._hits = 0
+            self._misses = 0
+        return self
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._names)
+
+
 class AbstractClient(object):
     __metaclass__ = ABCMeta
 
-    def __init__(self, host, port=DEFAULT_PORT, prefix=''):
-        # type: (str, int, str) -> None
+    def __init__(self, host, port=DEFAULT_PORT, prefix='', name_cache_size=DEFAULT_NAME_CACHE_SIZE):
+        # type: (str, int, str, int) -> None
         self._port = None  # type: int
         self._host = host  # type: str
-        self._remote_address = None  # type: Tuple[str, int]
+        self._resolver = None  # type: Resolver
         self._socket = None  # type: AutoClosingSharedSocket
+        self._name_cache = MetricNameCache(name_cache_size)  # type: MetricNameCache
+        self._sampler = None  # type: AbstractSampler
+        self._tags = TagSet()  # type: TagSet
+        self._encoded_tags = b""  # type: bytes
+        self._tag_sets = {}  # type: Dict[TagSet, TagSet]
         self.prefix = prefix  # type: str
         self._set_port(port)
+        self._resolver = self._create_resolver()
         self._socket = self._create_socket()
 
     @property
@@ -125,53 +329,100 @@ class AbstractClient(object):
 
     @property
     def remote_address(self):
-        # type: () -> Tuple[str, int]
-        if self._remote_address is None:
-            self._remote_address = (socket.gethostbyname(self.host), self.port)
-        return self._remote_address
+        # type: () -> Tuple
+        """Address to send metrics to, rotating between the addresses of the host"""
+        return self._resolver.address()
+
+    @property
+    def resolver(self):
+        # type: () -> Resolver
+        return self._resolver
+
+    @property
+    def name_cache(self):
+        # type: () -> MetricNameCache
+        return self._name_cache
 
-    def increment(self, name, count=1, rate=1):
-        # type: (str, int, float) -> None
+    @property
+    def sampler(self):
+        # type: () -> AbstractSampler
+        """Sampling strategy of the metrics, None samples randomly"""
+        return self._sampler
+
+    @sampler.setter
+    def sampler(self, sampler):
+        # type: (AbstractSampler) -> None
+        self._sampler = sampler
+
+    @property
+    def tags(self):
+        # type: () -> TagSet
+        """Constant tags added to all the metrics of the client"""
+        return self._tags
+
+    @tags.setter
+    def tags(self, tags):
+        # type: (Any) -> None
+        self._tags = create_tag_set(tags or ())
+        self._encoded_tags = self._tags.encoded
+        self._tag_sets = {}
+
+    def increment(self, name, count=1, rate=1, tags=None):
+        # type: (str, int, float, Any) -> None
         """Increment a Counter metric"""
 
-        if self._should_send_metric(name, rate):
-            self._request(
-                Counter(
-                    self._create_metric_name_for_request(name),
-                    int(count),
-                    rate
-                ).to_request()
+        rate = self._sample_rate(name, rate)
+        if rate:
+            request = encode_counter(
+                self._create_encoded_metric_name_for_request(name),
+                int(count),
+                rate
             )
-
-    def decrement(self, name, count=1, rate=1):
-        # type: (str, int, float) -> None
+            if tags is not None:
+                request += self._tag_set(tags).encoded
+            elif self._encoded_tags:
+                request += self._encoded_tags
+            self._request(request)
+
+    def decrement(self, name, count=1, rate=1, tags=None):
+        # type: (str, int, float, Any) -> None
         """Decrement a Counter metric"""
 
-        if self._should_send_metric(name, rate):
-            self._request(
-                Counter(
-                    self._create_metric_name_for_request(name),
-                    -1 * int(count),
-                    rate
-                ).to_request()
+        rate = self._sample_rate(name, rate)
+        if rate:
+            request = encode_counter(
+                self._create_encoded_metric_name_for_request(name),
+                -1 * int(count),
+                rate
             )
-
-    def timing(self, name, milliseconds, rate=1):
-        # type: (str, float, float) -> None
+            if tags is not None:
+                request += self._tag_set(tags).encoded
+            elif self._encoded_tags:
+                request += self._encoded_tags
+            self._request(request)
+
+    def timing(self, name, milliseconds, rate=1, tags=None):
+        # type: (str, float, float, Any) -> None
         """Send a Timer metric with the specified duration in milliseconds"""
 
-        if self._should_send_metric(name, rate):
+        rate = self._sample_rate(name, rate)
+        if rate:
             milliseconds = int(milliseconds)
-            self._request(
-                Timer(
-                    self._create_metric_name_for_request(name),
-                    milliseconds,
-                    rate
-                ).to_request()
+            assert milliseconds >= 0, \
+                'Timer milliseconds should not be negative'
+            request = encode_timer(
+                self._create_encoded_metric_name_for_request(name),
+                milliseconds,
+                rate
             )
-
-    def timing_since(self, name, start_time, rate=1):
-        # type: (str, Union[float, datetime], float) -> None
+            if tags is not None:
+                request += self._tag_set(tags).encoded
+            elif self._encoded_tags:
+                request += self._encoded_tags
+            self._request(request)
+
+    def timing_since(self, name, start_time, rate=1, tags=None):
+        # type: (str, Union[float, datetime], float, Any) -> None
         """Send a Timer metric calculating the duration from the start time"""
         duration = 0  # type: float
         if isinstance(start_time, datetime):
@@ -181,51 +432,90 @@ class AbstractClient(object):
             duration = (time() - start_time) * 1000
         else:
             raise ValueError("start time should be a timestamp or a datetime")
-        self.timing(name, duration, rate)
+        self.timing(name, duration, rate, tags)
 
-    def gauge(self, name, value, rate=1):
-        # type: (str, float, float) -> None
+    def gauge(self, name, value, rate=1, tags=None):
+        # type: (str, float, float, Any) -> None
         """Send a Gauge metric with the specified value"""
 
-        if self._should_send_metric(name, rate):
+        rate = self._sample_rate(name, rate)
+        if rate:
             if not is_numeric(value):
                 value = float(value)
-            self._request(
-                Gauge(
-                    self._create_metric_name_for_request(name),
-                    value,
-                    rate
-                ).to_request()
+            assert value >= 0, \
+                'Gauge value should not be negative'
+            request = encode_gauge(
+                self._create_encoded_metric_name_for_request(name),
+                value,
+                rate
             )
-
-    def gauge_delta(self, name, delta, rate=1):
-        # type: (str, float, float) -> None
+            if tags is not None:
+                request += self._tag_set(tags).encoded
+            elif self._encoded_tags:
+                request += self._encoded_tags
+            self._request(request)
+
+    def gauge_delta(self, name, delta, rate=1, tags=None):
+        # type: (str, float, float, Any) -> None
         """Send a GaugeDelta metric to change a Gauge by the specified value"""
 
-        if self._should_send_metric(name, rate):
+        rate = self._sample_rate(name, rate)
+        if rate:
             if not is_numeric(delta):
                 delta = float(delta)
-            self._request(
-                GaugeDelta(
-                    self._create_metric_name_for_request(name),
-                    delta,
-                    rate
-                ).to_request()
+            request = encode_gauge_delta(
+                self._create_encoded_metric_name_for_request(name),
+                delta,
+                rate
             )
-
-    def set(self, name, value, rate=1):
-        # type: (str, str, float) -> None
+            if tags is not None:
+                request += self._tag_set(tags).encoded
+            elif self._encoded_tags:
+                request += self._encoded_tags
+            self._request(request)
+
+    def set(self, name, value, rate=1, tags=None):
+        # type: (str, str, float, Any) -> None
         """Send a Set metric with the specified unique value"""
 
-        if self._should_send_metric(name, rate):
-            value = str(value)
-            self._request(
-                Set(
-                    self._create_metric_name_for_request(name),
-                    value,
-                    rate
-                ).to_request()
+        rate = self._sample_rate(name, rate)
+        if rate:
+            request = encode_set(
+                self._create_encoded_metric_name_for_request(name),
+                str(value),
+                rate
             )
+            if tags is not None:
+                request += self._tag_set(tags).encoded
+            elif self._encoded_tags:
+                request += self._encoded_tags
+            self._request(request)
+
+    def counter_handle(self, name, tags=None):
+        # type: (str, Any) -> CounterHandle
+        """Return a handle to send Counter metrics of the name,
+        normalizing and encoding the name only once.
+        """
+
+        return CounterHandle(self, name, tags)
+
+    def timer_handle(self, name, tags=None):
+        # type: (str, Any) -> TimerHandle
+        """Return a handle to send Timer metrics of the name"""
+
+        return TimerHandle(self, name, tags)
+
+    def gauge_handle(self, name, tags=None):
+        # type: (str, Any) -> GaugeHandle
+        """Return a handle to send Gauge and GaugeDelta metrics of the name"""
+
+        return GaugeHandle(self, name, tags)
+
+    def set_handle(self, name, tags=None):
+        # type: (str, Any) -> SetHandle
+        """Return a handle to send Set metrics of the name"""
+
+        return SetHandle(self, name, tags)
 
     def chronometer(self):
         # type: () -> Chronometer
@@ -237,25 +527,65 @@ class AbstractClient(object):
 
     def _create_metric_name_for_request(self, name):
         # type: (str) -> str
-        return self.prefix + normalize_metric_name(name)
+        metric_name = self._name_cache.get(name, self.prefix)
+        assert metric_name, 'Metric name should not be empty'
+        return metric_name
+
+    def _create_encoded_metric_name_for_request(self, name):
+        # type: (str) -> bytes
+        metric_name = self._name_cache.get_encoded(name, self.prefix)
+        assert metric_name, 'Metric name should not be empty'
+        return metric_name
+
+    def _sample_rate(self, name, rate):
+        # type: (str, float) -> float
+        """Return the sample rate to send the metric with, or 0 to skip it"""
+
+        sampler = self._sampler
+        if sampler is None:
+            return rate if rate >= 1 or random() <= rate else 0
+        return sampler.sample(name, rate)
+
+    def _tag_set(self, tags):
+        # type: (Any) -> TagSet
+        """Return the tag set of the tags merged with the constant tags"""
+
+        if tags is None:
+            return self._tags
+        tags = create_tag_set(tags)
+        tag_sets = self._tag_sets
+        try:
+            return tag_sets[tags]
+        except KeyError:
+            pass
+        tag_set = self._tags.union(tags)
+        if len(tag_sets) >= MAX_CACHED_TAG_SETS:
+            self._tag_sets = tag_sets = {}
+        tag_sets[tags] = tag_set
+        return tag_set
 
-    def _should_send_metric(self, name, rate):
-        # type: (str, float) -> bool
-        return rate >= 1 or random() <= rate
+    def _create_resolver(self):
+        # type: () -> Resolver
+        return Resolver(self._host, self._port)
 
     def _create_socket(self):
         # type: () -> AutoClosingSharedSocket
-        sock = AutoClosingSharedSocket(socket.socket(socket.AF_INET, socket.SOCK_DGRAM))
+        sock = AutoClosingSharedDatagramSocket()
         sock.add_client(self)
         return sock
 
     def _request(self, data):
-        # type: (str) -> None
-        self._socket.sendto(str(data).encode(), self.remote_address)
+        # type: (bytes) -> None
+        self._socket.sendto(data, self.remote_address)
 
     def _configure_client(self, other):
         # type: (AbstractClient) -> None
-        other._remote_address = self._remote_address
+        other._resolver = self._resolver
+        other._name_cache = self._name_cache
+        other._sampler = self._sampler
+        other._tags = self._tags
+        other._encoded_tags = self._encoded_tags
+        other._tag_sets = self._tag_sets
         other._socket = self._socket
         self._socket.add_client(other)
 
@@ -274,41 +604,101 @@ class BatchClientMixIn(object):
         assert batch_size > 0, "BatchClient batch size should be positive"
         self._batch_size = batch_size  # type: int
         self._batches = deque()  # type: deque
+        self._background_flusher = None  # type: BackgroundFlusher
 
     @property
     def batch_size(self):
         # type: () -> int
         return self._batch_size
 
+    @property
+    def background_flusher(self):
+        # type: () -> BackgroundFlusher
+        return self._background_flusher
+
     def clear(self):
         # type: () -> BatchClientMixIn
         """Clear buffered metrics"""
 
+        if self._background_flusher is not None:
+            self._background_flusher.clear()
         self._batches.clear()
         return self
 
     def flush(self):
         # type: () -> BatchClientMixIn
-        """Send buffered metrics in batch requests"""
-        raise NotImplementedError("flush should be implemented in the client class")
+        """Send buffered metrics in batch requests.
+
+        When flushing in background, the background thread flushes the
+        client and the call waits for it.
+        """
+
+        flusher = self._background_flusher
+        if flusher is not None and flusher.running:
+            flusher.flush()
+        else:
+            if flusher is not None:
+                # the flusher thread stopped, flush what it left in the queue
+                flusher._buffer_queued(self)
+            self._flush()
+        return self
+
+    def start_background_flush(self, interval=DEFAULT_FLUSH_INTERVAL, threshold=None,
+                               queue_size=DEFAULT_QUEUE_SIZE, drop_policy=DROP_NEWEST):
+        # type: (float, int, int, str) -> BatchClientMixIn
+        """Flush metrics in a background thread.
+
+        Metrics are flushed every interval milliseconds, or when the queued metrics
+        reach threshold bytes. At most queue_size metrics are queued, and when the
+        queue is full metrics are dropped according to the drop policy.
+        """
+
+        assert self._background_flusher is None or not self._background_flusher.running, \
+            "Background flush is already started"
+        self._background_flusher = BackgroundFlusher(
+            self, interval, threshold, queue_size, drop_policy).start()
+        return self
+
+    def stop_background_flush(self, flush=True):
+        # type: (bool) -> BatchClientMixIn
+        """Stop flushing in background, flushing queued metrics first if flush is True"""
+
+        flusher = self._background_flusher
+        if flusher is not None:
+            flusher.stop(flush)
+            self._background_flusher = None
+        return self
+
+    def _flush(self):
+        # type: () -> None
+        self._send_batches()
+
+    def _send_batches(self):
+        # type: () -> None
+        raise NotImplementedError("_send_batches should be implemented in the client class")
 
     def _request(self, data):
-        # type: (str) -> None
+        # type: (bytes) -> None
         """Override parent by buffering the metric instead of sending now"""
 
-        data = bytearray("{}\n".format(data).encode())
-        self._prepare_batches_for_storage(len(data))
-        self._batches[-1].extend(data)
+        flusher = self._background_flusher
+        if flusher is not None and flusher.running:
+            flusher.enqueue(data)
+        else:
+            self._buffer(data)
 
-    def _prepare_batches_for_storage(self, data_size=None):
-        # type: (int) -> None
-        batch_size = self._batch_size
-        data_size = data_size or batch_size
-        if data_size > batch_size:
-            self._batches.append(bytearray())
-        elif len(self._batches) < 1 or \
-                        (len(self._batches[-1]) + data_size) >= batch_size:
-            self._batches.append(bytearray())
+    def _buffer(self, data):
+        # type: (bytes) -> None
+        """Add a request (without the line break) to the batches"""
+
+        batches = self._batches
+        if batches and len(batches[-1]) + len(data) + 1 < self._batch_size:
+            batch = batches[-1]
+        else:
+            batch = bytearray()
+            batches.append(batch)
+        batch += data
+        batch.append(10)  # line break
 
     def __enter__(self):
         return self
@@ -317,6 +707,91 @@ class BatchClientMixIn(object):
         self.flush()
 
 
+class ThreadSafeBatchClientMixIn(BatchClientMixIn):
+    """MixIn class to batch clients that are shared between multiple threads.
+
+    Each thread buffers metrics in its own buffer without locking, and buffers
+    of all threads are merged into batches when flushing.
+    """
+
+    def __init__(self, batch_size=512):
+        # type: (int) -> None
+        BatchClientMixIn.__init__(self, batch_size)
+        self._thread_local = local()  # type: local
+        self._thread_buffers = []  # type: list
+        self._thread_buffers_lock = Lock()  # type: Lock
+        self._flush_lock = Lock()  # type: Lock
+
+    def clear(self):
+        # type: () -> ThreadSafeBatchClientMixIn
+        """Clear buffered metrics"""
+
+        with self._flush_lock:
+            with self._thread_buffers_lock:
+                for _, buffer in self._thread_buffers:
+                    buffer.clear()
+            return super(ThreadSafeBatchClientMixIn, self).clear()
+
+    def _flush(self):
+        # type: () -> None
+        with self._flush_lock:
+            self._merge_thread_buffers()
+            super(ThreadSafeBatchClientMixIn, self)._flush()
+
+    def _request(self, data):
+        # type: (bytes) -> None
+        """Override parent by buffering the metric in the buffer of current thread.
+
+        When flushing in background, metrics are enqueued to the flusher instead,
+        which bounds the queue and flushes by threshold.
+        """
+
+        flusher = self._background_flusher
+        if flusher is not None and flusher.running:
+            flusher.enqueue(data)
+            return
+        try:
+            buffer = self._thread_local.buffer
+        except AttributeError:
+            buffer = self._create_thread_buffer()
+        buffer.append(data)
+
+    def _create_thread_buffer(self):
+        # type: () -> deque
+        buffer = deque()
+        self._thread_local.buffer = buffer
+        with self._thread_buffers_lock:
+            self._thread_buffers.append((current_thread(), buffer))
+        return buffer
+
+    def _merge_thread_buffers(self):
+        # type: () -> None
+        with self._thread_buffers_lock:
+            thread_buffers = list(self._thread_buffers)
+        for thread, buffer in thread_buffers:
+            # appending to and popping from a deque are atomic, no lock is required
+            popleft = buffer.popleft
+            while True:
+                try:
+                    data = popleft()
+                except IndexError:
+                    break
+                self._buffer(data)
+            if not thread.is_alive():
+                self._remove_thread_buffer(thread, buffer)
+
+    def _remove_thread_buffer(self, thread, buffer):
+        # type: (object, deque) -> None
+        with self._thread_buffers_lock:
+            self._thread_buffers = [
+                (buffer_thread, thread_buffer) for buffer_thread, thread_buffer in self._thread_buffers
+                if thread_buffer is not buffer
+            ]
+        # the thread finished, so no more data is added to its buffer
+        for data in buffer:
+            self._buffer(data)
+
+
 class Client(AbstractClient):
     """Statsd client, using UDP to send metrics
 
@@ -326,11 +801,16 @@ class Client(AbstractClient):
     >>> client.decrement("event", rate=0.2)
     """
 
-    def batch_client(self, size=512):
-        # type: (int) -> BatchClient
-        """Return a batch client with same settings of the client"""
+    def batch_client(self, size=512, aggregate=False):
+        # type: (int, bool) -> BatchClient
+        """Return a batch client with same settings of the client.
 
-        batch_client = BatchClient(self.host, self.port, self.prefix, size)
+        If aggregate is True, the batch client aggregates the metrics
+        before sending them.
+        """
+
+        batch_client_class = AggregatingBatchClient if aggregate else BatchClient
+        batch_client = batch_client_class(self.host, self.port, self.prefix, size)
         self._configure_client(batch_client)
         return batch_client
 
@@ -344,9 +824,10 @@ class BatchClient(BatchClientMixIn, AbstractClient):
     >>> client.flush()
     """
 
-    def __init__(self, host, port=DEFAULT_PORT, prefix="", batch_size=512):
-        # type: (str, int, str, int) -> None
-        AbstractClient.__init__(self, host, port, prefix)
+    def __init__(self, host, port=DEFAULT_PORT, prefix="", batch_size=512,
+                 name_cache_size=DEFAULT_NAME_CACHE_SIZE):
+        # type: (str, int, str, int, int) -> None
+        AbstractClient.__init__(self, host, port, prefix, name_cache_size)
         BatchClientMixIn.__init__(self, batch_size)
 
     def unit_client(self):
@@ -357,15 +838,77 @@ class BatchClient(BatchClientMixIn, AbstractClient):
         self._configure_client(client)
         return client
 
-    def flush(self):
-        # type: () -> BatchClient
-        """Send buffered metrics in batch requests"""
+    def _send_batches(self):
+        # type: () -> None
+        _send_datagram_batches(self._socket, self._batches, self.remote_address)
 
-        address = self.remote_address
-        while len(self._batches) > 0:
-            self._socket.sendto(self._batches[0], address)
-            self._batches.popleft()
-        return self
+
+def _send_datagram_batches(sock, batches, address):
+    # type: (AutoClosingSharedSocket, deque, Any) -> None
+    """Send each batch as a datagram, by sendmmsg() when supported, discarding the sent batches"""
+
+    if len(batches) > 1 and isinstance(sock, AutoClosingSharedSocket) and sock.supports_sendmmsg:
+        try:
+            while batches:
+                _discard_sent_batches(batches, sock.sendmmsg(batches, address))
+            return
+        except NotImplementedError:
+            pass
+    sent = 0
+    try:
+        for batch in batches:
+            sock.sendto(batch, address)
+            sent += 1
+    finally:
+        _discard_sent_batches(batches, sent)
+
+
+def _discard_sent_batches(batches, sent):
+    # type: (deque, int) -> None
+    if sent == len(batches):
+        batches.clear()
+    else:
+        for _ in range(sent):
+            batches.popleft()
+
+
+class AggregatingBatchClient(AggregatingClientMixIn, BatchClient):
+    """Statsd client aggregating metrics and sending them in batch UDP requests
+
+    Sends a single request for each metric name on flush, i.e counters are
+    summed, only the last gauge value is sent and timers are sent as
+    multiple values in a single request.
+
+    >>> client = AggregatingBatchClient("stats.example.org")
+    >>> client.increment("event")
+    >>> client.increment("event", 3)
+    >>> client.timing("query", 3)
+    >>> client.timing("query", 5)
+    >>> client.flush()  # sends "event:4|c\nquery:3|ms:5|ms\n"
+    """
+
+    def __init__(self, host, port=DEFAULT_PORT, prefix="", batch_size=512,
+                 name_cache_size=DEFAULT_NAME_CACHE_SIZE):
+        # type: (str, int, str, int, int) -> None
+        BatchClient.__init__(self, host, port, prefix, batch_size, name_cache_size)
+        AggregatingClientMixIn.__init__(self)
+
+
+class ThreadSafeBatchClient(ThreadSafeBatchClientMixIn, BatchClient):
+    """Statsd client buffering requests and send in batch UDP requests,
+    that can be shared between multiple threads
+
+    >>> client = ThreadSafeBatchClient("stats.example.org")
+    >>> client.increment("event")  # from any thread
+    >>> client.flush()
+    """
+
+    def __init__(self, host, port=DEFAULT_PORT, prefix="", batch_size=512,
+                 name_cache_size=DEFAULT_NAME_CACHE_SIZE):
+        # type: (str, int, str, int, int) -> None
+        AbstractClient.__init__(self, host, port, prefix, name_cache_size)
+        ThreadSafeBatchClientMixIn.__init__(self, batch_size)
 
 
-__all__ = ['Client', 'BatchClient']
+__all__ = ['Client', 'BatchClient', 'AggregatingBatchClient', 'ThreadSafeBatchClient',
+           'DROP_NEWEST', 'DROP_OLDEST']
@@ -0,0 +1,261 @@
+"""
+statsdmetrics.client.aggregation
+--------------------------------
+Aggregate metrics on the client side, to send fewer requests
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+try:
+    from typing import Any, Iterator, Tuple
+except ImportError:
+    Any, Iterator, Tuple = None, None, None  # type: ignore
+
+from ..metrics import Counter, Gauge, GaugeDelta, is_numeric
+
+
+def _format_sample_rate(rate):
+    # type: (float) -> str
+    return "" if rate == 1 else "|@{:n}".format(rate)
+
+
+def _format_tags(tags):
+    # type: (Tuple[str, ...]) -> str
+    return "|#" + ",".join(tags) if tags else ""
+
+
+class MetricAggregator(object):
+    """Aggregate metrics in memory, and create a request per metric.
+
+    Metrics are aggregated per name and tags (a sorted tuple of tags, as in the
+    metric classes). Counters are summed per name and sample rate, the last value of a gauge is kept
+    and gauge deltas are added together (or applied to the gauge value when the
+    gauge was set), duplicate members of a set are dropped and timer samples are
+    collected to be sent together.
+
+    Timers and sets create requests with multiple values (name:1|ms:2|ms), with
+    the tags once at the end (name:1|ms:2|ms|#k:v).
+    Most Statsd servers ignore the sample rate for gauges and sets, so they are
+    aggregated regardless of the rate.
+    """
+
+    def __init__(self):
+        # type: () -> None
+        self._lock = Lock()  # type: Lock
+        self._metrics = OrderedDict()  # type: OrderedDict
+
+    def increment(self, name, count=1, rate=1, tags=()):
+        # type: (str, int, float, Tuple[str, ...]) -> None
+        key = ('c', name, rate, tags)
+        with self._lock:
+            self._metrics[key] = self._metrics.get(key, 0) + count
+
+    def timing(self, name, milliseconds, rate=1, tags=()):
+        # type: (str, float, float, Tuple[str, ...]) -> None
+        key = ('ms', name, rate, tags)
+        with self._lock:
+            samples = self._metrics.get(key)
+            if samples is None:
+                self._metrics[key] = [milliseconds]
+            else:
+                samples.append(milliseconds)
+
+    def gauge(self, name, value, tags=()):
+        # type: (str, float, Tuple[str, ...]) -> None
+        key = ('g', name, 1, tags)
+        with self._lock:
+            self._metrics[key] = [value, 0]
+
+    def gauge_delta(self, name, delta, tags=()):
+        # type: (str, float, Tuple[str, ...]) -> None
+        key = ('g', name, 1, tags)
+        with self._lock:
+            gauge = self._metrics.get(key)
+            if gauge is None:
+                self._metrics[key] = [None, delta]
+            else:
+                gauge[1] += delta
+
+    def set(self, name, value, tags=()):
+        # type: (str, str, Tuple[str, ...]) -> None
+        key = ('s', name, 1, tags)
+        with self._lock:
+            members = self._metrics.get(key)
+            if members is None:
+                members = self._metrics[key] = OrderedDict()
+            members[value] = True
+
+    def clear(self):
+        # type: () -> MetricAggregator
+        """Remove aggregated metrics"""
+
+        with self._lock:
+            self._metrics = OrderedDict()
+        return self
+
+    def requests(self, max_size=None):
+        # type: (int) -> Iterator[str]
+        """Remove aggregated metrics and yield a request for each of them.
+
+        Requests with multiple values are split to keep each request
+        shorter than max_size, if possible.
+        """
+
+        with self._lock:
+            metrics, self._metrics = self._metrics, OrderedDict()
+
+        for (type_, name, rate, tags), aggregate in metrics.items():
+            if type_ == 'c':
+                yield Counter(name, aggregate, rate, tags).to_request()
+            elif type_ == 'g':
+                for request in self._create_gauge_requests(name, aggregate[0], aggregate[1], tags):
+                    yield request
+            else:
+                suffix = "|{}{}".format(type_, _format_sample_rate(rate))
+                for request in self._create_multi_value_requests(
+                        name, aggregate, suffix, max_size, _format_tags(tags)):
+                    yield request
+
+    @staticmethod
+    def _create_gauge_requests(name, value, delta, tags=()):
+        # type: (str, float, float, Tuple[str, ...]) -> Iterator[str]
+        if value is None:
+            yield GaugeDelta(name, delta, 1, tags).to_request()
+            return
+        value += delta
+        if value < 0:
+            # gauges can not be set to a negative value directly
+            yield Gauge(name, 0, 1, tags).to_request()
+            yield GaugeDelta(name, value, 1, tags).to_request()
+        else:
+            yield Gauge(name, value, 1, tags).to_request()
+
+    @staticmethod
+    def _create_multi_value_requests(name, values, suffix, max_size=None, tags=""):
+        # type: (str, Any, str, int, str) -> Iterator[str]
+        # tags apply to all the values of the request, so they are added once at the end
+        request = name
+        request_values = 0
+        for value in values:
+            value_request = ":{}{}".format(value, suffix)
+            if max_size and request_values > 0 and \
+                    len(request) + len(value_request) + len(tags) >= max_size:
+                yield request + tags
+                request = name
+                request_values = 0
+            request += value_request
+            request_values += 1
+        if request_values > 0:
+            yield request + tags
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._metrics)
+
+
+class AggregatingClientMixIn(object):
+    """MixIn class to batch clients that aggregate metrics before sending them.
+
+    Metrics are aggregated in memory and a single request per metric
+    is buffered when flushing the client.
+    """
+
+    def __init__(self):
+        # type: () -> None
+        self._aggregator = MetricAggregator()  # type: MetricAggregator
+
+    def increment(self, name, count=1, rate=1, tags=None):
+        # type: (str, int, float, Any) -> None
+        """Increment a Counter metric"""
+
+        rate = self._sample_rate(name, rate)
+        if rate:
+            self._aggregator.increment(
+                self._create_metric_name_for_request(name), int(count), rate,
+                self._aggregated_tags(tags))
+
+    def decrement(self, name, count=1, rate=1, tags=None):
+        # type: (str, int, float, Any) -> None
+        """Decrement a Counter metric"""
+
+        rate = self._sample_rate(name, rate)
+        if rate:
+            self._aggregator.increment(
+                self._create_metric_name_for_request(name), -1 * int(count), rate,
+                self._aggregated_tags(tags))
+
+    def timing(self, name, milliseconds, rate=1, tags=None):
+        # type: (str, float, float, Any) -> None
+        """Send a Timer metric with the specified duration in milliseconds"""
+
+        rate = self._sample_rate(name, rate)
+        if rate:
+            milliseconds = int(milliseconds)
+            assert milliseconds >= 0, \
+                'Timer milliseconds should not be negative'
+            self._aggregator.timing(
+                self._create_metric_name_for_request(name), milliseconds, rate,
+                self._aggregated_tags(tags))
+
+    def gauge(self, name, value, rate=1, tags=None):
+        # type: (str, float, float, Any) -> None
+        """Send a Gauge metric with the specified value"""
+
+        rate = self._sample_rate(name, rate)
+        if rate:
+            if not is_numeric(value):
+                value = float(value)
+            assert value >= 0, \
+                'Gauge value should not be negative'
+            self._aggregator.gauge(
+                self._create_metric_name_for_request(name), value,
+                self._aggregated_tags(tags))
+
+    def gauge_delta(self, name, delta, rate=1, tags=None):
+        # type: (str, float, float, Any) -> None
+        """Send a GaugeDelta metric to change a Gauge by the specified value"""
+
+        rate = self._sample_rate(name, rate)
+        if rate:
+            if not is_numeric(delta):
+                delta = float(delta)
+            self._aggregator.gauge_delta(
+                self._create_metric_name_for_request(name), delta,
+                self._aggregated_tags(tags))
+
+    def set(self, name, value, rate=1, tags=None):
+        # type: (str, str, float, Any) -> None
+        """Send a Set metric with the specified unique value"""
+
+        rate = self._sample_rate(name, rate)
+        if rate:
+            self._aggregator.set(
+                self._create_metric_name_for_request(name), str(value),
+                self._aggregated_tags(tags))
+
+    def _aggregated_tags(self, tags):
+        # type: (Any) -> Tuple[str, ...]
+        if tags is None and not self._encoded_tags:
+            return ()
+        return self._tag_set(tags).tags
+
+    def clear(self):
+        # type: () -> AggregatingClientMixIn
+        """Clear aggregated and buffered metrics"""
+
+        self._aggregator.clear()
+        return super(AggregatingClientMixIn, self).clear()
+
+    def _flush(self):
+        # type: () -> None
+        for request in self._aggregator.requests(self._batch_size):
+            self._buffer(request.encode())
+        super(AggregatingClientMixIn, self)._flush()
+
+
+__all__ = ['MetricAggregator', 'AggregatingClientMixIn']
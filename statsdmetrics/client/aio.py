@@ -0,0 +1,372 @@
+"""
+statsdmetrics.client.aio
+------------------------
+Statsd clients for asyncio applications, sending metrics without blocking the event loop
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import asyncio
+from collections import deque
+
+try:
+    from typing import Any, Callable, Optional, Tuple
+except ImportError:
+    Any, Callable, Optional, Tuple = None, None, None, None  # type: ignore
+
+from . import (AbstractClient, BatchClientMixIn,
+               DEFAULT_PORT, DEFAULT_NAME_CACHE_SIZE)
+
+DEFAULT_MAX_BUFFER_SIZE = 64 * 1024
+
+try:
+    _get_running_loop = asyncio.get_running_loop
+except AttributeError:
+    _get_running_loop = asyncio.get_event_loop
+
+
+class AsyncConnection(object):
+    """Connection of async clients, shared between clients created from each other.
+
+    The connection is opened by the connector coroutine function,
+    that returns a tuple of (transport, stream writer or None).
+    """
+
+    def __init__(self, connector):
+        # type: (Callable) -> None
+        self._connector = connector  # type: Callable
+        self._transport = None  # type: Any
+        self._writer = None  # type: Optional[asyncio.StreamWriter]
+        self._connecting = None  # type: Optional[asyncio.Future]
+
+    @property
+    def transport(self):
+        # type: () -> Any
+        return self._transport
+
+    @property
+    def connected(self):
+        # type: () -> bool
+        return self._transport is not None and not self._transport.is_closing()
+
+    @property
+    def connecting(self):
+        # type: () -> bool
+        return self._connecting is not None and not self._connecting.done()
+
+    def write_buffer_size(self):
+        # type: () -> int
+        return self._transport.get_write_buffer_size()
+
+    def start_connecting(self):
+        # type: () -> asyncio.Future
+        """Start opening the connection in a task, if not connecting already"""
+
+        if not self.connecting:
+            self._connecting = asyncio.ensure_future(self._connect())
+            self._connecting.add_done_callback(_consume_exception)
+        return self._connecting
+
+    async def connect(self):
+        # type: () -> None
+        if not self.connected:
+            await asyncio.shield(self.start_connecting())
+
+    async def drain(self):
+        # type: () -> None
+        if self._writer is not None and self.connected:
+            await self._writer.drain()
+
+    def close(self):
+        # type: () -> None
+        if self._connecting is not None and not self._connecting.done():
+            self._connecting.cancel()
+        if self._transport is not None:
+            self._transport.close()
+        self._transport = None
+        self._writer = None
+
+    async def _connect(self):
+        # type: () -> None
+        self._transport, self._writer = await self._connector()
+
+
+def _consume_exception(future):
+    # type: (asyncio.Future) -> None
+    # connection errors are raised to the callers of connect(), and
+    # metrics sent while not connected are dropped.
+    if not future.cancelled():
+        future.exception()
+
+
+class AbstractAsyncClient(AbstractClient):
+    """Base class of async clients.
+
+    Metrics are written to the transport of the event loop without blocking.
+    Until the connection is open, metrics are kept in a pending buffer.
+    If the pending buffer or the write buffer of the transport grows
+    over max_buffer_size bytes, new metrics are dropped and counted.
+    """
+
+    def __init__(self, host, port=DEFAULT_PORT, prefix='', name_cache_size=DEFAULT_NAME_CACHE_SIZE,
+                 max_buffer_size=DEFAULT_MAX_BUFFER_SIZE):
+        # type: (str, int, str, int, int) -> None
+        AbstractClient.__init__(self, host, port, prefix, name_cache_size)
+        max_buffer_size = int(max_buffer_size)
+        assert max_buffer_size > 0, "Max buffer size should be positive"
+        self._max_buffer_size = max_buffer_size  # type: int
+        self._pending = deque()  # type: deque
+        self._pending_size = 0  # type: int
+        self._dropped = 0  # type: int
+        self._awaited_connection = None  # type: Optional[asyncio.Future]
+        self._connection = AsyncConnection(self._open_connection)  # type: AsyncConnection
+
+    @property
+    def max_buffer_size(self):
+        # type: () -> int
+        return self._max_buffer_size
+
+    @property
+    def dropped(self):
+        # type: () -> int
+        """Number of metrics dropped, because the buffers were full"""
+        return self._dropped
+
+    @property
+    def connected(self):
+        # type: () -> bool
+        return self._connection.connected
+
+    async def connect(self):
+        # type: () -> AbstractAsyncClient
+        """Open the connection, and send pending metrics"""
+
+        await self._connection.connect()
+        self._send_pending()
+        return self
+
+    def close(self):
+        # type: () -> None
+        self._connection.close()
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    async def _open_connection(self):
+        # type: () -> Tuple[Any, Optional[asyncio.StreamWriter]]
+        raise NotImplementedError()  # pragma: no cover
+
+    def _create_socket(self):
+        # type: () -> None
+        return None
+
+    def _configure_client(self, other):
+        # type: (AbstractAsyncClient) -> None
+        other._name_cache = self._name_cache
+        other._sampler = self._sampler
+        other._tags = self._tags
+        other._encoded_tags = self._encoded_tags
+        other._tag_sets = self._tag_sets
+        other._connection = self._connection
+
+    def _write(self, data):
+        # type: (bytes) -> None
+        connection = self._connection
+        if not connection.connected:
+            self._add_pending(data)
+            connecting = connection.start_connecting()
+            if connecting is not self._awaited_connection:
+                self._awaited_connection = connecting
+                connecting.add_done_callback(self._on_connected)
+            return
+        if self._pending:
+            self._send_pending()
+        if connection.write_buffer_size() + len(data) > self._max_buffer_size:
+            self._dropped += 1
+            return
+        self._send(data)
+
+    def _send(self, data):
+        # type: (bytes) -> None
+        raise NotImplementedError()  # pragma: no cover
+
+    def _add_pending(self, data):
+        # type: (bytes) -> None
+        if self._pending_size + len(data) > self._max_buffer_size:
+            self._dropped += 1
+            return
+        self._pending.append(data)
+        self._pending_size += len(data)
+
+    def _send_pending(self):
+        # type: () -> None
+        pending = self._pending
+        self._pending = deque()
+        self._pending_size = 0
+        if not self._connection.connected:
+            self._dropped += len(pending)
+            return
+        for data in pending:
+            self._write(data)
+
+    def _on_connected(self, future):
+        # type: (asyncio.Future) -> None
+        self._awaited_connection = None
+        if self._pending:
+            self._send_pending()
+
+
+class AsyncClient(AbstractAsyncClient):
+    """Statsd client for asyncio, using UDP to send metrics
+
+    >>> client = AsyncClient("stats.example.org")
+    >>> await client.connect()
+    >>> client.increment("event")
+    >>> client.increment("event", 3, 0.4)
+    >>> client.decrement("event", rate=0.2)
+    """
+
+    def batch_client(self, size=512):
+        # type: (int) -> AsyncBatchClient
+        """Return an async batch client with same settings of the client"""
+
+        batch_client = AsyncBatchClient(self.host, self.port, self.prefix, size,
+                                        max_buffer_size=self._max_buffer_size)
+        self._configure_client(batch_client)
+        return batch_client
+
+    async def _open_connection(self):
+        # type: () -> Tuple[Any, None]
+        loop = _get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(
+            asyncio.DatagramProtocol, remote_addr=(self.host, self.port))
+        return transport, None
+
+    def _request(self, data):
+        # type: (bytes) -> None
+        self._write(data)
+
+    def _send(self, data):
+        # type: (bytes) -> None
+        self._connection.transport.sendto(data)
+
+
+class AsyncTCPClient(AbstractAsyncClient):
+    """Statsd client for asyncio, using TCP to send metrics
+
+    >>> client = AsyncTCPClient("stats.example.org")
+    >>> await client.connect()
+    >>> client.increment("event")
+    >>> client.increment("event", 3, 0.4)
+    >>> client.decrement("event", rate=0.2)
+    """
+
+    def batch_client(self, size=512):
+        # type: (int) -> AsyncTCPBatchClient
+        """Return an async TCP batch client with same settings of the client"""
+
+        batch_client = AsyncTCPBatchClient(self.host, self.port, self.prefix, size,
+                                           max_buffer_size=self._max_buffer_size)
+        self._configure_client(batch_client)
+        return batch_client
+
+    async def _open_connection(self):
+        # type: () -> Tuple[Any, asyncio.StreamWriter]
+        _, writer = await asyncio.open_connection(self.host, self.port)
+        return writer.transport, writer
+
+    def _request(self, data):
+        # type: (bytes) -> None
+        self._write(data + b"\n")
+
+    def _send(self, data):
+        # type: (bytes) -> None
+        self._connection.transport.write(data)
+
+
+class AsyncBatchClientMixIn(BatchClientMixIn):
+    """MixIn class to async clients that buffer metrics and send batch requests"""
+
+    async def flush(self):
+        # type: () -> AsyncBatchClientMixIn
+        """Send buffered metrics in batch requests, and wait for the transport buffer to drain"""
+
+        await self.connect()
+        self._flush()
+        await self._connection.drain()
+        return self
+
+    def start_background_flush(self, *args, **kwargs):
+        raise NotImplementedError("Async clients should be flushed by a task in the event loop")
+
+    def _send_batches(self):
+        # type: () -> None
+        while len(self._batches) > 0:
+            self._write(bytes(self._batches.popleft()))
+
+    def __enter__(self):
+        raise TypeError("Async batch clients should be used with 'async with'")
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        raise TypeError("Async batch clients should be used with 'async with'")  # pragma: no cover
+
+    async def __aexit__(self, exc_type, exc_value, exc_traceback):
+        await self.flush()
+
+
+class AsyncBatchClient(AsyncBatchClientMixIn, AsyncClient):
+    """Statsd client for asyncio buffering requests and send in batch UDP requests
+
+    >>> client = AsyncBatchClient("stats.example.org")
+    >>> client.increment("event")
+    >>> client.decrement("event.second", 3, 0.5)
+    >>> await client.flush()
+    """
+
+    def __init__(self, host, port=DEFAULT_PORT, prefix="", batch_size=512,
+                 name_cache_size=DEFAULT_NAME_CACHE_SIZE, max_buffer_size=DEFAULT_MAX_BUFFER_SIZE):
+        # type: (str, int, str, int, int, int) -> None
+        AsyncClient.__init__(self, host, port, prefix, name_cache_size, max_buffer_size)
+        AsyncBatchClientMixIn.__init__(self, batch_size)
+
+    def unit_client(self):
+        # type: () -> AsyncClient
+        """Return an async client with same settings of the batch client"""
+
+        client = AsyncClient(self.host, self.port, self.prefix,
+                             max_buffer_size=self._max_buffer_size)
+        self._configure_client(client)
+        return client
+
+
+class AsyncTCPBatchClient(AsyncBatchClientMixIn, AsyncTCPClient):
+    """Statsd client for asyncio buffering requests and send in batch requests over TCP
+
+    >>> client = AsyncTCPBatchClient("stats.example.org")
+    >>> client.increment("event")
+    >>> client.decrement("event.second", 3, 0.5)
+    >>> await client.flush()
+    """
+
+    def __init__(self, host, port=DEFAULT_PORT, prefix="", batch_size=512,
+                 name_cache_size=DEFAULT_NAME_CACHE_SIZE, max_buffer_size=DEFAULT_MAX_BUFFER_SIZE):
+        # type: (str, int, str, int, int, int) -> None
+        AsyncTCPClient.__init__(self, host, port, prefix, name_cache_size, max_buffer_size)
+        AsyncBatchClientMixIn.__init__(self, batch_size)
+
+    def unit_client(self):
+        # type: () -> AsyncTCPClient
+        """Return an async TCP client with same settings of the batch client"""
+
+        client = AsyncTCPClient(self.host, self.port, self.prefix,
+                                max_buffer_size=self._max_buffer_size)
+        self._configure_client(client)
+        return client
+
+
+__all__ = ['AsyncClient', 'AsyncBatchClient', 'AsyncTCPClient', 'AsyncTCPBatchClient']
@@ -0,0 +1,151 @@
+"""
+statsdmetrics.client.datagrams
+------------------------------
+Send multiple datagrams (UDP or Unix domain) in a single system call, using sendmmsg(2).
+
+The system call is made by ctypes, since the socket module does not
+provide it. It's available on 64 bit Linux, elsewhere
+sendmmsg_available is False and clients send each datagram by sendto().
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import sys
+import errno
+from os import strerror
+import socket
+import struct
+from array import array
+
+try:
+    from typing import Any, Sequence, Tuple
+except ImportError:
+    Any, Sequence, Tuple = None, None, None  # type: ignore
+
+# max number of messages in a single call (UIO_MAXIOV)
+MAX_MESSAGES = 1024
+
+# struct iovec {void *iov_base; size_t iov_len}
+_IOVEC_WORDS = 2
+# struct mmsghdr {struct msghdr msg_hdr; unsigned int msg_len}, as 64 bit words:
+# msg_name, msg_namelen, msg_iov, msg_iovlen, msg_control, msg_controllen, msg_flags, msg_len
+_MMSGHDR_WORDS = 8
+_MMSGHDR_SIZE = 64
+
+_socket_class = socket.socket
+_sendmmsg_families = (socket.AF_INET, socket.AF_INET6)
+if hasattr(socket, 'AF_UNIX'):
+    _sendmmsg_families += (socket.AF_UNIX,)
+_libc_sendmmsg = None  # type: Any
+
+try:
+    from itertools import accumulate, chain
+    import ctypes
+    import ctypes.util
+
+    if sys.platform.startswith('linux') and struct.calcsize('P') == 8 \
+            and struct.calcsize('@PIPNPNi4xI4x') == _MMSGHDR_SIZE \
+            and array('Q').itemsize == 8:
+        _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        _libc_sendmmsg = _libc.sendmmsg
+        _libc_sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+        _libc_sendmmsg.restype = ctypes.c_int
+except (ImportError, OSError, AttributeError, TypeError):
+    _libc_sendmmsg = None
+
+sendmmsg_available = _libc_sendmmsg is not None  # type: bool
+
+
+def supports_sendmmsg(sock):
+    # type: (Any) -> bool
+    """Return True if datagrams can be sent by sendmmsg() on the socket"""
+
+    return sendmmsg_available and isinstance(sock, _socket_class) \
+        and sock.type == socket.SOCK_DGRAM \
+        and sock.family in _sendmmsg_families
+
+
+def sendmmsg(sock, datagrams, address):
+    # type: (socket.socket, Sequence[bytes], Any) -> int
+    """Send the datagrams to the address in as few system calls as possible.
+
+    Returns the number of datagrams sent, which is less than the number
+    of datagrams only if an error happens after some datagrams are sent.
+    Raises socket errors if no datagram could be sent, and
+    NotImplementedError if sendmmsg is not supported.
+    """
+
+    if not sendmmsg_available:
+        raise NotImplementedError("sendmmsg is not available on this platform")
+    count = len(datagrams)
+    if count == 0:
+        return 0
+
+    # keep references to all the buffers until the calls are done
+    data = bytearray().join(datagrams)
+    data_address = ctypes.addressof((ctypes.c_char * len(data)).from_buffer(data)) if data else 0
+    lengths = array('Q', map(len, datagrams))
+    iovecs = array('Q', bytes(8 * _IOVEC_WORDS * count))
+    starts = array('Q', accumulate(chain((data_address,), lengths)))
+    starts.pop()
+    iovecs[0::_IOVEC_WORDS] = starts
+    iovecs[1::_IOVEC_WORDS] = lengths
+    iovecs_address = iovecs.buffer_info()[0]
+
+    sockaddr = _create_sockaddr(sock.family, address)
+    sockaddr_address = ctypes.addressof(sockaddr)
+    namelen = struct.unpack('@Q', struct.pack('@I4x', ctypes.sizeof(sockaddr)))[0]
+    messages = array('Q', (sockaddr_address, namelen, 0, 1, 0, 0, 0, 0)) * count
+    messages[2::_MMSGHDR_WORDS] = array(
+        'Q', range(iovecs_address, iovecs_address + 8 * _IOVEC_WORDS * count, 8 * _IOVEC_WORDS))
+    messages_address = messages.buffer_info()[0]
+
+    fileno = sock.fileno()
+    sent = 0
+    while sent < count:
+        result = _libc_sendmmsg(fileno, messages_address + sent * _MMSGHDR_SIZE,
+                                min(count - sent, MAX_MESSAGES), 0)
+        if result < 0:
+            error = ctypes.get_errno()
+            if error == errno.EINTR:
+                continue
+            if sent > 0:
+                break
+            if error == errno.ENOSYS:
+                _disable()
+                raise NotImplementedError("sendmmsg is not supported by the kernel")
+            raise socket.error(error, strerror(error))
+        sent += result
+    return sent
+
+
+def _create_sockaddr(family, address):
+    # type: (int, Any) -> Any
+    if family not in (socket.AF_INET, socket.AF_INET6):
+        # Unix domain socket path, a leading null byte is an abstract name (Linux)
+        path = address if isinstance(address, bytes) else address.encode(sys.getfilesystemencoding())
+        if not path.startswith(b'\x00'):
+            path += b'\x00'
+        sockaddr = struct.pack('=H', family) + path
+        return ctypes.create_string_buffer(sockaddr, len(sockaddr))
+    host, port = address[0], address[1]
+    if family == socket.AF_INET6:
+        flowinfo = address[2] if len(address) > 2 else 0
+        scope_id = address[3] if len(address) > 3 else 0
+        sockaddr = struct.pack('=H', family) + struct.pack('!HI', port, flowinfo) + \
+            socket.inet_pton(family, host) + struct.pack('=I', scope_id)
+    else:
+        sockaddr = struct.pack('=H', family) + struct.pack('!H', port) + \
+            socket.inet_aton(host) + b'\x00' * 8
+    return ctypes.create_string_buffer(sockaddr, len(sockaddr))
+
+
+def _disable():
+    # type: () -> None
+    global sendmmsg_available
+    sendmmsg_available = False
+
+
+__all__ = ['sendmmsg', 'supports_sendmmsg', 'sendmmsg_available']
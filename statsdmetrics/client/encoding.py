@@ -0,0 +1,178 @@
+"""
+statsdmetrics.client.encoding
+-----------------------------
+Encode metrics to bytes of Statsd requests, without creating metric objects
+
+The encoded requests are the same as the requests of the metric classes
+(i.e Counter(name, count, rate).to_request().encode()), but the metric name
+should be already encoded, and the values are not validated.
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+try:
+    from typing import Any, Dict, Iterable, Tuple
+except ImportError:
+    Any, Dict, Iterable, Tuple = None, None, None, None  # type: ignore
+
+from ..metrics import normalize_tags, is_string
+
+MAX_CACHED_SAMPLE_RATES = 1024
+MAX_CACHED_TAG_SETS = 1024
+
+_encoded_sample_rates = {}  # type: Dict[float, bytes]
+
+
+def encode_sample_rate(rate):
+    # type: (float) -> bytes
+    try:
+        return _encoded_sample_rates[rate]
+    except KeyError:
+        pass
+    encoded = b"" if rate == 1 else "|@{:n}".format(rate).encode()
+    if len(_encoded_sample_rates) < MAX_CACHED_SAMPLE_RATES:
+        _encoded_sample_rates[rate] = encoded
+    return encoded
+
+
+def encode_tags(tags):
+    # type: (Iterable[str]) -> bytes
+    """Encode the tags section of requests (b"|#k:v,k2"), tags should be normalized"""
+
+    if not tags:
+        return b""
+    return ("|#" + ",".join(tags)).encode('utf-8')
+
+
+class TagSet(object):
+    """Immutable set of tags, normalized, sorted and encoded once.
+
+    Tag sets are compared by identity, so clients cache what they need
+    (i.e the tags merged with constant tags of the client) per tag set object.
+    Create the tag sets of a code path once, and pass them to the clients.
+
+    >>> tags = TagSet({"region": "eu", "canary": None})
+    >>> client.increment("requests", tags=tags)
+    """
+
+    __slots__ = ('_tags', '_encoded')
+
+    def __init__(self, tags=()):
+        # type: (Any) -> None
+        self._tags = normalize_tags(tags)  # type: Tuple[str, ...]
+        self._encoded = encode_tags(self._tags)  # type: bytes
+
+    @property
+    def tags(self):
+        # type: () -> Tuple[str, ...]
+        return self._tags
+
+    @property
+    def encoded(self):
+        # type: () -> bytes
+        """The encoded tags section of requests, empty without tags"""
+        return self._encoded
+
+    def union(self, other):
+        # type: (TagSet) -> TagSet
+        """Return a new tag set of the tags of both tag sets"""
+
+        if not other._tags:
+            return self
+        if not self._tags:
+            return other
+        return TagSet(self._tags + other._tags)
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._tags)
+
+    def __iter__(self):
+        return iter(self._tags)
+
+    def __repr__(self):
+        # type: () -> str
+        return "TagSet({!r})".format(self._tags)
+
+
+_tag_sets = {}  # type: Dict[Any, TagSet]
+
+
+def create_tag_set(tags):
+    # type: (Any) -> TagSet
+    """Return a tag set of the tags, cached by their values.
+
+    Tags can be a TagSet (returned as is), a dict or an iterable of tag strings.
+    """
+
+    if isinstance(tags, TagSet):
+        return tags
+    if isinstance(tags, dict):
+        key = tuple(tags.items())  # type: Any
+    elif isinstance(tags, tuple) or is_string(tags):
+        key = tags
+    else:
+        key = tags = tuple(tags)
+    try:
+        tag_set = _tag_sets.get(key)
+    except TypeError:
+        # tags with unhashable values are not cached
+        return TagSet(tags)
+    if tag_set is None:
+        tag_set = TagSet(tags)
+        if len(_tag_sets) < MAX_CACHED_TAG_SETS:
+            _tag_sets[key] = tag_set
+    return tag_set
+
+
+def encode_counter(name, count, rate=1):
+    # type: (bytes, int, float) -> bytes
+    request = name + b":" + str(count).encode() + b"|c"
+    if rate == 1:
+        return request
+    return request + encode_sample_rate(rate)
+
+
+def encode_timer(name, milliseconds, rate=1):
+    # type: (bytes, int, float) -> bytes
+    request = name + b":" + str(milliseconds).encode() + b"|ms"
+    if rate == 1:
+        return request
+    return request + encode_sample_rate(rate)
+
+
+def encode_gauge(name, value, rate=1):
+    # type: (bytes, float, float) -> bytes
+    # float() so subclasses (i.e numpy.float64) are not formatted by their own repr
+    if isinstance(value, float):
+        request = name + b":" + str(float(value)).encode() + b"|g"
+    else:
+        request = name + b":" + str(int(value)).encode() + b"|g"
+    if rate == 1:
+        return request
+    return request + encode_sample_rate(rate)
+
+
+def encode_gauge_delta(name, delta, rate=1):
+    # type: (bytes, float, float) -> bytes
+    if isinstance(delta, float):
+        request = name + b":" + "{:+n}".format(float(delta)).encode() + b"|g"
+    else:
+        request = name + b":" + "{:+d}".format(int(delta)).encode() + b"|g"
+    if rate == 1:
+        return request
+    return request + encode_sample_rate(rate)
+
+
+def encode_set(name, value, rate=1):
+    # type: (bytes, str, float) -> bytes
+    request = name + b":" + value.encode() + b"|s"
+    if rate == 1:
+        return request
+    return request + encode_sample_rate(rate)
+
+
+__all__ = ['TagSet', 'create_tag_set', 'encode_tags', 'encode_sample_rate', 'encode_counter', 'encode_timer',
+           'encode_gauge', 'encode_gauge_delta', 'encode_set']
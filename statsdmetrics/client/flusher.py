@@ -0,0 +1,237 @@
+"""
+statsdmetrics.client.flusher
+----------------------------
+Flush batch clients in a background thread
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import atexit
+from collections import deque
+from threading import Condition, Event, Lock, Thread
+from time import time
+from weakref import ref, WeakSet
+
+try:
+    from typing import Any
+except ImportError:
+    Any = None  # type: ignore
+
+DROP_NEWEST = 'newest'
+DROP_OLDEST = 'oldest'
+DEFAULT_FLUSH_INTERVAL = 1000
+DEFAULT_QUEUE_SIZE = 10000
+
+_running_flushers = WeakSet()  # type: WeakSet
+
+
+class BackgroundFlusher(object):
+    """Flush a batch client periodically in a background thread.
+
+    Metrics are enqueued in a bounded queue by the client (from any thread),
+    and the background thread moves them to the client batches and flushes
+    the client every interval (in milliseconds), or sooner when the queued
+    metrics reach the threshold (in bytes).
+
+    When the queue is full, either the new metrics are dropped (DROP_NEWEST)
+    or the oldest queued metrics are dropped (DROP_OLDEST), and counted.
+    Running flushers are stopped and flushed when the interpreter exits.
+    """
+
+    def __init__(self, client, interval=DEFAULT_FLUSH_INTERVAL, threshold=None,
+                 queue_size=DEFAULT_QUEUE_SIZE, drop_policy=DROP_NEWEST):
+        # type: (Any, float, int, int, str) -> None
+        assert interval > 0, "Flush interval should be positive"
+        queue_size = int(queue_size)
+        assert queue_size > 0, "Flush queue size should be positive"
+        assert drop_policy in (DROP_NEWEST, DROP_OLDEST), \
+            "Drop policy should be one of '{}' or '{}'".format(DROP_NEWEST, DROP_OLDEST)
+        if threshold is None:
+            threshold = client.batch_size * 8
+        threshold = int(threshold)
+        assert threshold > 0, "Flush threshold should be positive"
+
+        self._client = ref(client)
+        self._interval = interval  # type: float
+        self._threshold = threshold  # type: int
+        self._queue_size = queue_size  # type: int
+        self._drop_policy = drop_policy  # type: str
+        self._queue = deque()  # type: deque
+        self._queued_bytes = 0  # type: int
+        self._dropped = 0  # type: int
+        self._errors = 0  # type: int
+        self._lock = Lock()  # type: Lock
+        self._wakeup = Event()  # type: Event
+        self._flushed = Condition(Lock())  # type: Condition
+        self._flush_requests = 0  # type: int
+        self._flushed_requests = 0  # type: int
+        self._stopping = False  # type: bool
+        self._running = False  # type: bool
+        self._thread = Thread(target=self._run, name="statsdmetrics-flusher")
+        self._thread.daemon = True
+
+    @property
+    def interval(self):
+        # type: () -> float
+        return self._interval
+
+    @property
+    def threshold(self):
+        # type: () -> int
+        return self._threshold
+
+    @property
+    def queue_size(self):
+        # type: () -> int
+        return self._queue_size
+
+    @property
+    def drop_policy(self):
+        # type: () -> str
+        return self._drop_policy
+
+    @property
+    def dropped(self):
+        # type: () -> int
+        """Number of metrics dropped because the queue was full"""
+        return self._dropped
+
+    @property
+    def errors(self):
+        # type: () -> int
+        """Number of failed flushes"""
+        return self._errors
+
+    @property
+    def running(self):
+        # type: () -> bool
+        return self._running
+
+    def start(self):
+        # type: () -> BackgroundFlusher
+        self._running = True
+        self._thread.start()
+        _running_flushers.add(self)
+        return self
+
+    def enqueue(self, data):
+        # type: (bytes) -> bool
+        """Add a request to the queue, return False if the request was dropped"""
+
+        with self._lock:
+            queue = self._queue
+            if len(queue) >= self._queue_size:
+                self._dropped += 1
+                if self._drop_policy == DROP_NEWEST:
+                    return False
+                self._queued_bytes -= len(queue.popleft())
+            queue.append(data)
+            self._queued_bytes += len(data)
+            if self._queued_bytes >= self._threshold:
+                self._wakeup.set()
+        return True
+
+    def clear(self):
+        # type: () -> BackgroundFlusher
+        """Drop queued data"""
+
+        with self._lock:
+            self._queue = deque()
+            self._queued_bytes = 0
+        return self
+
+    def flush(self, timeout=None):
+        # type: (float) -> bool
+        """Flush the client in the background thread, and wait for it.
+
+        Returns False if the flush did not complete before timeout (in seconds).
+        """
+
+        if not self.running:
+            return False
+        with self._flushed:
+            self._flush_requests += 1
+            request = self._flush_requests
+        self._wakeup.set()
+        deadline = None if timeout is None else time() + timeout
+        with self._flushed:
+            while self._flushed_requests < request and self.running:
+                remaining = None if deadline is None else deadline - time()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._flushed.wait(remaining)
+            return self._flushed_requests >= request
+
+    def stop(self, flush=True, timeout=None):
+        # type: (bool, float) -> BackgroundFlusher
+        """Stop the background thread, flushing the client first if flush is True"""
+
+        if not flush:
+            self.clear()
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        _running_flushers.discard(self)
+        return self
+
+    def _run(self):
+        # type: () -> None
+        try:
+            self._flush_periodically()
+        finally:
+            self._running = False
+            with self._flushed:
+                self._flushed.notify_all()
+
+    def _flush_periodically(self):
+        # type: () -> None
+        interval = self._interval / 1000.0
+        while True:
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            with self._flushed:
+                request = self._flush_requests
+            client = self._client()
+            if client is None:
+                break
+            self._flush_client(client)
+            del client
+            with self._flushed:
+                self._flushed_requests = request
+                self._flushed.notify_all()
+            if self._stopping:
+                break
+
+    def _flush_client(self, client):
+        # type: (Any) -> None
+        try:
+            self._buffer_queued(client)
+            client._flush()
+        except Exception:
+            # drop the batches that failed, to keep the memory bounded,
+            # and keep the thread running to flush the next metrics
+            self._errors += 1
+            client._batches.clear()
+
+    def _buffer_queued(self, client):
+        # type: (Any) -> None
+        """Move the queued metrics to the client batches"""
+
+        with self._lock:
+            queue, self._queue = self._queue, deque()
+            self._queued_bytes = 0
+        for data in queue:
+            client._buffer(data)
+
+
+@atexit.register
+def _stop_running_flushers():
+    # type: () -> None
+    for flusher in list(_running_flushers):
+        flusher.stop()
+
+
+__all__ = ['BackgroundFlusher', 'DROP_NEWEST', 'DROP_OLDEST']
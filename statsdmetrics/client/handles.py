@@ -0,0 +1,220 @@
+"""
+statsdmetrics.client.handles
+----------------------------
+Handles to send metrics of a name, that is normalized and encoded once
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+try:
+    from typing import Any, Tuple
+except ImportError:
+    Any, Tuple = None, None  # type: ignore
+
+from .encoding import encode_sample_rate
+from ..metrics import is_numeric
+
+
+class MetricHandle(object):
+    """Send metrics of a single name with a client.
+
+    The metric name is normalized, prefixed (with the prefix of the client
+    when the handle is created) and encoded once, along with the head of the
+    requests (b"prefix.name:"), so sending a metric only encodes the value.
+
+    Tags of the handle are merged with the constant tags of the client (when the
+    handle is created) and encoded once too.
+
+    Metrics are sampled by the client, and aggregated if the client aggregates.
+    """
+
+    __slots__ = ('_client', '_name', '_metric_name', '_head', '_tags', '_encoded_tags', '_aggregator')
+
+    def __init__(self, client, name, tags=None):
+        # type: (Any, str, Any) -> None
+        self._client = client
+        self._name = name  # type: str
+        self._metric_name = client._create_metric_name_for_request(name)  # type: str
+        self._head = client._create_encoded_metric_name_for_request(name) + b":"  # type: bytes
+        tag_set = client._tag_set(tags)
+        self._tags = tag_set.tags  # type: Tuple[str, ...]
+        self._encoded_tags = tag_set.encoded  # type: bytes
+        self._aggregator = getattr(client, '_aggregator', None)
+
+    @property
+    def client(self):
+        return self._client
+
+    @property
+    def name(self):
+        # type: () -> str
+        """The metric name as passed to the client"""
+        return self._name
+
+    @property
+    def metric_name(self):
+        # type: () -> str
+        """The normalized prefixed metric name"""
+        return self._metric_name
+
+    @property
+    def tags(self):
+        # type: () -> Tuple[str, ...]
+        """Tags of the metrics, with the constant tags of the client"""
+        return self._tags
+
+    def _sample_rate(self, rate):
+        # type: (float) -> float
+        client = self._client
+        if rate >= 1 and client._sampler is None:
+            return rate
+        return client._sample_rate(self._name, rate)
+
+    def _send(self, request, rate):
+        # type: (bytes, float) -> None
+        if rate != 1:
+            request += encode_sample_rate(rate)
+        if self._encoded_tags:
+            request += self._encoded_tags
+        self._client._request(request)
+
+
+class CounterHandle(MetricHandle):
+    """Handle to send Counter metrics of a name
+
+    >>> requests = client.counter_handle("api.requests")
+    >>> requests.inc()
+    >>> requests.inc(3)
+    >>> requests.dec(rate=0.5)
+    """
+
+    __slots__ = ('_increment_request', '_decrement_request')
+
+    def __init__(self, client, name, tags=None):
+        # type: (Any, str, Any) -> None
+        MetricHandle.__init__(self, client, name, tags)
+        self._increment_request = self._head + b"1|c"  # type: bytes
+        self._decrement_request = self._head + b"-1|c"  # type: bytes
+
+    def inc(self, count=1, rate=1):
+        # type: (int, float) -> None
+        """Increment the Counter"""
+
+        rate = self._sample_rate(rate)
+        if not rate:
+            return
+        if self._aggregator is not None:
+            self._aggregator.increment(self._metric_name, int(count), rate, self._tags)
+        elif count == 1:
+            self._send(self._increment_request, rate)
+        else:
+            self._send(self._head + str(int(count)).encode() + b"|c", rate)
+
+    def dec(self, count=1, rate=1):
+        # type: (int, float) -> None
+        """Decrement the Counter"""
+
+        rate = self._sample_rate(rate)
+        if not rate:
+            return
+        if self._aggregator is not None:
+            self._aggregator.increment(self._metric_name, -1 * int(count), rate, self._tags)
+        elif count == 1:
+            self._send(self._decrement_request, rate)
+        else:
+            self._send(self._head + str(-1 * int(count)).encode() + b"|c", rate)
+
+
+class TimerHandle(MetricHandle):
+    """Handle to send Timer metrics of a name
+
+    >>> query = client.timer_handle("db.query")
+    >>> query.timing(12)
+    """
+
+    __slots__ = ()
+
+    def timing(self, milliseconds, rate=1):
+        # type: (float, float) -> None
+        """Send a Timer metric with the duration in milliseconds"""
+
+        rate = self._sample_rate(rate)
+        if not rate:
+            return
+        milliseconds = int(milliseconds)
+        assert milliseconds >= 0, 'Timer milliseconds should not be negative'
+        if self._aggregator is not None:
+            self._aggregator.timing(self._metric_name, milliseconds, rate, self._tags)
+        else:
+            self._send(self._head + str(milliseconds).encode() + b"|ms", rate)
+
+
+class GaugeHandle(MetricHandle):
+    """Handle to send Gauge metrics of a name
+
+    >>> memory = client.gauge_handle("memory")
+    >>> memory.set(1024)
+    >>> memory.delta(-128)
+    """
+
+    __slots__ = ()
+
+    def set(self, value, rate=1):
+        # type: (float, float) -> None
+        """Send a Gauge metric with the value"""
+
+        rate = self._sample_rate(rate)
+        if not rate:
+            return
+        if not is_numeric(value):
+            value = float(value)
+        assert value >= 0, 'Gauge value should not be negative'
+        if self._aggregator is not None:
+            self._aggregator.gauge(self._metric_name, value, self._tags)
+        elif isinstance(value, float):
+            self._send(self._head + str(float(value)).encode() + b"|g", rate)
+        else:
+            self._send(self._head + str(int(value)).encode() + b"|g", rate)
+
+    def delta(self, delta, rate=1):
+        # type: (float, float) -> None
+        """Send a GaugeDelta metric to change the Gauge by the value"""
+
+        rate = self._sample_rate(rate)
+        if not rate:
+            return
+        if not is_numeric(delta):
+            delta = float(delta)
+        if self._aggregator is not None:
+            self._aggregator.gauge_delta(self._metric_name, delta, self._tags)
+        elif isinstance(delta, float):
+            self._send(self._head + "{:+n}".format(float(delta)).encode() + b"|g", rate)
+        else:
+            self._send(self._head + "{:+d}".format(int(delta)).encode() + b"|g", rate)
+
+
+class SetHandle(MetricHandle):
+    """Handle to send Set metrics of a name
+
+    >>> users = client.set_handle("users")
+    >>> users.add("first")
+    """
+
+    __slots__ = ()
+
+    def add(self, value, rate=1):
+        # type: (str, float) -> None
+        """Send a Set metric with the unique value"""
+
+        rate = self._sample_rate(rate)
+        if not rate:
+            return
+        if self._aggregator is not None:
+            self._aggregator.set(self._metric_name, str(value), self._tags)
+        else:
+            self._send(self._head + str(value).encode() + b"|s", rate)
+
+
+__all__ = ['MetricHandle', 'CounterHandle', 'TimerHandle', 'GaugeHandle', 'SetHandle']
@@ -0,0 +1,155 @@
+"""
+statsdmetrics.client.resolver
+-----------------------------
+Resolve host names of Statsd servers, and refresh them in background
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import socket
+from threading import Lock, Thread
+
+try:
+    from time import monotonic as clock
+except ImportError:
+    from time import time as clock  # type: ignore
+
+try:
+    from typing import List, Tuple
+except ImportError:
+    List, Tuple = None, None  # type: ignore
+
+DEFAULT_TTL = 60000
+DEFAULT_RETRY_DELAY = 1000
+
+
+def address_family(address):
+    # type: (Tuple) -> int
+    """Return the socket family of a resolved address"""
+
+    return socket.AF_INET6 if len(address) == 4 else socket.AF_INET
+
+
+class Resolver(object):
+    """Resolve the host to addresses by getaddrinfo, and cache them for ttl milliseconds.
+
+    The first resolution is done when an address is requested, and blocks.
+    After that, expired addresses are refreshed in a background thread while
+    the cached addresses are still used, so sending metrics does not wait for DNS.
+    If refreshing fails, cached addresses are kept and refreshing is retried after
+    retry_delay milliseconds.
+
+    When the host has multiple addresses, they are used in round-robin order.
+    Addresses are of a single family. IPv4 addresses are preferred (as servers
+    commonly listen on IPv4 only), and IPv6 addresses are used if the host has
+    no IPv4 address, unless the family is specified.
+    """
+
+    def __init__(self, host, port, socket_type=socket.SOCK_DGRAM, family=socket.AF_UNSPEC,
+                 ttl=DEFAULT_TTL, retry_delay=DEFAULT_RETRY_DELAY):
+        # type: (str, int, int, int, float, float) -> None
+        assert ttl > 0, "Resolver TTL should be positive"
+        assert retry_delay > 0, "Resolver retry delay should be positive"
+        self._host = host  # type: str
+        self._port = port  # type: int
+        self._socket_type = socket_type  # type: int
+        self._family = family  # type: int
+        self._ttl = ttl  # type: float
+        self._retry_delay = retry_delay  # type: float
+        self._addresses = []  # type: List[Tuple]
+        self._index = 0  # type: int
+        self._expires = 0.0  # type: float
+        self._errors = 0  # type: int
+        self._refreshing = False  # type: bool
+        self._lock = Lock()  # type: Lock
+
+    @property
+    def host(self):
+        # type: () -> str
+        return self._host
+
+    @property
+    def port(self):
+        # type: () -> int
+        return self._port
+
+    @property
+    def ttl(self):
+        # type: () -> float
+        return self._ttl
+
+    @property
+    def addresses(self):
+        # type: () -> List[Tuple]
+        """Cached addresses, resolving the host if not resolved yet"""
+
+        if not self._addresses:
+            self.resolve()
+        return list(self._addresses)
+
+    @property
+    def errors(self):
+        # type: () -> int
+        """Number of failed refreshes in background"""
+        return self._errors
+
+    def address(self):
+        # type: () -> Tuple
+        """Return the next address, resolving the host if not resolved yet"""
+
+        if clock() >= self._expires:
+            self._refresh()
+        addresses = self._addresses
+        if len(addresses) == 1:
+            return addresses[0]
+        # a race between threads only affects the order of addresses
+        index = (self._index + 1) % len(addresses)
+        self._index = index
+        return addresses[index]
+
+    def resolve(self):
+        # type: () -> List[Tuple]
+        """Resolve the host now, and return the addresses"""
+
+        infos = socket.getaddrinfo(self._host, self._port, self._family, self._socket_type)
+        families = set(info[0] for info in infos)
+        family = socket.AF_INET if socket.AF_INET in families else infos[0][0]
+        addresses = []  # type: List[Tuple]
+        for info in infos:
+            address = info[4]
+            if info[0] == family and address not in addresses:
+                addresses.append(address)
+        self._addresses = addresses
+        self._expires = clock() + self._ttl / 1000.0
+        return list(addresses)
+
+    def _refresh(self):
+        # type: () -> None
+        if not self._addresses:
+            with self._lock:
+                if not self._addresses:
+                    self.resolve()
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            # use the cached addresses until refreshed
+            self._expires = clock() + self._retry_delay / 1000.0
+        thread = Thread(target=self._refresh_in_background, name="statsdmetrics-resolver")
+        thread.daemon = True
+        thread.start()
+
+    def _refresh_in_background(self):
+        # type: () -> None
+        try:
+            self.resolve()
+        except (socket.error, socket.herror, socket.gaierror, UnicodeError):
+            self._errors += 1
+        finally:
+            self._refreshing = False
+
+
+__all__ = ['Resolver', 'address_family']
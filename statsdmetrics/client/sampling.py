@@ -0,0 +1,233 @@
+"""
+statsdmetrics.client.sampling
+-----------------------------
+Sampling strategies, to decide which metrics clients send at sample rates
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+from abc import ABCMeta, abstractmethod
+from random import random
+
+try:
+    from time import monotonic as clock
+except ImportError:
+    from time import time as clock  # type: ignore
+
+try:
+    from typing import Dict, List
+except ImportError:
+    Dict, List = None, None  # type: ignore
+
+DEFAULT_MAX_NAMES = 10000
+DEFAULT_BUDGET = 1000
+DEFAULT_INTERVAL = 1000
+DEFAULT_MIN_RATE = 0.001
+
+# tolerance of accumulated float rates
+_EPSILON = 1e-9
+
+
+class AbstractSampler(object):
+    """Sampling strategy of clients.
+
+    Clients call sample() for each metric, with the metric name
+    (as passed to the client, without the prefix) and the sample rate
+    of the call, and send the metric with the returned rate, or skip it
+    if the returned rate is 0.
+    """
+
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def sample(self, name, rate):
+        # type: (str, float) -> float
+        """Return the sample rate to send the metric with, or 0 to skip it"""
+        pass
+
+
+class RandomSampler(AbstractSampler):
+    """Send each metric with the probability of its sample rate.
+
+    This is the default sampling of clients.
+    """
+
+    def sample(self, name, rate):
+        # type: (str, float) -> float
+        return rate if rate >= 1 or random() <= rate else 0
+
+
+class CountingSampler(AbstractSampler):
+    """Deterministic sampling, counting the calls of each metric name.
+
+    Rates of each name are accumulated per call and a metric is sent whenever
+    they add up to 1, i.e exactly 1 in 10 calls with rate 0.1 (the first call
+    is sent). The number of sent metrics is exact, so counts of low rate
+    metrics are not noisy like random sampling.
+
+    Counts of at most max_names names are kept, after that the counts are
+    reset. When used by multiple threads the counts are approximate.
+    """
+
+    def __init__(self, max_names=DEFAULT_MAX_NAMES):
+        # type: (int) -> None
+        max_names = int(max_names)
+        assert max_names > 0, "Sampler max names should be positive"
+        self._max_names = max_names  # type: int
+        self._credits = {}  # type: Dict[str, float]
+
+    @property
+    def max_names(self):
+        # type: () -> int
+        return self._max_names
+
+    def sample(self, name, rate):
+        # type: (str, float) -> float
+        if rate >= 1:
+            return rate
+        credits = self._credits
+        try:
+            credit = credits[name] + rate
+        except KeyError:
+            if len(credits) >= self._max_names:
+                self._credits = credits = {}
+            credit = 1.0
+        if credit >= 1 - _EPSILON:
+            credits[name] = credit - 1
+            return rate
+        credits[name] = credit
+        return 0
+
+
+class RateTableSampler(AbstractSampler):
+    """Sample metrics with the rates of a table of metric names.
+
+    Names that are not in the table are sampled with the default rate, or
+    the rate of the call if default is None. The sampler (random by default)
+    decides which metrics are sent with the rate.
+    """
+
+    def __init__(self, rates, default=None, sampler=None):
+        # type: (Dict[str, float], float, AbstractSampler) -> None
+        for rate in rates.values():
+            assert 0 < rate <= 1, "Sample rates should be between 0 and 1"
+        assert default is None or 0 < default <= 1, "Default sample rate should be between 0 and 1"
+        self._rates = dict(rates)  # type: Dict[str, float]
+        self._default = default  # type: float
+        self._sampler = sampler or RandomSampler()  # type: AbstractSampler
+
+    @property
+    def rates(self):
+        # type: () -> Dict[str, float]
+        return dict(self._rates)
+
+    @property
+    def default(self):
+        # type: () -> float
+        return self._default
+
+    def set_rate(self, name, rate):
+        # type: (str, float) -> RateTableSampler
+        """Set the sample rate of the name, None removes it from the table"""
+
+        if rate is None:
+            self._rates.pop(name, None)
+        else:
+            assert 0 < rate <= 1, "Sample rates should be between 0 and 1"
+            self._rates[name] = rate
+        return self
+
+    def sample(self, name, rate):
+        # type: (str, float) -> float
+        try:
+            rate = self._rates[name]
+        except KeyError:
+            if self._default is not None:
+                rate = self._default
+        return self._sampler.sample(name, rate)
+
+
+class AdaptiveSampler(AbstractSampler):
+    """Lower sample rates of metric names called more often than a budget.
+
+    Calls of each name are counted in intervals (in milliseconds). When a name
+    is called more than budget times per second, its rate is lowered for the
+    next interval so about budget metrics per second are sent, down to min_rate.
+    When the calls drop below the budget, the rate of the call is used again.
+
+    High frequency metrics shed load automatically, while low frequency
+    metrics are sent with the rate of the call. The sampler (counting by
+    default) decides which metrics are sent with the lowered rate.
+    """
+
+    def __init__(self, budget=DEFAULT_BUDGET, interval=DEFAULT_INTERVAL, min_rate=DEFAULT_MIN_RATE,
+                 sampler=None, max_names=DEFAULT_MAX_NAMES):
+        # type: (float, float, float, AbstractSampler, int) -> None
+        assert budget > 0, "Sampler budget should be positive"
+        assert interval > 0, "Sampler interval should be positive"
+        assert 0 < min_rate <= 1, "Sampler min rate should be between 0 and 1"
+        max_names = int(max_names)
+        assert max_names > 0, "Sampler max names should be positive"
+        self._budget = budget  # type: float
+        self._interval = interval  # type: float
+        self._min_rate = min_rate  # type: float
+        self._sampler = sampler or CountingSampler(max_names)  # type: AbstractSampler
+        self._max_names = max_names  # type: int
+        # name: [interval end time, calls in the interval, rate factor]
+        self._names = {}  # type: Dict[str, List]
+
+    @property
+    def budget(self):
+        # type: () -> float
+        return self._budget
+
+    @property
+    def interval(self):
+        # type: () -> float
+        return self._interval
+
+    @property
+    def min_rate(self):
+        # type: () -> float
+        return self._min_rate
+
+    def rate_factor(self, name):
+        # type: (str) -> float
+        """Return the factor the rates of the name are lowered by (1 for not lowered)"""
+
+        state = self._names.get(name)
+        return 1.0 if state is None else state[2]
+
+    def sample(self, name, rate):
+        # type: (str, float) -> float
+        now = clock()
+        names = self._names
+        try:
+            state = names[name]
+        except KeyError:
+            if len(names) >= self._max_names:
+                self._names = names = {}
+            state = names[name] = [now + self._interval / 1000.0, 0, 1.0]
+        state[1] += 1
+        if now >= state[0]:
+            self._adapt(state, now)
+        if state[2] < 1:
+            rate = max(rate * state[2], min(rate, self._min_rate))
+        return self._sampler.sample(name, rate)
+
+    def _adapt(self, state, now):
+        # type: (List, float) -> None
+        interval = self._interval / 1000.0
+        # count the elapsed time of idle intervals too, so a name
+        # that is called rarely does not look like a burst
+        elapsed = interval + now - state[0]
+        calls_per_second = state[1] / elapsed
+        state[2] = min(1.0, self._budget / calls_per_second)
+        state[0] = now + interval
+        state[1] = 0
+
+
+__all__ = ['AbstractSampler', 'RandomSampler', 'CountingSampler',
+           'RateTableSampler', 'AdaptiveSampler']
@@ -0,0 +1,260 @@
+"""
+statsdmetrics.client.sharding
+-----------------------------
+Statsd client to spread metrics over multiple servers by consistent hashing
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import struct
+from bisect import bisect, insort
+from collections import OrderedDict
+from hashlib import md5
+from threading import Lock
+
+try:
+    from typing import Dict, Iterable, List, Tuple, Union
+except ImportError:
+    Dict, Iterable, List, Tuple, Union = None, None, None, None, None  # type: ignore
+
+from . import AbstractClient, BatchClient, DEFAULT_PORT, DEFAULT_NAME_CACHE_SIZE
+
+DEFAULT_REPLICAS = 160
+
+
+def _hash(key):
+    # type: (bytes) -> int
+    return struct.unpack('<Q', md5(key).digest()[:8])[0]
+
+
+class HashRing(object):
+    """Consistent hash ring of nodes.
+
+    Each node is placed on the ring at replicas points (virtual nodes), and
+    a key belongs to the node of the first point after the hash of the key.
+    Adding or removing a node only moves the keys of the points of that node,
+    about 1/N of the keys, and the rest of the keys keep their nodes.
+    """
+
+    def __init__(self, nodes=(), replicas=DEFAULT_REPLICAS):
+        # type: (Iterable[str], int) -> None
+        replicas = int(replicas)
+        assert replicas > 0, "Hash ring replicas should be positive"
+        self._replicas = replicas  # type: int
+        self._nodes = []  # type: List[str]
+        self._points = []  # type: List[Tuple[int, str]]
+        self._hashes = []  # type: List[int]
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def replicas(self):
+        # type: () -> int
+        return self._replicas
+
+    @property
+    def nodes(self):
+        # type: () -> List[str]
+        return list(self._nodes)
+
+    def add(self, node):
+        # type: (str) -> HashRing
+        """Add the node to the ring, if not added already"""
+
+        if node in self._nodes:
+            return self
+        self._nodes.append(node)
+        encoded_node = node.encode()
+        for replica in range(self._replicas):
+            insort(self._points, (_hash(encoded_node + b"-" + str(replica).encode()), node))
+        self._hashes = [point[0] for point in self._points]
+        return self
+
+    def remove(self, node):
+        # type: (str) -> HashRing
+        """Remove the node from the ring"""
+
+        if node not in self._nodes:
+            raise KeyError("Node '{}' is not in the hash ring".format(node))
+        self._nodes.remove(node)
+        self._points = [point for point in self._points if point[1] != node]
+        self._hashes = [point[0] for point in self._points]
+        return self
+
+    def get(self, key):
+        # type: (bytes) -> str
+        """Return the node of the key"""
+
+        if not self._points:
+            raise LookupError("Hash ring has no nodes")
+        index = bisect(self._hashes, _hash(key))
+        if index == len(self._hashes):
+            index = 0
+        return self._points[index][1]
+
+    def __len__(self):
+        # type: () -> int
+        return len(self._nodes)
+
+    def __contains__(self, node):
+        # type: (str) -> bool
+        return node in self._nodes
+
+
+class ShardedClient(AbstractClient):
+    """Statsd client spreading metrics over multiple servers by
+    consistent hashing of metric names, so all the metrics of a name
+    are sent to the same server.
+
+    Each server (shard) has its own batch client, buffering the metrics
+    of the shard and sending them in batch requests on flush.
+
+    >>> client = ShardedClient([("stats1.example.org", 8125), ("stats2.example.org", 8125)])
+    >>> client.increment("event")
+    >>> client.timing("query", 3)
+    >>> client.flush()
+    """
+
+    def __init__(self, servers, prefix='', batch_size=512, replicas=DEFAULT_REPLICAS,
+                 name_cache_size=DEFAULT_NAME_CACHE_SIZE, client_class=BatchClient):
+        # type: (Iterable[Union[str, Tuple[str, int]]], str, int, int, int, type) -> None
+        batch_size = int(batch_size)
+        assert batch_size > 0, "Sharded client batch size should be positive"
+        self._batch_size = batch_size  # type: int
+        self._client_class = client_class  # type: type
+        self._shards = OrderedDict()  # type: OrderedDict
+        self._ring = HashRing(replicas=replicas)  # type: HashRing
+        self._routes = {}  # type: Dict[bytes, AbstractClient]
+        self._routes_size = max(int(name_cache_size), 1)  # type: int
+        self._lock = Lock()  # type: Lock
+        AbstractClient.__init__(self, None, None, prefix, name_cache_size)
+        for server in servers:
+            if isinstance(server, tuple):
+                self.add_server(*server)
+            else:
+                self.add_server(server)
+
+    @property
+    def remote_address(self):
+        # type: () -> None
+        """Sharded clients send metrics to the servers of their shards"""
+        return None
+
+    @property
+    def batch_size(self):
+        # type: () -> int
+        return self._batch_size
+
+    @property
+    def ring(self):
+        # type: () -> HashRing
+        return self._ring
+
+    @property
+    def shards(self):
+        # type: () -> List[AbstractClient]
+        """Batch clients of the servers"""
+        return list(self._shards.values())
+
+    def add_server(self, host, port=DEFAULT_PORT):
+        # type: (str, int) -> AbstractClient
+        """Add a server as a new shard, and return the batch client of the shard.
+
+        Only the metric names that the new shard owns on the hash ring
+        are moved to it.
+        """
+
+        shard = self._client_class(host, port, self.prefix, self._batch_size)
+        shard._name_cache = self._name_cache
+        node = _node_name(shard.host, shard.port)
+        with self._lock:
+            assert node not in self._shards, "Server '{}' is already a shard".format(node)
+            self._shards[node] = shard
+            self._ring.add(node)
+            self._routes = {}
+        return shard
+
+    def remove_server(self, host, port=DEFAULT_PORT):
+        # type: (str, int) -> AbstractClient
+        """Remove the shard of the server, flush and return its batch client.
+
+        Metric names of the removed shard are spread over the rest of the shards.
+        """
+
+        node = _node_name(host, int(port))
+        with self._lock:
+            shard = self._shards.pop(node)
+            self._ring.remove(node)
+            self._routes = {}
+        shard.flush()
+        return shard
+
+    def shard(self, name):
+        # type: (str) -> AbstractClient
+        """Return the batch client of the shard of the metric name"""
+
+        return self._route(self._create_encoded_metric_name_for_request(name))
+
+    def clear(self):
+        # type: () -> ShardedClient
+        """Clear buffered metrics of all shards"""
+
+        for shard in self.shards:
+            shard.clear()
+        return self
+
+    def flush(self):
+        # type: () -> ShardedClient
+        """Send buffered metrics of all shards in batch requests"""
+
+        for shard in self.shards:
+            shard.flush()
+        return self
+
+    def _set_port(self, port):
+        # type: (int) -> None
+        # each shard has its own server port
+        self._port = None
+
+    def _create_resolver(self):
+        # type: () -> None
+        return None
+
+    def _create_socket(self):
+        # type: () -> None
+        return None
+
+    def _request(self, data):
+        # type: (bytes) -> None
+        # normalized metric names have no colons, the name ends at the first one
+        self._route(data[:data.index(b":")])._request(data)
+
+    def _route(self, name):
+        # type: (bytes) -> AbstractClient
+        routes = self._routes
+        try:
+            return routes[name]
+        except KeyError:
+            pass
+        with self._lock:
+            shard = self._shards[self._ring.get(name)]
+            if len(self._routes) >= self._routes_size:
+                self._routes = {}
+            self._routes[name] = shard
+        return shard
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.flush()
+
+
+def _node_name(host, port):
+    # type: (str, int) -> str
+    return "{}:{}".format(host, port)
+
+
+__all__ = ['HashRing', 'ShardedClient']
@@ -8,20 +8,558 @@ For more information see LICENSE or README files, or
 https://opensource.org/licenses/MIT.
 """
 
+import atexit
+import os
 import socket
+from collections import deque
+from random import random
+from threading import Condition, Event, Lock, Thread, current_thread
+from weakref import WeakSet
+
+try:
+    from time import monotonic as clock
+except ImportError:
+    from time import time as clock  # type: ignore
+
+try:
+    from typing import Iterable, Optional
+except ImportError:
+    Iterable, Optional = None, None  # type: ignore
 
 from . import (AutoClosingSharedSocket, AbstractClient,
-        BatchClientMixIn, DEFAULT_PORT)
+        BatchClientMixIn, ThreadSafeBatchClientMixIn,
+        DEFAULT_PORT, DEFAULT_NAME_CACHE_SIZE, DROP_NEWEST, DROP_OLDEST,
+        _discard_sent_batches)
+from .aggregation import AggregatingClientMixIn
+from .resolver import Resolver, address_family
+
+DEFAULT_TIMEOUT = 1000
+DEFAULT_RECONNECT_DELAY = 100
+DEFAULT_MAX_RECONNECT_DELAY = 30000
+DEFAULT_RETRY_BUFFER_SIZE = 64 * 1024
+DEFAULT_SEND_BUFFER_SIZE = 64 * 1024
+
+_running_connections = WeakSet()  # type: WeakSet
+
+
+def _get_max_sendmsg_buffers():
+    # type: () -> int
+    try:
+        iov_max = os.sysconf('SC_IOV_MAX')
+    except (AttributeError, ValueError, OSError):
+        iov_max = -1
+    return iov_max if iov_max > 0 else 1024
+
+
+# max number of buffers passed to a single sendmsg() call (IOV_MAX)
+MAX_SENDMSG_BUFFERS = _get_max_sendmsg_buffers()
+
+
+def _create_auto_closing_shared_tcp_socket(client, connection_class=None):
+    # type: (AbstractClient, type) -> TCPConnection
+    connection = (connection_class or TCPConnection)(client.host, client.port, resolver=client.resolver)
+    connection.add_client(client)
+    return connection
+
+
+class TCPConnection(AutoClosingSharedSocket):
+    """Managed TCP connection, shared between TCP clients.
+
+    Connects lazily when sending the first request, and when sending fails
+    reconnects on the next request. Failed connection attempts are retried
+    after an exponentially growing delay (with jitter), up to max_reconnect_delay
+    milliseconds. While disconnected, requests are kept in a retry buffer of
+    retry_buffer_size bytes, and are sent first when connected again.
+    When the retry buffer is full, either the new requests are dropped (DROP_NEWEST)
+    or the oldest buffered requests (DROP_OLDEST), and the dropped metrics are counted.
+
+    Sending requests does not raise socket errors, they are counted instead.
+    Connecting and sending time out after timeout milliseconds.
+    """
+
+    def __init__(self, host, port, timeout=DEFAULT_TIMEOUT, reconnect_delay=DEFAULT_RECONNECT_DELAY,
+                 max_reconnect_delay=DEFAULT_MAX_RECONNECT_DELAY,
+                 retry_buffer_size=DEFAULT_RETRY_BUFFER_SIZE, drop_policy=DROP_NEWEST, resolver=None):
+        # type: (str, int, float, float, float, int, str, Resolver) -> None
+        AutoClosingSharedSocket.__init__(self, None)
+        self._host = host  # type: str
+        self._port = port  # type: int
+        self._resolver = resolver or self._create_resolver()  # type: Resolver
+        self._lock = Lock()  # type: Lock
+        self._retry_buffer = deque()  # type: deque
+        self._retry_buffer_used = 0  # type: int
+        self._next_connect_time = 0.0  # type: float
+        self._dropped = 0  # type: int
+        self._errors = 0  # type: int
+        self.timeout = timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.retry_buffer_size = retry_buffer_size
+        self.drop_policy = drop_policy
+        self._current_reconnect_delay = self._reconnect_delay  # type: float
+
+    @property
+    def connected(self):
+        # type: () -> bool
+        return self._socket is not None
+
+    @property
+    def dropped(self):
+        # type: () -> int
+        """Number of metrics dropped, because the retry buffer was full"""
+        return self._dropped
+
+    @property
+    def errors(self):
+        # type: () -> int
+        """Number of failed connection attempts and send errors"""
+        return self._errors
+
+    @property
+    def retry_buffer_used(self):
+        # type: () -> int
+        """Size of the requests in the retry buffer in bytes"""
+        return self._retry_buffer_used
+
+    @property
+    def timeout(self):
+        # type: () -> float
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, timeout):
+        # type: (float) -> None
+        assert timeout > 0, "Timeout should be positive"
+        self._timeout = timeout
+
+    @property
+    def reconnect_delay(self):
+        # type: () -> float
+        return self._reconnect_delay
+
+    @reconnect_delay.setter
+    def reconnect_delay(self, delay):
+        # type: (float) -> None
+        assert delay > 0, "Reconnect delay should be positive"
+        self._reconnect_delay = delay
+        self._current_reconnect_delay = delay
+
+    @property
+    def max_reconnect_delay(self):
+        # type: () -> float
+        return self._max_reconnect_delay
+
+    @max_reconnect_delay.setter
+    def max_reconnect_delay(self, delay):
+        # type: (float) -> None
+        assert delay > 0, "Max reconnect delay should be positive"
+        self._max_reconnect_delay = delay
+
+    @property
+    def retry_buffer_size(self):
+        # type: () -> int
+        return self._retry_buffer_size
+
+    @retry_buffer_size.setter
+    def retry_buffer_size(self, size):
+        # type: (int) -> None
+        size = int(size)
+        assert size >= 0, "Retry buffer size should not be negative"
+        self._retry_buffer_size = size
+
+    @property
+    def drop_policy(self):
+        # type: () -> str
+        return self._drop_policy
+
+    @drop_policy.setter
+    def drop_policy(self, policy):
+        # type: (str) -> None
+        assert policy in (DROP_NEWEST, DROP_OLDEST), \
+            "Drop policy should be one of '{}' or '{}'".format(DROP_NEWEST, DROP_OLDEST)
+        self._drop_policy = policy
+
+    def connect(self):
+        # type: () -> bool
+        """Connect now if not connected, and send the requests in the retry buffer.
+
+        Returns True if connected.
+        """
+
+        with self._lock:
+            self._next_connect_time = 0.0
+            if self._connect() and self._retry_buffer:
+                self._send(deque())
+            return self._socket is not None
+
+    def close(self):
+        # type: () -> None
+        with self._lock:
+            if self._closed:
+                return
+            self._disconnect()
+            self._drop(self._retry_buffer)
+            self._retry_buffer_used = 0
+            self._closed = True
+
+    def sendall(self, data):
+        # type: (bytes) -> None
+        """Send the request, or keep it in the retry buffer if not connected"""
+
+        with self._lock:
+            if self._socket is not None and not self._retry_buffer:
+                try:
+                    self._socket.sendall(data)
+                    return
+                except socket.error:
+                    self._on_send_error()
+            self._send(deque([bytearray(data)]))
+
+    def send_batches(self, batches):
+        # type: (deque) -> None
+        """Send the batches, or move them to the retry buffer if not connected"""
+
+        with self._lock:
+            self._send(batches)
+
+    def _send(self, batches):
+        # type: (deque) -> None
+        if not self._connect():
+            self._add_to_retry_buffer(batches)
+            return
+        retry_buffer = self._retry_buffer
+        try:
+            if retry_buffer:
+                self._send_batches(retry_buffer)
+                self._retry_buffer_used = 0
+            if batches:
+                self._send_batches(batches)
+        except socket.error:
+            self._on_send_error()
+            self._retry_buffer_used = sum(map(len, retry_buffer))
+            self._add_to_retry_buffer(batches)
+
+    def _send_batches(self, batches):
+        # type: (deque) -> None
+        if len(batches) > 1 and self.supports_sendmsg:
+            _sendmsg_batches(self, batches)
+        else:
+            _sendall_batches(self._socket, batches)
+
+    def _connect(self):
+        # type: () -> bool
+        if self._socket is not None:
+            return True
+        if self._closed or clock() < self._next_connect_time:
+            return False
+        try:
+            sock = self._open_socket()
+        except (socket.error, socket.herror, socket.gaierror, socket.timeout):
+            self._errors += 1
+            self._schedule_reconnect()
+            return False
+        self._socket = sock
+        self._current_reconnect_delay = self._reconnect_delay
+        return True
+
+    def _create_resolver(self):
+        # type: () -> Resolver
+        return Resolver(self._host, self._port, socket.SOCK_STREAM)
+
+    def _open_socket(self):
+        # type: () -> socket.socket
+        # connecting again after a failure tries the next address of the host
+        address = self._resolver.address()
+        return _connect_socket(address_family(address), address, self._timeout)
+
+    def _schedule_reconnect(self):
+        # type: () -> None
+        delay = self._current_reconnect_delay
+        self._next_connect_time = clock() + (delay + delay * random()) / 2000.0
+        self._current_reconnect_delay = min(delay * 2, self._max_reconnect_delay)
+
+    def _disconnect(self):
+        # type: () -> None
+        if self._socket is not None:
+            try:
+                self._socket.close()
+            finally:
+                self._socket = None
+
+    def _on_send_error(self):
+        # type: () -> None
+        self._errors += 1
+        self._disconnect()
+        self._next_connect_time = 0.0
+
+    def _add_to_retry_buffer(self, batches):
+        # type: (deque) -> None
+        retry_buffer = self._retry_buffer
+        max_size = self._retry_buffer_size
+        for batch in batches:
+            size = len(batch)
+            if self._drop_policy == DROP_OLDEST:
+                while retry_buffer and self._retry_buffer_used + size > max_size:
+                    self._retry_buffer_used -= len(retry_buffer[0])
+                    self._drop((retry_buffer.popleft(),))
+            if self._retry_buffer_used + size > max_size:
+                self._drop((batch,))
+                continue
+            retry_buffer.append(batch)
+            self._retry_buffer_used += size
+        batches.clear()
+
+    def _drop(self, batches):
+        # type: (Iterable[bytearray]) -> None
+        for batch in batches:
+            self._dropped += batch.count(b"\n")
+
+    def __getattr__(self, name):
+        if name.startswith('_') or self._socket is None:
+            raise AttributeError("'{}' has no attribute '{}' while not connected".format(
+                self.__class__.__name__, name))
+        return getattr(self._socket, name)
+
+
+class NonBlockingTCPConnection(TCPConnection):
+    """Managed TCP connection that sends requests in a helper thread.
+
+    Requests are added to a send buffer of send_buffer_size bytes, and the
+    caller returns without waiting for the socket. A helper thread (started
+    on the first request) drains the buffer to the connection. When the send
+    buffer is full, requests are dropped according to the drop policy and
+    counted, so a slow server does not block the callers.
+
+    Connecting, reconnecting and the retry buffer work the same as
+    :class:`TCPConnection`, in the helper thread.
+    """
+
+    def __init__(self, host, port, timeout=DEFAULT_TIMEOUT, reconnect_delay=DEFAULT_RECONNECT_DELAY,
+                 max_reconnect_delay=DEFAULT_MAX_RECONNECT_DELAY,
+                 retry_buffer_size=DEFAULT_RETRY_BUFFER_SIZE, drop_policy=DROP_NEWEST,
+                 send_buffer_size=DEFAULT_SEND_BUFFER_SIZE, resolver=None):
+        # type: (str, int, float, float, float, int, str, int, Resolver) -> None
+        # set before validating the settings, as close() uses them
+        self._send_buffer = deque()  # type: deque
+        self._send_buffer_used = 0  # type: int
+        self._send_buffer_lock = Lock()  # type: Lock
+        self._wakeup = Event()  # type: Event
+        self._drained = Condition(Lock())  # type: Condition
+        self._sending = False  # type: bool
+        self._stopping = False  # type: bool
+        self._thread = None  # type: Thread
+        TCPConnection.__init__(self, host, port, timeout, reconnect_delay, max_reconnect_delay,
+                               retry_buffer_size, drop_policy, resolver)
+        self.send_buffer_size = send_buffer_size
+
+    @property
+    def send_buffer_size(self):
+        # type: () -> int
+        return self._send_buffer_size
+
+    @send_buffer_size.setter
+    def send_buffer_size(self, size):
+        # type: (int) -> None
+        size = int(size)
+        assert size > 0, "Send buffer size should be positive"
+        self._send_buffer_size = size
+
+    @property
+    def send_buffer_used(self):
+        # type: () -> int
+        """Size of the requests waiting to be sent in bytes"""
+        return self._send_buffer_used
+
+    def sendall(self, data):
+        # type: (bytes) -> None
+        """Add the request to the send buffer, without waiting for the socket"""
 
+        with self._send_buffer_lock:
+            self._enqueue(data)
+        wakeup = self._wakeup
+        if not wakeup.is_set():
+            wakeup.set()
 
-def _create_auto_closing_shared_tcp_socket(client):
-    # type: (AbstractClient) -> AutoClosingSharedSocket
-    sock = AutoClosingSharedSocket(socket.socket(socket.AF_INET, socket.SOCK_STREAM))
-    sock.add_client(client)
-    sock.connect(client.remote_address)
+    def send_batches(self, batches):
+        # type: (deque) -> None
+        """Move the batches to the send buffer, without waiting for the socket"""
+
+        with self._send_buffer_lock:
+            for batch in batches:
+                self._enqueue(batch)
+        batches.clear()
+        self._wakeup.set()
+
+    def flush(self, timeout=None):
+        # type: (float) -> bool
+        """Wait for the helper thread to send the requests in the send buffer.
+
+        Returns False if sending did not complete before timeout (in seconds).
+        """
+
+        deadline = None if timeout is None else clock() + timeout
+        with self._drained:
+            while (self._send_buffer or self._sending) and self._is_running():
+                remaining = None if deadline is None else deadline - clock()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._drained.wait(remaining)
+        return not self._send_buffer
+
+    def close(self):
+        # type: () -> None
+        """Send the requests in the send buffer, and close the connection"""
+
+        self._stopping = True
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread is not current_thread():
+            # each send is bounded by the timeout, do not wait forever for a slow server
+            thread.join(self._timeout / 1000.0 * 2)
+        _running_connections.discard(self)
+        TCPConnection.close(self)
+
+    def _is_running(self):
+        # type: () -> bool
+        return self._thread is not None and self._thread.is_alive()
+
+    def _enqueue(self, data):
+        # type: (bytes) -> None
+        size = len(data)
+        send_buffer = self._send_buffer
+        if self._stopping:
+            self._dropped += data.count(b"\n")
+            return
+        if self._drop_policy == DROP_OLDEST:
+            while send_buffer and self._send_buffer_used + size > self._send_buffer_size:
+                oldest = send_buffer.popleft()
+                self._send_buffer_used -= len(oldest)
+                self._dropped += oldest.count(b"\n")
+        if self._send_buffer_used + size > self._send_buffer_size:
+            self._dropped += data.count(b"\n")
+            return
+        send_buffer.append(data)
+        self._send_buffer_used += size
+        if self._thread is None:
+            self._start()
+
+    def _start(self):
+        # type: () -> None
+        self._thread = Thread(target=self._run, name="statsdmetrics-tcp-sender")
+        self._thread.daemon = True
+        self._thread.start()
+        _running_connections.add(self)
+
+    def _run(self):
+        # type: () -> None
+        try:
+            while True:
+                self._wakeup.wait(self._retry_wait())
+                self._wakeup.clear()
+                with self._drained:
+                    with self._send_buffer_lock:
+                        batches, self._send_buffer = self._send_buffer, deque()
+                        self._send_buffer_used = 0
+                    self._sending = True
+                try:
+                    with self._lock:
+                        if self._closed:
+                            break
+                        self._send(batches)
+                finally:
+                    with self._drained:
+                        self._sending = False
+                        self._drained.notify_all()
+                if self._stopping and not self._send_buffer:
+                    break
+        finally:
+            with self._drained:
+                self._drained.notify_all()
+
+    def _retry_wait(self):
+        # type: () -> Optional[float]
+        # wake up to reconnect, and send the retry buffer
+        if self._retry_buffer and not self._closed:
+            return max(self._next_connect_time - clock(), 0.001)
+        return None
+
+
+def _connect_socket(family, address, timeout):
+    # type: (int, object, float) -> socket.socket
+    """Return a stream socket of the family connected to the address,
+    timing out after timeout milliseconds.
+    """
+
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout / 1000.0)
+        sock.connect(address)
+    except Exception:
+        sock.close()
+        raise
     return sock
 
 
+def _close_running_connections():
+    # type: () -> None
+    for connection in list(_running_connections):
+        connection.close()
+
+
+atexit.register(_close_running_connections)
+
+
+def _sendmsg_batches(sock, batches):
+    # type: (AutoClosingSharedSocket, deque) -> None
+    """Send the batches by scatter/gather sendmsg() calls, without copying them.
+
+    Partial writes continue from the offset of the first unsent batch.
+    Sent batches are discarded, and if sending fails the unsent
+    requests remain. A partially sent request remains whole, since
+    its rest can not be sent alone on another connection.
+    """
+
+    pending = list(batches)
+    count = len(pending)
+    sent = 0  # type: int
+    offset = 0  # type: int
+    view = None  # type: memoryview
+    try:
+        while sent < count:
+            buffers = pending[sent:sent + MAX_SENDMSG_BUFFERS]
+            if offset:
+                view = memoryview(pending[sent])[offset:]
+                buffers[0] = view
+            written = sock.sendmsg(buffers) + offset
+            while sent < count and written >= len(pending[sent]):
+                written -= len(pending[sent])
+                sent += 1
+            offset = written
+            if view is not None:
+                view.release()
+                view = None
+    finally:
+        if view is not None:
+            # the partially sent batch can not be resized while exported
+            view.release()
+        _discard_sent_batches(batches, sent)
+        if offset:
+            del batches[0][:batches[0].rfind(b"\n", 0, offset) + 1]
+
+
+def _sendall_batches(sock, batches):
+    # type: (socket.socket, deque) -> None
+    """Send the batches one by one, discarding the sent batches"""
+
+    sent = 0
+    try:
+        for batch in batches:
+            sock.sendall(batch)
+            sent += 1
+    finally:
+        _discard_sent_batches(batches, sent)
+
+
 class TCPClient(AbstractClient):
     """Statsd client using TCP to send metrics
 
@@ -31,21 +569,31 @@ class TCPClient(AbstractClient):
     >>> client.decrement("event", rate=0.2)
     """
 
-    def batch_client(self, size=512):
-        # type: (int) -> TCPBatchClient
-        """Return a TCP batch client with same settings of the TCP client"""
+    def batch_client(self, size=512, aggregate=False):
+        # type: (int, bool) -> TCPBatchClient
+        """Return a TCP batch client with same settings of the TCP client.
 
-        batch_client = TCPBatchClient(self.host, self.port, self.prefix, size)
+        If aggregate is True, the batch client aggregates the metrics
+        before sending them.
+        """
+
+        batch_client_class = TCPAggregatingBatchClient if aggregate else TCPBatchClient
+        batch_client = batch_client_class(self.host, self.port, self.prefix, size)
         self._configure_client(batch_client)
         return batch_client
 
+    @property
+    def connection(self):
+        # type: () -> TCPConnection
+        return self._socket
+
     def _create_socket(self):
-        # type: () -> AutoClosingSharedSocket
+        # type: () -> TCPConnection
         return _create_auto_closing_shared_tcp_socket(self)
 
     def _request(self, data):
-        # type: (str) -> None
-        self._socket.sendall("{}\n".format(data).encode())
+        # type: (bytes) -> None
+        self._socket.sendall(data + b"\n")
 
 
 class TCPBatchClient(BatchClientMixIn, AbstractClient):
@@ -57,18 +605,23 @@ class TCPBatchClient(BatchClientMixIn, AbstractClient):
     >>> client.flush()
     """
 
-    def __init__(self, host, port=DEFAULT_PORT, prefix="", batch_size=512):
-        # type: (str, int, str, int) -> None
-        AbstractClient.__init__(self, host, port, prefix)
+    def __init__(self, host, port=DEFAULT_PORT, prefix="", batch_size=512,
+                 name_cache_size=DEFAULT_NAME_CACHE_SIZE):
+        # type: (str, int, str, int, int) -> None
+        AbstractClient.__init__(self, host, port, prefix, name_cache_size)
         BatchClientMixIn.__init__(self, batch_size)
 
-    def flush(self):
-        """Send buffered metrics in batch requests over TCP"""
-        # type: () -> TCPBatchClient
-        while len(self._batches) > 0:
-            self._socket.sendall(self._batches[0])
-            self._batches.popleft()
-        return self
+    @property
+    def connection(self):
+        # type: () -> TCPConnection
+        return self._socket
+
+    def _send_batches(self):
+        # type: () -> None
+        if isinstance(self._socket, TCPConnection):
+            self._socket.send_batches(self._batches)
+        else:
+            _sendall_batches(self._socket, self._batches)
 
     def unit_client(self):
         # type: () -> TCPClient
@@ -79,8 +632,71 @@ class TCPBatchClient(BatchClientMixIn, AbstractClient):
         return client
 
     def _create_socket(self):
-        # type: () -> AutoClosingSharedSocket
+        # type: () -> TCPConnection
         return _create_auto_closing_shared_tcp_socket(self)
 
 
-__all__ = ['TCPClient', 'TCPBatchClient']
+class NonBlockingTCPClient(TCPClient):
+    """Statsd client using TCP to send metrics, without blocking the caller
+
+    Requests are sent by a helper thread, and when the send buffer
+    is full they are dropped and counted (client.connection.dropped).
+
+    >>> client = NonBlockingTCPClient("stats.example.org")
+    >>> client.increment("event")
+    """
+
+    def _create_socket(self):
+        # type: () -> NonBlockingTCPConnection
+        return _create_auto_closing_shared_tcp_socket(self, NonBlockingTCPConnection)
+
+
+class NonBlockingTCPBatchClient(TCPBatchClient):
+    """Statsd client that buffers metrics and sends batch requests over TCP,
+    without blocking the caller when flushing
+
+    >>> client = NonBlockingTCPBatchClient("stats.example.org")
+    >>> client.increment("event")
+    >>> client.flush()
+    """
+
+    def _create_socket(self):
+        # type: () -> NonBlockingTCPConnection
+        return _create_auto_closing_shared_tcp_socket(self, NonBlockingTCPConnection)
+
+
+class TCPAggregatingBatchClient(AggregatingClientMixIn, TCPBatchClient):
+    """Statsd client aggregating metrics and sending them in batch requests over TCP
+
+    Provides the same interface as :class:`~client.AggregatingBatchClient`.
+
+    >>> client = TCPAggregatingBatchClient("stats.example.org")
+    >>> client.increment("event")
+    >>> client.increment("event", 3)
+    >>> client.flush()  # sends "event:4|c\n"
+    """
+
+    def __init__(self, host, port=DEFAULT_PORT, prefix="", batch_size=512,
+                 name_cache_size=DEFAULT_NAME_CACHE_SIZE):
+        # type: (str, int, str, int, int) -> None
+        TCPBatchClient.__init__(self, host, port, prefix, batch_size, name_cache_size)
+        AggregatingClientMixIn.__init__(self)
+
+
+class TCPThreadSafeBatchClient(ThreadSafeBatchClientMixIn, TCPBatchClient):
+    """Statsd client that buffers metrics and sends batch requests over TCP,
+    that can be shared between multiple threads
+
+    Provides the same interface as :class:`~client.ThreadSafeBatchClient`.
+    """
+
+    def __init__(self, host, port=DEFAULT_PORT, prefix="", batch_size=512,
+                 name_cache_size=DEFAULT_NAME_CACHE_SIZE):
+        # type: (str, int, str, int, int) -> None
+        AbstractClient.__init__(self, host, port, prefix, name_cache_size)
+        ThreadSafeBatchClientMixIn.__init__(self, batch_size)
+
+
+__all__ = ['TCPConnection', 'NonBlockingTCPConnection',
+           'TCPClient', 'TCPBatchClient', 'TCPAggregatingBatchClient', 'TCPThreadSafeBatchClient',
+           'NonBlockingTCPClient', 'NonBlockingTCPBatchClient']
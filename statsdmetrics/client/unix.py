@@ -0,0 +1,280 @@
+"""
+statsdmetrics.client.unix
+-------------------------
+Statsd clients to send metrics to a local server over Unix domain sockets
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import socket
+
+try:
+    from typing import Sequence
+except ImportError:
+    Sequence = None  # type: ignore
+
+from . import (AutoClosingSharedSocket, AbstractClient, BatchClientMixIn,
+               DEFAULT_NAME_CACHE_SIZE, DROP_NEWEST, _send_datagram_batches)
+from .datagrams import sendmmsg, supports_sendmmsg
+from .tcp import (TCPConnection, DEFAULT_TIMEOUT, DEFAULT_RECONNECT_DELAY,
+                  DEFAULT_MAX_RECONNECT_DELAY, DEFAULT_RETRY_BUFFER_SIZE, _connect_socket)
+
+# Unix domain datagrams are not limited by the network MTU
+DEFAULT_BATCH_SIZE = 8192
+
+
+class UnixDatagramSocket(AutoClosingSharedSocket):
+    """Auto closing shared non-blocking Unix domain datagram socket.
+
+    Sending does not block the caller when the server is slow, and does not
+    raise socket errors when the server is not listening, like UDP. Datagrams
+    that could not be sent are dropped, and the dropped metrics are counted.
+    """
+
+    def __init__(self):
+        # type: () -> None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        AutoClosingSharedSocket.__init__(self, sock)
+        self._dropped = 0  # type: int
+
+    @property
+    def dropped(self):
+        # type: () -> int
+        """Number of metrics dropped, because the server was not receiving"""
+        return self._dropped
+
+    def sendto(self, data, path):
+        # type: (bytes, str) -> int
+        try:
+            return self._socket.sendto(data, path)
+        except socket.error:
+            self._drop((data,))
+            return 0
+
+    def sendmmsg(self, payloads, path):
+        # type: (Sequence[bytes], str) -> int
+        if not supports_sendmmsg(self._socket):
+            raise NotImplementedError("sendmmsg is not supported by the socket")
+        try:
+            return sendmmsg(self._socket, payloads, path)
+        except socket.error:
+            # the server is not receiving now, retrying the rest would fail too
+            self._drop(payloads)
+            return len(payloads)
+
+    def _drop(self, payloads):
+        # type: (Sequence[bytes]) -> None
+        for data in payloads:
+            # a unit request has no line break
+            self._dropped += data.count(b"\n") or 1
+
+
+class UnixStreamConnection(TCPConnection):
+    """Managed Unix domain stream connection, shared between clients.
+
+    Works the same as :class:`~client.tcp.TCPConnection` (lazy connection,
+    reconnecting with backoff and the retry buffer), connecting to the socket path.
+    """
+
+    def __init__(self, path, timeout=DEFAULT_TIMEOUT, reconnect_delay=DEFAULT_RECONNECT_DELAY,
+                 max_reconnect_delay=DEFAULT_MAX_RECONNECT_DELAY,
+                 retry_buffer_size=DEFAULT_RETRY_BUFFER_SIZE, drop_policy=DROP_NEWEST):
+        # type: (str, float, float, float, int, str) -> None
+        TCPConnection.__init__(self, path, None, timeout, reconnect_delay, max_reconnect_delay,
+                               retry_buffer_size, drop_policy)
+
+    @property
+    def path(self):
+        # type: () -> str
+        return self._host
+
+    def _create_resolver(self):
+        # type: () -> None
+        return None
+
+    def _open_socket(self):
+        # type: () -> socket.socket
+        return _connect_socket(socket.AF_UNIX, self._host, self._timeout)
+
+
+class AbstractUnixClient(AbstractClient):
+    """Base class of clients sending metrics to the path of a Unix domain socket"""
+
+    def __init__(self, path, prefix='', name_cache_size=DEFAULT_NAME_CACHE_SIZE):
+        # type: (str, str, int) -> None
+        AbstractClient.__init__(self, path, None, prefix, name_cache_size)
+
+    @property
+    def path(self):
+        # type: () -> str
+        return self._host
+
+    @property
+    def remote_address(self):
+        # type: () -> str
+        return self._host
+
+    def _set_port(self, port):
+        # type: (int) -> None
+        # Unix domain sockets have no ports
+        self._port = None
+
+    def _create_resolver(self):
+        # type: () -> None
+        return None
+
+
+class UnixDatagramClient(AbstractUnixClient):
+    """Statsd client, using Unix domain datagram sockets to send metrics
+
+    Metrics that could not be sent are dropped (i.e when the server is not
+    listening) and counted (client.socket.dropped).
+
+    >>> client = UnixDatagramClient("/var/run/statsd.sock")
+    >>> client.increment("event")
+    >>> client.increment("event", 3, 0.4)
+    """
+
+    def batch_client(self, size=DEFAULT_BATCH_SIZE):
+        # type: (int) -> UnixDatagramBatchClient
+        """Return a batch client with same settings of the client"""
+
+        batch_client = UnixDatagramBatchClient(self.path, self.prefix, size)
+        self._configure_client(batch_client)
+        return batch_client
+
+    @property
+    def socket(self):
+        # type: () -> UnixDatagramSocket
+        return self._socket
+
+    def _create_socket(self):
+        # type: () -> UnixDatagramSocket
+        return _create_auto_closing_shared_unix_datagram_socket(self)
+
+
+class UnixDatagramBatchClient(BatchClientMixIn, AbstractUnixClient):
+    """Statsd client buffering requests and send in batch Unix domain datagrams
+
+    >>> client = UnixDatagramBatchClient("/var/run/statsd.sock")
+    >>> client.increment("event")
+    >>> client.decrement("event.second", 3, 0.5)
+    >>> client.flush()
+    """
+
+    def __init__(self, path, prefix="", batch_size=DEFAULT_BATCH_SIZE,
+                 name_cache_size=DEFAULT_NAME_CACHE_SIZE):
+        # type: (str, str, int, int) -> None
+        AbstractUnixClient.__init__(self, path, prefix, name_cache_size)
+        BatchClientMixIn.__init__(self, batch_size)
+
+    @property
+    def socket(self):
+        # type: () -> UnixDatagramSocket
+        return self._socket
+
+    def unit_client(self):
+        # type: () -> UnixDatagramClient
+        """Return a client with same settings of the batch client"""
+
+        client = UnixDatagramClient(self.path, self.prefix)
+        self._configure_client(client)
+        return client
+
+    def _create_socket(self):
+        # type: () -> UnixDatagramSocket
+        return _create_auto_closing_shared_unix_datagram_socket(self)
+
+    def _send_batches(self):
+        # type: () -> None
+        _send_datagram_batches(self._socket, self._batches, self._host)
+
+
+class UnixStreamClient(AbstractUnixClient):
+    """Statsd client, using Unix domain stream sockets to send metrics
+
+    >>> client = UnixStreamClient("/var/run/statsd.sock")
+    >>> client.increment("event")
+    >>> client.increment("event", 3, 0.4)
+    """
+
+    def batch_client(self, size=DEFAULT_BATCH_SIZE):
+        # type: (int) -> UnixStreamBatchClient
+        """Return a batch client with same settings of the client"""
+
+        batch_client = UnixStreamBatchClient(self.path, self.prefix, size)
+        self._configure_client(batch_client)
+        return batch_client
+
+    @property
+    def connection(self):
+        # type: () -> UnixStreamConnection
+        return self._socket
+
+    def _create_socket(self):
+        # type: () -> UnixStreamConnection
+        return _create_auto_closing_shared_unix_stream_connection(self)
+
+    def _request(self, data):
+        # type: (bytes) -> None
+        self._socket.sendall(data + b"\n")
+
+
+class UnixStreamBatchClient(BatchClientMixIn, AbstractUnixClient):
+    """Statsd client that buffers metrics and sends batch requests over
+    a Unix domain stream socket
+
+    >>> client = UnixStreamBatchClient("/var/run/statsd.sock")
+    >>> client.increment("event")
+    >>> client.decrement("event.second", 3, 0.5)
+    >>> client.flush()
+    """
+
+    def __init__(self, path, prefix="", batch_size=DEFAULT_BATCH_SIZE,
+                 name_cache_size=DEFAULT_NAME_CACHE_SIZE):
+        # type: (str, str, int, int) -> None
+        AbstractUnixClient.__init__(self, path, prefix, name_cache_size)
+        BatchClientMixIn.__init__(self, batch_size)
+
+    @property
+    def connection(self):
+        # type: () -> UnixStreamConnection
+        return self._socket
+
+    def unit_client(self):
+        # type: () -> UnixStreamClient
+        """Return a client with same settings of the batch client"""
+
+        client = UnixStreamClient(self.path, self.prefix)
+        self._configure_client(client)
+        return client
+
+    def _create_socket(self):
+        # type: () -> UnixStreamConnection
+        return _create_auto_closing_shared_unix_stream_connection(self)
+
+    def _send_batches(self):
+        # type: () -> None
+        self._socket.send_batches(self._batches)
+
+
+def _create_auto_closing_shared_unix_datagram_socket(client):
+    # type: (AbstractUnixClient) -> UnixDatagramSocket
+    sock = UnixDatagramSocket()
+    sock.add_client(client)
+    return sock
+
+
+def _create_auto_closing_shared_unix_stream_connection(client):
+    # type: (AbstractUnixClient) -> UnixStreamConnection
+    connection = UnixStreamConnection(client.path)
+    connection.add_client(client)
+    return connection
+
+
+__all__ = ['UnixDatagramSocket', 'UnixStreamConnection',
+           'UnixDatagramClient', 'UnixDatagramBatchClient',
+           'UnixStreamClient', 'UnixStreamBatchClient']
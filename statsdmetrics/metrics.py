@@ -9,12 +9,12 @@ https://opensource.org/licenses/MIT.
 """
 
 from abc import ABCMeta, abstractmethod
-from re import compile, sub
+from re import compile
 try:
-    from typing import Any, Dict, Tuple, Union
+    from typing import Any, Dict, Iterator, Tuple, Union
     TypeMetric = Union['AbstractMetric', 'Counter', 'Timer', 'Gauge', 'GaugeDelta', 'Set']
 except ImportError:
-    Any, Dict, Tuple, Union = None, None, None, None  # type: ignore
+    Any, Dict, Iterator, Tuple, Union = None, None, None, None, None  # type: ignore
     TypeMetric = None
 
 
@@ -28,6 +28,11 @@ try:
 except NameError:
     long = int
 
+try:
+    unichr(1)  # type: ignore
+except NameError:
+    unichr = chr
+
 
 def is_string(value):
     # type: (Any) -> bool
@@ -49,11 +54,96 @@ normalize_metric_name_regex_subs = (
 )  # type: Tuple[Tuple[Any, str], Tuple[Any, str], Tuple[Any, str]]
 
 
+normalize_metric_name_regex = compile(r"(\s+)|([/\\])|[^\w.-]")
+
+
+def _create_normalize_metric_name_ascii_table():
+    # type: () -> Tuple[bytes, bytes]
+    # derived from the regular expressions, so both produce the same results.
+    # white spaces are mapped to NUL (which is deleted otherwise), since runs of
+    # white spaces can not be collapsed by a translation table.
+    table = bytearray(range(256))
+    deletes = bytearray()
+    for code in range(128):
+        char = unichr(code)
+        if normalize_metric_name_regex_subs[0][0].match(char):
+            table[code] = 0
+        elif normalize_metric_name_regex_subs[1][0].match(char):
+            table[code] = ord('-')
+        elif normalize_metric_name_regex_subs[2][0].match(char):
+            deletes.append(code)
+    return bytes(table), bytes(deletes)
+
+
+normalize_metric_name_ascii_table, normalize_metric_name_ascii_deletes = \
+    _create_normalize_metric_name_ascii_table()
+
+
+def _normalize_metric_name_replacement(match):
+    # type: (Any) -> unicode
+    group = match.lastindex
+    if group == 1:
+        return u'_'
+    elif group == 2:
+        return u'-'
+    return u''
+
+
+try:
+    _is_ascii = unicode.isascii  # type: ignore
+except AttributeError:
+    def _is_ascii(name):
+        # type: (unicode) -> bool
+        try:
+            name.encode('ascii')
+        except (UnicodeError, AttributeError):
+            return False
+        return True
+
+
 def normalize_metric_name(name):
     # type: (unicode) -> unicode
-    for regex, replacement in normalize_metric_name_regex_subs:
-        name = sub(regex, replacement, name)
-    return name
+    if _is_ascii(name):
+        normalized = name.encode('ascii').translate(
+            normalize_metric_name_ascii_table,
+            normalize_metric_name_ascii_deletes
+        )
+        if b'\x00' not in normalized:
+            # on Python 2 str names are bytes, and are returned as str
+            return normalized if isinstance(name, bytes) else normalized.decode('ascii')
+    return normalize_metric_name_regex.sub(_normalize_metric_name_replacement, name)
+
+
+normalize_tag_regex = compile(r"[|,\r\n]")
+
+MAX_CACHED_TAG_SECTIONS = 1024
+
+_parsed_tag_sections = {}  # type: Dict[unicode, Tuple[unicode, ...]]
+
+
+def normalize_tags(tags):
+    # type: (Any) -> Tuple[unicode, ...]
+    """Return the tags as a sorted tuple of unique tag strings.
+
+    Tags can be a dict of tag names to values (None for tags without a value,
+    that are sent as the name only), or an iterable of "name:value" strings.
+    Characters that delimit the tags in requests (|, comma and new lines)
+    are replaced by underscores.
+    """
+
+    if not tags:
+        return ()
+    if isinstance(tags, dict):
+        tags = [name if value is None else u"{}:{}".format(name, value) for name, value in tags.items()]
+    elif is_string(tags):
+        tags = [tags]
+    normalized = set()
+    for tag in tags:
+        assert is_string(tag), 'Metric tags should be strings'
+        tag = normalize_tag_regex.sub(u'_', unicode(tag))
+        if tag:
+            normalized.add(tag)
+    return tuple(sorted(normalized))
 
 
 def parse_metric_from_request(request):
@@ -61,14 +151,12 @@ def parse_metric_from_request(request):
     assert is_string(request), \
         "Request should be string to parse a metric from"
 
-    metric_type_classes = {'c': Counter, 'ms': Timer, 'g': Gauge, 's': Set}
-    metric_value_types = {'c': int, 'ms': float, 'g': float}
-
-    name, data = request.split(':')  # type: unicode, unicode
+    name, _, data = request.partition(':')  # type: unicode, unicode, unicode
     value, _, type_section = data.partition('|')  # type: unicode, unicode, unicode
-    type_, __, sample_rate_section = type_section.partition('|@')  # type: unicode, unicode, unicode
+    sections = type_section.split('|')
+    type_ = sections[0]  # type: unicode
 
-    if type_ not in metric_type_classes:
+    if type_ not in _metric_type_classes:
         raise ValueError(
             "Invalid request. Metric type '{}' is not supported".format(type_)
         )
@@ -76,25 +164,147 @@ def parse_metric_from_request(request):
     if type_ == 'g' and len(value) > 1 and value[0] in ('+', '-'):
         metric_class = GaugeDelta
     else:
-        metric_class = metric_type_classes[type_]  # type: ignore
+        metric_class = _metric_type_classes[type_]  # type: ignore
 
-    value = metric_value_types[type_](value) \
-        if type_ in metric_value_types else value  # type: ignore
+    value = _metric_value_types[type_](value) \
+        if type_ in _metric_value_types else value  # type: ignore
 
-    sample_rate = AbstractMetric.default_sample_rate \
-        if sample_rate_section == '' else float(sample_rate_section)  # type: float
+    sample_rate = AbstractMetric.default_sample_rate  # type: float
+    tags = ()  # type: Tuple[unicode, ...]
+    for section in sections[1:]:
+        if section[:1] == '@':
+            sample_rate = float(section[1:])
+        elif section[:1] == '#':
+            tags = _parse_tags(section[1:])
+        else:
+            raise ValueError(
+                "Invalid request. Section '{}' is not supported".format(section)
+            )
 
-    return metric_class(name.strip(), value, sample_rate)
+    return metric_class(name.strip(), value, sample_rate, tags)
+
+
+def parse_metrics(payload, errors=None):
+    # type: (Union[bytes, unicode], Any) -> Iterator[TypeMetric]
+    """Parse metrics from a payload of newline delimited requests (i.e a datagram).
+
+    Metrics are yielded lazily. Lines can have multiple values of the same metric
+    (name:v1|ms:v2|ms), and tags (name:v|c|#k:v,k2) that apply to all the values
+    of the line. Malformed lines are skipped, and if errors is a list
+    tuples of (line, ValueError) are appended to it.
+    """
+
+    if isinstance(payload, bytes):
+        try:
+            payload = payload.decode('utf-8')
+        except UnicodeDecodeError:
+            for line in _decode_lines(payload, errors):
+                for metric in parse_metrics(line, errors):
+                    yield metric
+            return
+
+    parse_sample = _parse_sample
+    for line in payload.split('\n'):
+        name, _, data = line.partition(':')
+        try:
+            tags = ()  # type: Tuple[unicode, ...]
+            if '|#' in data:
+                data, tags = _split_tags(data)
+            if ':' not in data:
+                metric = parse_sample(name, data, tags)
+            else:
+                metric = None
+                metrics = [parse_sample(name, sample, tags) for sample in data.split(':')]
+        except ValueError as error:
+            if errors is not None and line.strip():
+                errors.append((line, error))
+            continue
+        if metric is not None:
+            yield metric
+        else:
+            for metric in metrics:
+                yield metric
+
+
+def _decode_lines(payload, errors):
+    # type: (bytes, Any) -> Iterator[unicode]
+    for line in payload.split(b'\n'):
+        try:
+            yield line.decode('utf-8')
+        except UnicodeDecodeError as error:
+            if errors is not None:
+                errors.append((line.decode('utf-8', 'replace'), ValueError(str(error))))
+
+
+def _split_tags(data):
+    # type: (unicode) -> Tuple[unicode, Tuple[unicode, ...]]
+    """Split the tags section from the data of a line (the sections after it are kept)"""
+
+    data, _, tag_section = data.partition('|#')
+    tag_section, separator, rest = tag_section.partition('|')
+    if separator:
+        data += '|' + rest
+    return data, _parse_tags(tag_section)
+
+
+def _parse_tags(tag_section):
+    # type: (unicode) -> Tuple[unicode, ...]
+    try:
+        return _parsed_tag_sections[tag_section]
+    except KeyError:
+        pass
+    tags = tuple(sorted(set(tag for tag in tag_section.split(',') if tag)))
+    if len(_parsed_tag_sections) < MAX_CACHED_TAG_SECTIONS:
+        _parsed_tag_sections[tag_section] = tags
+    return tags
+
+
+def _parse_sample(name, sample, tags=()):
+    # type: (unicode, unicode, Tuple[unicode, ...]) -> TypeMetric
+    value, _, type_ = sample.partition('|')
+    sample_rate = 1  # type: float
+    if '|' in type_:
+        type_, _, sample_rate_section = type_.partition('|')
+        if sample_rate_section[:1] != '@':
+            raise ValueError("Invalid request. Sample rate is malformed")
+        sample_rate = float(sample_rate_section[1:])
+        if not sample_rate > 0:
+            raise ValueError("Invalid request. Sample rate should be positive")
+    name = name.strip()
+    if not name:
+        raise ValueError("Invalid request. Metric name should not be empty")
+
+    if type_ == 'c':
+        return Counter._from_trusted(name, int(value), sample_rate, tags)
+    elif type_ == 'ms':
+        milliseconds = float(value)
+        if not milliseconds >= 0:
+            raise ValueError("Invalid request. Timer milliseconds should not be negative")
+        return Timer._from_trusted(name, milliseconds, sample_rate, tags)
+    elif type_ == 'g':
+        if len(value) > 1 and value[0] in ('+', '-'):
+            return GaugeDelta._from_trusted(name, float(value), sample_rate, tags)
+        gauge_value = float(value)
+        if not gauge_value >= 0:
+            raise ValueError("Invalid request. Gauge value should not be negative")
+        return Gauge._from_trusted(name, gauge_value, sample_rate, tags)
+    elif type_ == 's':
+        return Set._from_trusted(name, value, sample_rate, tags)
+    raise ValueError(
+        "Invalid request. Metric type '{}' is not supported".format(type_)
+    )
 
 
 class AbstractMetric(object):
     __metaclass__ = ABCMeta
+    __slots__ = ('_name', '_sample_rate', '_tags')
 
     default_sample_rate = 1  # type: float
 
     def __init__(self, name):  # type: (str) -> None
         self._name = ''  # type: unicode
         self._sample_rate = self.__class__.default_sample_rate  # type: ignore
+        self._tags = ()  # type: Tuple[unicode, ...]
         self.name = name
 
     @property
@@ -125,17 +335,41 @@ class AbstractMetric(object):
                 self.name, value)
         self._sample_rate = value
 
+    @property
+    def tags(self):
+        # type: () -> Tuple[unicode, ...]
+        return self._tags
+
+    @tags.setter
+    def tags(self, tags):
+        # type: (Any) -> None
+        self._tags = normalize_tags(tags)
+
     @abstractmethod
     def to_request(self):  # type: () -> bytes
         raise NotImplementedError()  # pragma: no cover
 
 
 class Counter(AbstractMetric):
-    def __init__(self, name, count=0, sample_rate=1):
+    __slots__ = ('_count',)
+
+    def __init__(self, name, count=0, sample_rate=1, tags=None):
         super(Counter, self).__init__(name)
         self._count = 0   # type: int
         self.count = count
         self.sample_rate = sample_rate
+        self.tags = tags
+
+    @classmethod
+    def _from_trusted(cls, name, count, sample_rate=1, tags=()):
+        # type: (unicode, int, float, Tuple[unicode, ...]) -> Counter
+        """Create the metric from valid data, skipping validations"""
+        counter = cls.__new__(cls)
+        counter._name = name
+        counter._count = count
+        counter._sample_rate = sample_rate
+        counter._tags = tags
+        return counter
 
     @property
     def count(self):
@@ -153,6 +387,8 @@ class Counter(AbstractMetric):
         result = "{0}:{1}|c".format(self._name, self._count)
         if self._sample_rate != 1:
             result += "|@{:n}".format(self._sample_rate)
+        if self._tags:
+            result += "|#" + ",".join(self._tags)
         return result
 
     def __eq__(self, other):
@@ -160,22 +396,38 @@ class Counter(AbstractMetric):
             'Counter can be compared to Counter only'
         return self.name == other.name \
                and self.count == other.count \
-               and self.sample_rate == other.sample_rate
+               and self.sample_rate == other.sample_rate \
+               and self.tags == other.tags
 
     def __ne__(self, other):
         assert isinstance(other, Counter), \
             'Counter can be compared to Counter only'
         return self.name != other.name \
                or self.count != other.count \
-               or self.sample_rate != other.sample_rate
+               or self.sample_rate != other.sample_rate \
+               or self.tags != other.tags
 
 
 class Timer(AbstractMetric):
-    def __init__(self, name, milliseconds, sample_rate=1):
+    __slots__ = ('_milliseconds',)
+
+    def __init__(self, name, milliseconds, sample_rate=1, tags=None):
         super(Timer, self).__init__(name)
         self._milliseconds = 0  # type: int
         self.milliseconds = milliseconds
         self.sample_rate = sample_rate
+        self.tags = tags
+
+    @classmethod
+    def _from_trusted(cls, name, milliseconds, sample_rate=1, tags=()):
+        # type: (unicode, float, float, Tuple[unicode, ...]) -> Timer
+        """Create the metric from valid data, skipping validations"""
+        timer = cls.__new__(cls)
+        timer._name = name
+        timer._milliseconds = milliseconds
+        timer._sample_rate = sample_rate
+        timer._tags = tags
+        return timer
 
     @property
     def milliseconds(self):
@@ -195,6 +447,8 @@ class Timer(AbstractMetric):
         result = "{0}:{1}|ms".format(self._name, self._milliseconds)
         if self._sample_rate != 1:
             result += "|@{:n}".format(self._sample_rate)
+        if self._tags:
+            result += "|#" + ",".join(self._tags)
         return result
 
     def __eq__(self, other):
@@ -202,22 +456,38 @@ class Timer(AbstractMetric):
             'Timer can be compared to Timer only'
         return self.name == other.name \
                and self.milliseconds == other.milliseconds \
-               and self.sample_rate == other.sample_rate
+               and self.sample_rate == other.sample_rate \
+               and self.tags == other.tags
 
     def __ne__(self, other):
         assert isinstance(other, Timer), \
             'Timer can be compared to Timer only'
         return self.name != other.name \
                or self.milliseconds != other.milliseconds \
-               or self.sample_rate != other.sample_rate
+               or self.sample_rate != other.sample_rate \
+               or self.tags != other.tags
 
 
 class Gauge(AbstractMetric):
-    def __init__(self, name, value, sample_rate=1):
+    __slots__ = ('_value',)
+
+    def __init__(self, name, value, sample_rate=1, tags=None):
         self._value = 0  # type: float
         super(Gauge, self).__init__(name)
         self.value = value
         self.sample_rate = sample_rate
+        self.tags = tags
+
+    @classmethod
+    def _from_trusted(cls, name, value, sample_rate=1, tags=()):
+        # type: (unicode, float, float, Tuple[unicode, ...]) -> Gauge
+        """Create the metric from valid data, skipping validations"""
+        gauge = cls.__new__(cls)
+        gauge._name = name
+        gauge._value = value
+        gauge._sample_rate = sample_rate
+        gauge._tags = tags
+        return gauge
 
     @property
     def value(self):
@@ -237,6 +507,8 @@ class Gauge(AbstractMetric):
         result = "{0}:{1}|g".format(self._name, self._value)
         if self._sample_rate != 1:
             result += "|@{:n}".format(self._sample_rate)
+        if self._tags:
+            result += "|#" + ",".join(self._tags)
         return result
 
     def __eq__(self, other):
@@ -244,22 +516,38 @@ class Gauge(AbstractMetric):
             'Gauge can be compared to Gauge only'
         return self.name == other.name \
                and self.value == other.value \
-               and self.sample_rate == other.sample_rate
+               and self.sample_rate == other.sample_rate \
+               and self.tags == other.tags
 
     def __ne__(self, other):
         assert isinstance(other, Gauge), \
             'Gauge can be compared to Gauge only'
         return self.name != other.name \
                or self.value != other.value \
-               or self.sample_rate != other.sample_rate
+               or self.sample_rate != other.sample_rate \
+               or self.tags != other.tags
 
 
 class Set(AbstractMetric):
-    def __init__(self, name, value, sample_rate=1):
+    __slots__ = ('_value',)
+
+    def __init__(self, name, value, sample_rate=1, tags=None):
         self._value = 0  # type: Any
         super(Set, self).__init__(name)
         self.value = value
         self.sample_rate = sample_rate
+        self.tags = tags
+
+    @classmethod
+    def _from_trusted(cls, name, value, sample_rate=1, tags=()):
+        # type: (unicode, Any, float, Tuple[unicode, ...]) -> Set
+        """Create the metric from valid data, skipping validations"""
+        set_metric = cls.__new__(cls)
+        set_metric._name = name
+        set_metric._value = value
+        set_metric._sample_rate = sample_rate
+        set_metric._tags = tags
+        return set_metric
 
     @property
     def value(self):
@@ -285,6 +573,8 @@ class Set(AbstractMetric):
         result = "{0}:{1}|s".format(self._name, self._value)
         if self._sample_rate != 1:
             result += "|@{:n}".format(self._sample_rate)
+        if self._tags:
+            result += "|#" + ",".join(self._tags)
         return result
 
     def __eq__(self, other):
@@ -292,22 +582,38 @@ class Set(AbstractMetric):
             "Set can be compared to Set only"
         return self.name == other.name \
                and self.value == other.value \
-               and self.sample_rate == other.sample_rate
+               and self.sample_rate == other.sample_rate \
+               and self.tags == other.tags
 
     def __ne__(self, other):
         assert isinstance(other, Set), \
             "Set can be compared to Set only"
         return self.name != other.name \
                or self.value != other.value \
-               or self.sample_rate != other.sample_rate
+               or self.sample_rate != other.sample_rate \
+               or self.tags != other.tags
 
 
 class GaugeDelta(AbstractMetric):
-    def __init__(self, name, delta, sample_rate=1):
+    __slots__ = ('_delta',)
+
+    def __init__(self, name, delta, sample_rate=1, tags=None):
         self._delta = 0  # type: float
         super(GaugeDelta, self).__init__(name)
         self.delta = delta
         self.sample_rate = sample_rate
+        self.tags = tags
+
+    @classmethod
+    def _from_trusted(cls, name, delta, sample_rate=1, tags=()):
+        # type: (unicode, float, float, Tuple[unicode, ...]) -> GaugeDelta
+        """Create the metric from valid data, skipping validations"""
+        gauge_delta = cls.__new__(cls)
+        gauge_delta._name = name
+        gauge_delta._delta = delta
+        gauge_delta._sample_rate = sample_rate
+        gauge_delta._tags = tags
+        return gauge_delta
 
     @property
     def delta(self):
@@ -325,6 +631,8 @@ class GaugeDelta(AbstractMetric):
         result = "{}:{:+n}|g".format(self._name, self._delta)
         if self._sample_rate != 1:
             result += "|@{:n}".format(self._sample_rate)
+        if self._tags:
+            result += "|#" + ",".join(self._tags)
         return result
 
     def __eq__(self, other):
@@ -332,18 +640,26 @@ class GaugeDelta(AbstractMetric):
             'GaugeDelta can be compared to GaugeDelta only'
         return self.name == other.name \
                and self.delta == other.delta \
-               and self.sample_rate == other.sample_rate
+               and self.sample_rate == other.sample_rate \
+               and self.tags == other.tags
 
     def __ne__(self, other):
         assert isinstance(other, GaugeDelta), \
             'GaugeDelta can be compared to GaugeDelta only'
         return self.name != other.name \
                or self.delta != other.delta \
-               or self.sample_rate != other.sample_rate
+               or self.sample_rate != other.sample_rate \
+               or self.tags != other.tags
+
+
+_metric_type_classes = {'c': Counter, 'ms': Timer, 'g': Gauge, 's': Set}  # type: Dict[unicode, Any]
+_metric_value_types = {'c': int, 'ms': float, 'g': float}  # type: Dict[unicode, Any]
 
 
 __all__ = ['Counter', 'Timer', 'Gauge',
            'Set', 'GaugeDelta',
            'normalize_metric_name',
-           'parse_metric_from_request'
+           'normalize_tags',
+           'parse_metric_from_request',
+           'parse_metrics',
            ]
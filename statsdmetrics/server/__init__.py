@@ -0,0 +1,377 @@
+"""
+statsdmetrics.server
+--------------------
+Statsd server receiving metrics over UDP and TCP, and aggregating them per flush interval
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import select
+import socket
+
+try:
+    import selectors
+except ImportError:
+    selectors = None  # type: ignore
+
+try:
+    from time import monotonic as clock
+except ImportError:
+    from time import time as clock  # type: ignore
+
+try:
+    from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+except ImportError:
+    Any, Callable, Dict, Iterable, List, Sequence, Tuple = None, None, None, None, None, None, None  # type: ignore
+
+from .aggregation import Aggregator, Aggregates, Summary, TimerSamples
+from .backends import AbstractBackend, MemoryBackend, StreamBackend
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8125
+DEFAULT_FLUSH_INTERVAL = 10000
+MAX_DATAGRAM_SIZE = 65535
+MAX_DATAGRAMS_PER_READ = 64
+MAX_LINE_SIZE = 65536
+RECEIVE_BUFFER_SIZE = 4 * 1024 * 1024
+
+
+class ServerMixIn(object):
+    """MixIn class to servers, aggregating received payloads and
+    flushing the summaries to the backends.
+    """
+
+    def __init__(self, aggregator=None, backends=(), flush_interval=DEFAULT_FLUSH_INTERVAL):
+        # type: (Aggregator, Iterable[AbstractBackend], float) -> None
+        assert flush_interval > 0, "Server flush interval should be positive"
+        self._aggregator = aggregator or Aggregator()  # type: Aggregator
+        self._backends = list(backends)  # type: List[AbstractBackend]
+        self._flush_interval = flush_interval  # type: float
+        self._datagrams = 0  # type: int
+        self._backend_errors = 0  # type: int
+
+    @property
+    def aggregator(self):
+        # type: () -> Aggregator
+        return self._aggregator
+
+    @property
+    def backends(self):
+        # type: () -> List[AbstractBackend]
+        return list(self._backends)
+
+    @property
+    def flush_interval(self):
+        # type: () -> float
+        return self._flush_interval
+
+    @property
+    def datagrams(self):
+        # type: () -> int
+        """Number of received datagrams"""
+        return self._datagrams
+
+    @property
+    def backend_errors(self):
+        # type: () -> int
+        """Number of failed flushes of backends"""
+        return self._backend_errors
+
+    def flush(self):
+        # type: () -> Summary
+        """Summarize the aggregated metrics and send the summary to the backends.
+
+        Errors of backends are counted, so a failing backend does not stop the server.
+        """
+
+        summary = self._aggregator.flush()
+        for backend in self._backends:
+            try:
+                backend.flush(summary)
+            except Exception:
+                self._backend_errors += 1
+        return summary
+
+    def _receive_datagram(self, payload):
+        # type: (bytes) -> None
+        self._datagrams += 1
+        self._aggregator.add_payload(payload)
+
+    def _close_backends(self):
+        # type: () -> None
+        for backend in self._backends:
+            backend.close()
+
+
+class Server(ServerMixIn):
+    """Statsd server receiving metrics over UDP (and optionally TCP), running
+    an event loop in the calling thread with selectors (or select when selectors
+    is not available).
+
+    Datagrams are drained in bulk on each event, and newline delimited requests
+    of TCP streams are aggregated as complete lines arrive. The aggregated metrics
+    are flushed to the backends every flush interval (in milliseconds), and when
+    the server stops.
+
+    >>> server = Server(backends=[StreamBackend()], port=8125, tcp_port=8125)
+    >>> server.serve_forever()
+    """
+
+    def __init__(self, aggregator=None, backends=(), host=DEFAULT_HOST, port=DEFAULT_PORT,
+                 tcp_port=None, flush_interval=DEFAULT_FLUSH_INTERVAL, reuse_port=False):
+        # type: (Aggregator, Iterable[AbstractBackend], str, int, int, float, bool) -> None
+        ServerMixIn.__init__(self, aggregator, backends, flush_interval)
+        self._host = host  # type: str
+        self._running = False  # type: bool
+        self._streams = {}  # type: Dict[socket.socket, bytes]
+        self._selector = _Selector()
+        self._udp_socket = _bind_socket(host, port, socket.SOCK_DGRAM, reuse_port)
+        self._udp_socket.setblocking(False)
+        self._selector.register(self._udp_socket, _EVENT_READ, self._read_datagrams)
+        self._tcp_socket = None  # type: socket.socket
+        if tcp_port is not None:
+            self._tcp_socket = _bind_socket(host, tcp_port, socket.SOCK_STREAM, reuse_port)
+            self._tcp_socket.listen(128)
+            self._tcp_socket.setblocking(False)
+            self._selector.register(self._tcp_socket, _EVENT_READ, self._accept)
+        self._wakeup_sockets = _create_wakeup_sockets()  # type: Tuple[socket.socket, socket.socket]
+        if self._wakeup_sockets:
+            self._wakeup_sockets[0].setblocking(False)
+            self._selector.register(self._wakeup_sockets[0], _EVENT_READ, self._read_wakeup)
+
+    @property
+    def address(self):
+        # type: () -> Tuple
+        """The address of the UDP socket"""
+        return self._udp_socket.getsockname()
+
+    @property
+    def tcp_address(self):
+        # type: () -> Tuple
+        """The address of the TCP socket, or None"""
+        return self._tcp_socket.getsockname() if self._tcp_socket else None
+
+    @property
+    def running(self):
+        # type: () -> bool
+        return self._running
+
+    def serve_forever(self):
+        # type: () -> None
+        """Receive and aggregate metrics, flushing them every flush interval,
+        until shutdown() is called (from another thread or a backend).
+        """
+
+        self._running = True
+        interval = self._flush_interval / 1000.0
+        next_flush = clock() + interval
+        # without wakeup sockets, check the running flag regularly
+        max_timeout = None if self._wakeup_sockets else 0.2
+        try:
+            while self._running:
+                timeout = next_flush - clock()
+                if timeout <= 0:
+                    self.flush()
+                    next_flush = max(next_flush + interval, clock())
+                    continue
+                if max_timeout is not None:
+                    timeout = min(timeout, max_timeout)
+                for callback, fileobj in self._selector.select(timeout):
+                    callback(fileobj)
+        finally:
+            self._running = False
+            self.flush()
+
+    def serve(self, duration):
+        # type: (float) -> None
+        """Receive and aggregate metrics for the duration (in milliseconds) without flushing"""
+
+        deadline = clock() + duration / 1000.0
+        timeout = duration / 1000.0
+        while timeout > 0:
+            for callback, fileobj in self._selector.select(timeout):
+                callback(fileobj)
+            timeout = deadline - clock()
+
+    def shutdown(self):
+        # type: () -> None
+        """Stop serving, the metrics are flushed when the server stops"""
+
+        self._running = False
+        if self._wakeup_sockets:
+            try:
+                self._wakeup_sockets[1].send(b"\0")
+            except socket.error:
+                pass
+
+    def close(self):
+        # type: () -> None
+        """Close the sockets and the backends"""
+
+        for sock in list(self._streams):
+            self._close_stream(sock)
+        for sock in (self._udp_socket, self._tcp_socket) + tuple(self._wakeup_sockets or ()):
+            if sock is not None:
+                try:
+                    self._selector.unregister(sock)
+                except (KeyError, ValueError):
+                    pass
+                sock.close()
+        self._selector.close()
+        self._close_backends()
+
+    def _read_datagrams(self, sock):
+        # type: (socket.socket) -> None
+        add_payload = self._aggregator.add_payload
+        receive = sock.recv
+        for _ in range(MAX_DATAGRAMS_PER_READ):
+            try:
+                payload = receive(MAX_DATAGRAM_SIZE)
+            except socket.error:
+                break
+            self._datagrams += 1
+            add_payload(payload)
+
+    def _accept(self, sock):
+        # type: (socket.socket) -> None
+        try:
+            connection, _ = sock.accept()
+        except socket.error:
+            return
+        connection.setblocking(False)
+        self._streams[connection] = b""
+        self._selector.register(connection, _EVENT_READ, self._read_stream)
+
+    def _read_stream(self, sock):
+        # type: (socket.socket) -> None
+        try:
+            data = sock.recv(MAX_LINE_SIZE)
+        except socket.error:
+            data = None
+        if not data:
+            self._close_stream(sock)
+            return
+        data = self._streams[sock] + data
+        lines, separator, rest = data.rpartition(b"\n")
+        if separator:
+            self._aggregator.add_payload(lines)
+        if len(rest) > MAX_LINE_SIZE:
+            # a line can not be that long, drop it
+            rest = b""
+        self._streams[sock] = rest
+
+    def _close_stream(self, sock):
+        # type: (socket.socket) -> None
+        rest = self._streams.pop(sock, b"")
+        if rest:
+            self._aggregator.add_payload(rest)
+        try:
+            self._selector.unregister(sock)
+        except (KeyError, ValueError):
+            pass
+        sock.close()
+
+    def _read_wakeup(self, sock):
+        # type: (socket.socket) -> None
+        try:
+            sock.recv(64)
+        except socket.error:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+
+def _bind_socket(host, port, socket_type, reuse_port=False):
+    # type: (str, int, int, bool) -> socket.socket
+    family, _, _, _, address = socket.getaddrinfo(host, port, socket.AF_UNSPEC, socket_type)[0]
+    sock = socket.socket(family, socket_type)
+    try:
+        if socket_type == socket.SOCK_STREAM:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        else:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER_SIZE)
+            except socket.error:
+                pass
+        if reuse_port:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind(address)
+    except Exception:
+        sock.close()
+        raise
+    return sock
+
+
+def _create_wakeup_sockets():
+    # type: () -> Tuple[socket.socket, socket.socket]
+    try:
+        return socket.socketpair()
+    except (AttributeError, socket.error):
+        return None
+
+
+if selectors is not None:
+    _EVENT_READ = selectors.EVENT_READ
+
+    class _Selector(object):
+        """Selector yielding (callback, file object) of ready files"""
+
+        def __init__(self):
+            # type: () -> None
+            self._selector = selectors.DefaultSelector()
+
+        def register(self, fileobj, events, callback):
+            # type: (Any, int, Callable) -> None
+            self._selector.register(fileobj, events, callback)
+
+        def unregister(self, fileobj):
+            # type: (Any) -> None
+            self._selector.unregister(fileobj)
+
+        def select(self, timeout):
+            # type: (float) -> List[Tuple[Callable, Any]]
+            return [(key.data, key.fileobj) for key, _ in self._selector.select(timeout)]
+
+        def close(self):
+            # type: () -> None
+            self._selector.close()
+else:
+    _EVENT_READ = 1
+
+    class _Selector(object):  # type: ignore
+        """Selector yielding (callback, file object) of ready files, using select()"""
+
+        def __init__(self):
+            # type: () -> None
+            self._callbacks = {}  # type: Dict[Any, Callable]
+
+        def register(self, fileobj, events, callback):
+            # type: (Any, int, Callable) -> None
+            if fileobj in self._callbacks:
+                raise KeyError("File object is already registered")
+            self._callbacks[fileobj] = callback
+
+        def unregister(self, fileobj):
+            # type: (Any) -> None
+            del self._callbacks[fileobj]
+
+        def select(self, timeout):
+            # type: (float) -> List[Tuple[Callable, Any]]
+            if not self._callbacks:
+                return []
+            readable, _, _ = select.select(list(self._callbacks), [], [], max(timeout, 0))
+            return [(self._callbacks[fileobj], fileobj) for fileobj in readable]
+
+        def close(self):
+            # type: () -> None
+            self._callbacks = {}
+
+
+__all__ = ['Server', 'ServerMixIn', 'Aggregator', 'Aggregates', 'Summary', 'TimerSamples',
+           'AbstractBackend', 'MemoryBackend', 'StreamBackend']
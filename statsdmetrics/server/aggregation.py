@@ -0,0 +1,332 @@
+"""
+statsdmetrics.server.aggregation
+--------------------------------
+Aggregate metrics received by servers, per flush interval
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+from math import ceil
+from time import time
+
+try:
+    from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple, Union
+    Key = Tuple[str, Tuple[str, ...]]
+except ImportError:
+    Any, Callable, Dict, Iterable, List, Sequence, Tuple, Union = \
+        None, None, None, None, None, None, None, None  # type: ignore
+    Key = None  # type: ignore
+
+from ..metrics import Counter, Timer, Gauge, GaugeDelta, Set, parse_metrics
+from ..sketches import DEFAULT_PERCENTILES, percentile_name
+
+
+class TimerSamples(object):
+    """Samples of a timer in a flush interval.
+
+    All the values are kept, so the statistics are exact. The count is
+    adjusted by the sample rates (a value sampled at 0.1 counts as 10).
+    """
+
+    __slots__ = ('values', 'count')
+
+    def __init__(self):
+        # type: () -> None
+        self.values = []  # type: List[float]
+        self.count = 0.0  # type: float
+
+    def add(self, value, rate=1):
+        # type: (float, float) -> None
+        self.values.append(value)
+        self.count += 1.0 / rate
+
+    def merge(self, other):
+        # type: (TimerSamples) -> TimerSamples
+        self.values.extend(other.values)
+        self.count += other.count
+        return self
+
+    def stats(self, percentiles=DEFAULT_PERCENTILES):
+        # type: (Sequence[float]) -> Dict[str, float]
+        """Return the statistics of the samples (count, samples, sum, min, max, mean and percentiles)"""
+
+        values = sorted(self.values)
+        samples = len(values)
+        total = sum(values)
+        stats = {
+            'count': self.count,
+            'samples': samples,
+            'sum': total,
+            'min': values[0] if samples else 0,
+            'max': values[-1] if samples else 0,
+            'mean': total / samples if samples else 0,
+        }
+        for percentile in percentiles:
+            stats[percentile_name(percentile)] = _nearest_rank(values, percentile)
+        return stats
+
+    def __len__(self):
+        # type: () -> int
+        return len(self.values)
+
+
+def _nearest_rank(values, percentile):
+    # type: (Sequence[float], float) -> float
+    if not values:
+        return 0
+    index = int(ceil(percentile / 100.0 * len(values))) - 1
+    return values[min(max(index, 0), len(values) - 1)]
+
+
+class Aggregates(object):
+    """Metrics aggregated in a flush interval, that can be merged with other aggregates.
+
+    Metrics are keyed by their name and tags. Counters are summed (adjusted by
+    the sample rates), the last value of gauges is kept along with the deltas
+    after it and the time it was set, unique values of sets are kept, and timer
+    samples are collected by the timer factory.
+    """
+
+    def __init__(self, timer_factory=TimerSamples, set_factory=set):
+        # type: (Callable, Callable) -> None
+        self.timer_factory = timer_factory  # type: Callable
+        self.set_factory = set_factory  # type: Callable
+        self.counters = {}  # type: Dict[Key, float]
+        # key: [value or None, delta after the value, time the value was set]
+        self.gauges = {}  # type: Dict[Key, List]
+        self.sets = {}  # type: Dict[Key, Any]
+        self.timers = {}  # type: Dict[Key, Any]
+        self.metrics = 0  # type: int
+
+    def add(self, metric):
+        # type: (Any) -> None
+        """Aggregate the metric object"""
+
+        key = (metric.name, metric.tags)
+        metric_class = metric.__class__
+        if metric_class is Counter:
+            count = metric.count if metric.sample_rate == 1 else metric.count / float(metric.sample_rate)
+            counters = self.counters
+            counters[key] = counters.get(key, 0) + count
+        elif metric_class is Timer:
+            timer = self.timers.get(key)
+            if timer is None:
+                timer = self.timers[key] = self.timer_factory()
+            timer.add(metric.milliseconds, metric.sample_rate)
+        elif metric_class is Gauge:
+            self.gauges[key] = [metric.value, 0, time()]
+        elif metric_class is GaugeDelta:
+            gauge = self.gauges.get(key)
+            if gauge is None:
+                self.gauges[key] = [None, metric.delta, 0]
+            else:
+                gauge[1] += metric.delta
+        elif metric_class is Set:
+            members = self.sets.get(key)
+            if members is None:
+                members = self.sets[key] = self.set_factory()
+            members.add(metric.value)
+        else:
+            raise ValueError("Metric type '{}' is not supported".format(metric_class.__name__))
+        self.metrics += 1
+
+    def merge(self, other):
+        # type: (Aggregates) -> Aggregates
+        """Merge the other aggregates into these aggregates.
+
+        Gauges are set to the value that was set last (by the time it was set),
+        and the deltas received after the values are added together.
+        """
+
+        counters = self.counters
+        for key, count in other.counters.items():
+            counters[key] = counters.get(key, 0) + count
+        gauges = self.gauges
+        for key, (value, delta, set_time) in other.gauges.items():
+            gauge = gauges.get(key)
+            if gauge is None:
+                gauges[key] = [value, delta, set_time]
+            elif value is not None and (gauge[0] is None or set_time >= gauge[2]):
+                gauges[key] = [value, delta + (gauge[1] if gauge[0] is None else 0), set_time]
+            elif value is None or gauge[0] is None:
+                gauge[1] += delta
+        sets = self.sets
+        for key, members in other.sets.items():
+            current = sets.get(key)
+            if current is None:
+                current = sets[key] = self.set_factory()
+            current.update(members)
+        timers = self.timers
+        for key, timer in other.timers.items():
+            current = timers.get(key)
+            if current is None:
+                current = timers[key] = self.timer_factory()
+            current.merge(timer)
+        self.metrics += other.metrics
+        return self
+
+    def __len__(self):
+        # type: () -> int
+        return len(self.counters) + len(self.gauges) + len(self.sets) + len(self.timers)
+
+
+class Summary(object):
+    """Summary of the metrics of a flush interval, that is sent to the backends.
+
+    Counters are the rate adjusted counts (and per second rates), gauges are
+    the current value of all the known gauges, sets are the number of unique
+    values, and timers are dicts of statistics. Metrics are keyed by a tuple
+    of (name, tags).
+    """
+
+    def __init__(self, timestamp, interval, counters, gauges, sets, timers, metrics):
+        # type: (float, float, Dict, Dict, Dict, Dict, int) -> None
+        self.timestamp = timestamp  # type: float
+        self.interval = interval  # type: float
+        self.counters = counters  # type: Dict[Key, float]
+        self.gauges = gauges  # type: Dict[Key, float]
+        self.sets = sets  # type: Dict[Key, int]
+        self.timers = timers  # type: Dict[Key, Dict[str, float]]
+        self.metrics = metrics  # type: int
+
+    @property
+    def counter_rates(self):
+        # type: () -> Dict[Key, float]
+        """Counts per second"""
+
+        if not self.interval:
+            return dict(self.counters)
+        return dict((key, count / self.interval) for key, count in self.counters.items())
+
+
+class Aggregator(object):
+    """Aggregate received metrics, and summarize them on each flush.
+
+    Payloads (datagrams or lines of streams) are parsed in bulk by parse_metrics(),
+    and malformed lines are counted. Gauges keep their values between flushes
+    (unless delete_gauges is true), and deltas change the last value.
+
+    Timer samples are collected by the timer factory (TimerSamples by default,
+    keeping all the values, or DDSketch for bounded memory), and the unique
+    values of sets by the set factory (the builtin set by default, or
+    HyperLogLog for bounded memory).
+
+    Aggregators are not thread safe, servers use them from their event loop.
+    """
+
+    def __init__(self, percentiles=DEFAULT_PERCENTILES, timer_factory=TimerSamples,
+                 set_factory=set, delete_gauges=False):
+        # type: (Sequence[float], Callable, Callable, bool) -> None
+        for percentile in percentiles:
+            assert 0 < percentile <= 100, "Percentiles should be between 0 and 100"
+        self._percentiles = tuple(percentiles)  # type: Tuple[float, ...]
+        self._timer_factory = timer_factory  # type: Callable
+        self._set_factory = set_factory  # type: Callable
+        self._delete_gauges = bool(delete_gauges)  # type: bool
+        self._aggregates = self.create_aggregates()  # type: Aggregates
+        self._gauges = {}  # type: Dict[Key, float]
+        self._bad_lines = _LineCounter()  # type: _LineCounter
+        self._last_flush = time()  # type: float
+
+    @property
+    def percentiles(self):
+        # type: () -> Tuple[float, ...]
+        return self._percentiles
+
+    @property
+    def bad_lines(self):
+        # type: () -> int
+        """Number of malformed lines that were skipped"""
+        return self._bad_lines.count
+
+    @property
+    def aggregates(self):
+        # type: () -> Aggregates
+        """Aggregates of the current flush interval"""
+        return self._aggregates
+
+    def create_aggregates(self):
+        # type: () -> Aggregates
+        """Create empty aggregates, with the timer and set factories of the aggregator"""
+
+        return Aggregates(self._timer_factory, self._set_factory)
+
+    def add_payload(self, payload):
+        # type: (Union[bytes, str]) -> int
+        """Parse and aggregate metrics of a payload, return the number of the metrics"""
+
+        aggregates = self._aggregates
+        metrics = aggregates.metrics
+        add = aggregates.add
+        for metric in parse_metrics(payload, self._bad_lines):
+            add(metric)
+        return aggregates.metrics - metrics
+
+    def add(self, metric):
+        # type: (Any) -> None
+        """Aggregate the metric object"""
+
+        self._aggregates.add(metric)
+
+    def merge(self, aggregates):
+        # type: (Aggregates) -> None
+        """Merge the aggregates (i.e of another process) into the current flush interval"""
+
+        self._aggregates.merge(aggregates)
+
+    def take(self):
+        # type: () -> Aggregates
+        """Return the aggregates of the current flush interval, and start a new one"""
+
+        aggregates, self._aggregates = self._aggregates, self.create_aggregates()
+        return aggregates
+
+    def flush(self):
+        # type: () -> Summary
+        """Take the aggregates of the current flush interval and summarize them"""
+
+        now = time()
+        interval, self._last_flush = now - self._last_flush, now
+        aggregates = self.take()
+        if self._delete_gauges:
+            self._gauges = {}
+        gauges = self._gauges
+        for key, (value, delta, _) in aggregates.gauges.items():
+            if value is None:
+                value = gauges.get(key, 0)
+            gauges[key] = value + delta
+        return Summary(
+            now,
+            interval,
+            aggregates.counters,
+            dict(gauges),
+            dict((key, len(members)) for key, members in aggregates.sets.items()),
+            self.summarize_timers(aggregates.timers),
+            aggregates.metrics,
+        )
+
+    def summarize_timers(self, timers):
+        # type: (Dict[Key, Any]) -> Dict[Key, Dict[str, float]]
+        """Return the statistics of the timers"""
+
+        percentiles = self._percentiles
+        return dict((key, timer.stats(percentiles)) for key, timer in timers.items())
+
+
+class _LineCounter(object):
+    """Count malformed lines reported by parse_metrics()"""
+
+    __slots__ = ('count',)
+
+    def __init__(self):
+        # type: () -> None
+        self.count = 0  # type: int
+
+    def append(self, error):
+        # type: (Any) -> None
+        self.count += 1
+
+
+__all__ = ['TimerSamples', 'Aggregates', 'Summary', 'Aggregator', 'percentile_name']
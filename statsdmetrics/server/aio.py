@@ -0,0 +1,172 @@
+"""
+statsdmetrics.server.aio
+------------------------
+Statsd server for asyncio, receiving metrics over UDP and TCP in an event loop
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import asyncio
+import socket
+
+try:
+    from typing import Any, Iterable, List, Optional, Tuple
+except ImportError:
+    Any, Iterable, List, Optional, Tuple = None, None, None, None, None  # type: ignore
+
+from . import (ServerMixIn, Aggregator, AbstractBackend, DEFAULT_HOST, DEFAULT_PORT,
+               DEFAULT_FLUSH_INTERVAL, MAX_LINE_SIZE, RECEIVE_BUFFER_SIZE)
+
+try:
+    _get_running_loop = asyncio.get_running_loop
+except AttributeError:
+    _get_running_loop = asyncio.get_event_loop
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, server):
+        # type: (AsyncServer) -> None
+        self._server = server
+
+    def connection_made(self, transport):
+        # type: (Any) -> None
+        sock = transport.get_extra_info('socket')
+        if sock is not None:
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER_SIZE)
+            except OSError:
+                pass
+
+    def datagram_received(self, data, address):
+        # type: (bytes, Tuple) -> None
+        self._server._receive_datagram(data)
+
+
+class AsyncServer(ServerMixIn):
+    """Statsd server for asyncio, receiving metrics over UDP (and optionally TCP)
+    and flushing the aggregated metrics to the backends every flush interval
+    (in milliseconds) in a task of the event loop.
+
+    >>> server = AsyncServer(backends=[StreamBackend()], tcp_port=8125)
+    >>> await server.start()
+    >>> await server.serve_forever()
+    """
+
+    def __init__(self, aggregator=None, backends=(), host=DEFAULT_HOST, port=DEFAULT_PORT,
+                 tcp_port=None, flush_interval=DEFAULT_FLUSH_INTERVAL, reuse_port=False):
+        # type: (Aggregator, Iterable[AbstractBackend], str, int, int, float, bool) -> None
+        ServerMixIn.__init__(self, aggregator, backends, flush_interval)
+        self._host = host  # type: str
+        self._port = port  # type: int
+        self._tcp_port = tcp_port  # type: Optional[int]
+        self._reuse_port = reuse_port  # type: bool
+        self._transport = None  # type: Any
+        self._tcp_server = None  # type: Any
+        self._flush_task = None  # type: Optional[asyncio.Task]
+        self._stopped = None  # type: Optional[asyncio.Event]
+
+    @property
+    def address(self):
+        # type: () -> Tuple
+        """The address of the UDP socket, when started"""
+        return self._transport.get_extra_info('sockname') if self._transport else None
+
+    @property
+    def tcp_address(self):
+        # type: () -> Tuple
+        """The address of the TCP socket, when started"""
+        if not self._tcp_server:
+            return None
+        return self._tcp_server.sockets[0].getsockname()
+
+    @property
+    def running(self):
+        # type: () -> bool
+        return self._flush_task is not None
+
+    async def start(self):
+        # type: () -> None
+        """Bind the sockets and start flushing in the background"""
+
+        loop = _get_running_loop()
+        reuse_port = True if self._reuse_port else None
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _DatagramProtocol(self),
+            local_addr=(self._host, self._port),
+            reuse_port=reuse_port,
+        )
+        if self._tcp_port is not None:
+            self._tcp_server = await asyncio.start_server(
+                self._handle_stream, self._host, self._tcp_port, reuse_port=reuse_port)
+        self._stopped = asyncio.Event()
+        self._flush_task = loop.create_task(self._flush_periodically())
+
+    async def serve_forever(self):
+        # type: () -> None
+        """Serve until close() is called"""
+
+        if self._flush_task is None:
+            await self.start()
+        await self._stopped.wait()
+
+    async def close(self):
+        # type: () -> None
+        """Stop receiving metrics, flush them and close the backends"""
+
+        if self._flush_task is None:
+            return
+        self._flush_task.cancel()
+        try:
+            await self._flush_task
+        except asyncio.CancelledError:
+            pass
+        self._flush_task = None
+        self._transport.close()
+        if self._tcp_server is not None:
+            self._tcp_server.close()
+            await self._tcp_server.wait_closed()
+        self.flush()
+        self._close_backends()
+        self._stopped.set()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, exc_traceback):
+        await self.close()
+
+    async def _flush_periodically(self):
+        # type: () -> None
+        interval = self._flush_interval / 1000.0
+        while True:
+            await asyncio.sleep(interval)
+            self.flush()
+
+    async def _handle_stream(self, reader, writer):
+        # type: (asyncio.StreamReader, asyncio.StreamWriter) -> None
+        add_payload = self._aggregator.add_payload
+        rest = b""
+        try:
+            while True:
+                data = await reader.read(MAX_LINE_SIZE)
+                if not data:
+                    break
+                lines, separator, rest = (rest + data).rpartition(b"\n")
+                if separator:
+                    add_payload(lines)
+                if len(rest) > MAX_LINE_SIZE:
+                    # a line can not be that long, drop it
+                    rest = b""
+            if rest:
+                add_payload(rest)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            writer.close()
+
+
+__all__ = ['AsyncServer']
@@ -0,0 +1,119 @@
+"""
+statsdmetrics.server.backends
+-----------------------------
+Backends that servers emit the aggregated metrics to, on each flush
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import sys
+from abc import ABCMeta, abstractmethod
+from collections import deque
+
+try:
+    from typing import Any, Iterator, List, Tuple
+except ImportError:
+    Any, Iterator, List, Tuple = None, None, None, None  # type: ignore
+
+from .aggregation import Summary
+
+
+def format_key(key):
+    # type: (Tuple[str, Tuple[str, ...]]) -> str
+    """Format a metric key (name, tags) as name, or name;tag1;tag2 (graphite tags)"""
+
+    name, tags = key
+    if not tags:
+        return name
+    return name + ";" + ";".join(tag.replace(":", "=", 1) for tag in tags)
+
+
+class AbstractBackend(object):
+    """Backends receive the summary of the aggregated metrics of each flush interval"""
+
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def flush(self, summary):
+        # type: (Summary) -> None
+        pass
+
+    def close(self):
+        # type: () -> None
+        pass
+
+
+class MemoryBackend(AbstractBackend):
+    """Keep the summaries of the last flushes in memory (i.e for tests)"""
+
+    def __init__(self, size=100):
+        # type: (int) -> None
+        size = int(size)
+        assert size > 0, "Memory backend size should be positive"
+        self._summaries = deque(maxlen=size)  # type: deque
+
+    @property
+    def summaries(self):
+        # type: () -> List[Summary]
+        return list(self._summaries)
+
+    @property
+    def last(self):
+        # type: () -> Summary
+        """The summary of the last flush, or None"""
+        return self._summaries[-1] if self._summaries else None
+
+    def flush(self, summary):
+        # type: (Summary) -> None
+        self._summaries.append(summary)
+
+
+class StreamBackend(AbstractBackend):
+    """Write the aggregated metrics to a stream (stdout by default)
+    in the graphite plain text format (path value timestamp).
+
+    Counters are written as <prefix>counters.<name>.count and .rate,
+    gauges as <prefix>gauges.<name>, sets as <prefix>sets.<name>.count
+    and timers as <prefix>timers.<name>.<statistic>.
+    """
+
+    def __init__(self, stream=None, prefix="stats."):
+        # type: (Any, str) -> None
+        self._stream = stream  # type: Any
+        self._prefix = prefix  # type: str
+
+    @property
+    def prefix(self):
+        # type: () -> str
+        return self._prefix
+
+    def flush(self, summary):
+        # type: (Summary) -> None
+        stream = self._stream or sys.stdout
+        stream.write("".join(self.lines(summary)))
+        stream.flush()
+
+    def lines(self, summary):
+        # type: (Summary) -> Iterator[str]
+        """Yield the lines of the summary"""
+
+        prefix = self._prefix
+        timestamp = int(summary.timestamp)
+        rates = summary.counter_rates
+        for key, count in summary.counters.items():
+            path = "{}counters.{}".format(prefix, format_key(key))
+            yield "{}.count {:g} {}\n".format(path, count, timestamp)
+            yield "{}.rate {:g} {}\n".format(path, rates[key], timestamp)
+        for key, value in summary.gauges.items():
+            yield "{}gauges.{} {:g} {}\n".format(prefix, format_key(key), value, timestamp)
+        for key, count in summary.sets.items():
+            yield "{}sets.{}.count {} {}\n".format(prefix, format_key(key), count, timestamp)
+        for key, stats in summary.timers.items():
+            path = "{}timers.{}".format(prefix, format_key(key))
+            for name in sorted(stats):
+                yield "{}.{} {:g} {}\n".format(path, name, stats[name], timestamp)
+
+
+__all__ = ['AbstractBackend', 'MemoryBackend', 'StreamBackend', 'format_key']
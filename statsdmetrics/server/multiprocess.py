@@ -0,0 +1,304 @@
+"""
+statsdmetrics.server.multiprocess
+---------------------------------
+Statsd server running multiple worker processes sharing the ports by SO_REUSEPORT
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import socket
+from multiprocessing import Process, Pipe, cpu_count
+from threading import Event
+
+try:
+    from time import monotonic as clock
+except ImportError:
+    from time import time as clock  # type: ignore
+
+try:
+    from typing import Any, Iterable, List, Optional, Tuple
+except ImportError:
+    Any, Iterable, List, Optional, Tuple = None, None, None, None, None  # type: ignore
+
+from . import (Server, ServerMixIn, Aggregator, AbstractBackend, DEFAULT_HOST, DEFAULT_PORT,
+               DEFAULT_FLUSH_INTERVAL, _EVENT_READ, _bind_socket)
+
+WORKER_START_TIMEOUT = 10
+_READY = "ready"
+_TAKE = "take"
+_STOP = "stop"
+
+
+class _Worker(Server):
+    """Server of a worker process, aggregating its share of the metrics
+    and sending the aggregates to the coordinator on request.
+    """
+
+    def __init__(self, aggregator, host, port, tcp_port, connection):
+        # type: (Aggregator, str, int, int, Any) -> None
+        Server.__init__(self, aggregator, (), host, port, tcp_port, reuse_port=True)
+        self._connection = connection  # type: Any
+        self._reported_datagrams = 0  # type: int
+        self._reported_bad_lines = 0  # type: int
+        self._selector.register(connection, _EVENT_READ, self._read_command)
+
+    def run(self):
+        # type: () -> None
+        """Aggregate metrics until the coordinator stops the worker"""
+
+        self._running = True
+        self._connection.send(_READY)
+        try:
+            while self._running:
+                for callback, fileobj in self._selector.select(None):
+                    callback(fileobj)
+        finally:
+            self._running = False
+
+    def _read_command(self, connection):
+        # type: (Any) -> None
+        try:
+            command = connection.recv()
+        except (EOFError, IOError, OSError):
+            # the coordinator is gone
+            self._running = False
+            return
+        if command == _STOP:
+            self._running = False
+        self._send_aggregates()
+
+    def _send_aggregates(self):
+        # type: () -> None
+        aggregator = self._aggregator
+        datagrams = self._datagrams - self._reported_datagrams
+        bad_lines = aggregator.bad_lines - self._reported_bad_lines
+        self._reported_datagrams += datagrams
+        self._reported_bad_lines += bad_lines
+        self._connection.send((aggregator.take(), datagrams, bad_lines))
+
+    def close(self):
+        # type: () -> None
+        try:
+            self._selector.unregister(self._connection)
+        except (KeyError, ValueError):
+            pass
+        Server.close(self)
+        self._connection.close()
+
+
+def _run_worker(aggregator, host, port, tcp_port, connection):
+    # type: (Aggregator, str, int, int, Any) -> None
+    try:
+        worker = _Worker(aggregator, host, port, tcp_port, connection)
+    except Exception as exc:
+        connection.send(exc)
+        connection.close()
+        return
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.close()
+
+
+def _reserve_port(host, port, socket_type):
+    # type: (str, int, int) -> Tuple
+    # bind to find the address, so all the workers bind the same port even if
+    # the port is chosen by the system (0). The socket is closed before starting
+    # the workers, otherwise forked workers inherit it and the kernel keeps
+    # sending a share of the datagrams to it.
+    sock = _bind_socket(host, port, socket_type, True)
+    try:
+        return sock.getsockname()
+    finally:
+        sock.close()
+
+
+class MultiProcessServer(ServerMixIn):
+    """Statsd server running worker processes that bind the same UDP (and TCP)
+    port with SO_REUSEPORT, so the kernel spreads the load over the workers.
+
+    Each worker aggregates its own share of the metrics. On each flush the
+    coordinator (the process running the server) takes the aggregates of all
+    the workers, merges them into its aggregator and sends the summary to the
+    backends. Counters and sets are merged exactly, timer percentiles are
+    computed on the merged samples, and the gauge value that was set last
+    wins (the kernel keeps each client on the same worker, so the order of
+    the gauges of a client is preserved).
+
+    The aggregator (and its timer and set factories) is copied to the workers,
+    and the aggregates are sent back by pipes, so they should be picklable.
+
+    >>> server = MultiProcessServer(backends=[StreamBackend()], port=8125, workers=4)
+    >>> server.serve_forever()
+    """
+
+    def __init__(self, aggregator=None, backends=(), host=DEFAULT_HOST, port=DEFAULT_PORT,
+                 tcp_port=None, flush_interval=DEFAULT_FLUSH_INTERVAL, workers=None):
+        # type: (Aggregator, Iterable[AbstractBackend], str, int, int, float, int) -> None
+        assert hasattr(socket, 'SO_REUSEPORT'), "SO_REUSEPORT is not supported on this platform"
+        workers = cpu_count() if workers is None else int(workers)
+        assert workers > 0, "Server workers should be positive"
+        ServerMixIn.__init__(self, aggregator, backends, flush_interval)
+        self._host = host  # type: str
+        self._port = port  # type: int
+        self._tcp_port = tcp_port  # type: Optional[int]
+        self._workers = workers  # type: int
+        self._processes = []  # type: List[Tuple[Process, Any]]
+        self._address = None  # type: Tuple
+        self._tcp_address = None  # type: Tuple
+        self._bad_lines = 0  # type: int
+        self._stopping = Event()  # type: Event
+
+    @property
+    def workers(self):
+        # type: () -> int
+        return self._workers
+
+    @property
+    def address(self):
+        # type: () -> Tuple
+        """The address of the UDP sockets, when started"""
+        return self._address
+
+    @property
+    def tcp_address(self):
+        # type: () -> Tuple
+        """The address of the TCP sockets, when started"""
+        return self._tcp_address
+
+    @property
+    def running(self):
+        # type: () -> bool
+        return bool(self._processes)
+
+    @property
+    def bad_lines(self):
+        # type: () -> int
+        """Number of malformed lines skipped by the workers"""
+        return self._bad_lines
+
+    def start(self):
+        # type: () -> None
+        """Start the worker processes, and wait for them to bind the sockets"""
+
+        if self._processes:
+            return
+        self._address = _reserve_port(self._host, self._port, socket.SOCK_DGRAM)
+        if self._tcp_port is not None:
+            self._tcp_address = _reserve_port(self._host, self._tcp_port, socket.SOCK_STREAM)
+        self._start_workers()
+        self._stopping.clear()
+
+    def serve_forever(self):
+        # type: () -> None
+        """Start the workers and flush the aggregated metrics every flush
+        interval, until shutdown() is called (from another thread or a backend).
+        """
+
+        self.start()
+        interval = self._flush_interval / 1000.0
+        next_flush = clock() + interval
+        try:
+            while not self._stopping.wait(max(next_flush - clock(), 0)):
+                self.flush()
+                next_flush = max(next_flush + interval, clock())
+        finally:
+            self._stop_workers()
+            ServerMixIn.flush(self)
+
+    def shutdown(self):
+        # type: () -> None
+        """Stop serving, the metrics are flushed when the server stops"""
+
+        self._stopping.set()
+
+    def flush(self):
+        # type: () -> Any
+        """Merge the aggregates of the workers, and flush them to the backends"""
+
+        self._collect(_TAKE)
+        return ServerMixIn.flush(self)
+
+    def close(self):
+        # type: () -> None
+        """Stop the workers (flushing the remaining metrics), and close the backends"""
+
+        if self._processes:
+            self._stop_workers()
+            ServerMixIn.flush(self)
+        self._close_backends()
+
+    def _start_workers(self):
+        # type: () -> None
+        for _ in range(self._workers):
+            connection, child_connection = Pipe()
+            process = Process(
+                target=_run_worker,
+                args=(self._aggregator, self._host, self._address[1],
+                      self._tcp_address[1] if self._tcp_address else None, child_connection),
+            )
+            process.daemon = True
+            process.start()
+            child_connection.close()
+            self._processes.append((process, connection))
+        try:
+            for _, connection in self._processes:
+                if not connection.poll(WORKER_START_TIMEOUT):
+                    raise RuntimeError("Server worker did not start in time")
+                message = connection.recv()
+                if isinstance(message, Exception):
+                    raise message
+        except Exception:
+            self._terminate_workers()
+            raise
+
+    def _collect(self, command):
+        # type: (str) -> None
+        # request from all the workers first, so they serialize their aggregates in parallel
+        processes = []
+        for process, connection in self._processes:
+            try:
+                connection.send(command)
+            except (IOError, OSError):
+                continue
+            processes.append(connection)
+        merge = self._aggregator.merge
+        for connection in processes:
+            try:
+                aggregates, datagrams, bad_lines = connection.recv()
+            except (EOFError, IOError, OSError):
+                continue
+            merge(aggregates)
+            self._datagrams += datagrams
+            self._bad_lines += bad_lines
+
+    def _stop_workers(self):
+        # type: () -> None
+        self._collect(_STOP)
+        for process, connection in self._processes:
+            process.join(WORKER_START_TIMEOUT)
+            connection.close()
+        self._terminate_workers()
+
+    def _terminate_workers(self):
+        # type: () -> None
+        for process, connection in self._processes:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+            connection.close()
+        self._processes = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+
+__all__ = ['MultiProcessServer']
@@ -0,0 +1,134 @@
+"""
+statsdmetrics.server.vectorized
+-------------------------------
+Aggregate timers with NumPy, computing the statistics of all the timers in vectorized passes.
+
+Timer samples are kept in growable array('d') buffers, that NumPy reads without
+copying. NumPy is optional, when it's not installed numpy_available is False
+and the statistics are computed in Python, from the same buffers.
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+from array import array
+
+try:
+    from typing import Any, Callable, Dict, List, Sequence, Tuple
+except ImportError:
+    Any, Callable, Dict, List, Sequence, Tuple = None, None, None, None, None, None  # type: ignore
+
+try:
+    import numpy
+except ImportError:
+    numpy = None  # type: ignore
+
+from .aggregation import Aggregator, TimerSamples, DEFAULT_PERCENTILES, percentile_name
+
+numpy_available = numpy is not None  # type: bool
+
+
+class ArrayTimerSamples(TimerSamples):
+    """Samples of a timer in a flush interval, kept in an array('d') buffer.
+
+    All the values are kept, as in TimerSamples, taking 8 bytes per value
+    instead of a Python float object.
+    """
+
+    __slots__ = ()
+
+    def __init__(self):
+        # type: () -> None
+        self.values = array('d')  # type: array
+        self.count = 0.0  # type: float
+
+
+def summarize_timers(timers, percentiles=DEFAULT_PERCENTILES):
+    # type: (Dict[Any, Any], Sequence[float]) -> Dict[Any, Dict[str, float]]
+    """Return the statistics of the timers (count, samples, sum, min, max, mean and percentiles),
+    as the stats() of timer samples do, computed for all the timers in vectorized passes.
+
+    Timers are objects with values (array('d') buffers, or sequences of numbers)
+    and a count, as ArrayTimerSamples. Requires NumPy.
+    """
+
+    if numpy is None:
+        raise NotImplementedError("NumPy is not available")
+    keys = [key for key, timer in timers.items() if len(timer.values)]
+    summaries = dict((key, timers[key].stats(percentiles)) for key, timer in timers.items()
+                     if not len(timer.values))
+    if not keys:
+        return summaries
+
+    float64 = numpy.float64
+    buffers = []
+    for key in keys:
+        values = timers[key].values
+        if isinstance(values, array) and values.typecode == 'd':
+            buffers.append(numpy.frombuffer(values, dtype=float64))
+        else:
+            buffers.append(numpy.asarray(values, dtype=float64))
+    lengths = numpy.fromiter((len(values) for values in buffers), dtype=numpy.int64, count=len(buffers))
+    values = numpy.concatenate(buffers)
+    ends = numpy.cumsum(lengths)
+    starts = ends - lengths
+    # sort the values of each timer in place, a vectorized sort per timer is
+    # faster than sorting all the values by (timer, value)
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        values[start:end].sort()
+
+    columns = [
+        ('count', numpy.fromiter((timers[key].count for key in keys), dtype=float64, count=len(keys))),
+        ('samples', lengths),
+    ]
+    sums = numpy.add.reduceat(values, starts)
+    columns.append(('sum', sums))
+    columns.append(('min', values[starts]))
+    columns.append(('max', values[ends - 1]))
+    columns.append(('mean', sums / lengths))
+    for percentile in percentiles:
+        # nearest rank, as TimerSamples.stats()
+        ranks = numpy.ceil(percentile / 100.0 * lengths).astype(numpy.int64) - 1
+        ranks = numpy.minimum(numpy.maximum(ranks, 0), lengths - 1)
+        columns.append((percentile_name(percentile), values[starts + ranks]))
+
+    names = [name for name, _ in columns]
+    rows = zip(*[column.tolist() for _, column in columns])
+    for key, row in zip(keys, rows):
+        summaries[key] = dict(zip(names, row))
+    return summaries
+
+
+class VectorizedAggregator(Aggregator):
+    """Aggregator keeping timer samples in array('d') buffers, and computing
+    the statistics of all the timers with NumPy in vectorized passes on flush.
+
+    Without NumPy the statistics are computed in Python (as the Aggregator does),
+    so the aggregator can be used regardless of NumPy being installed.
+    Timer factories of other types (i.e DDSketch) are summarized by their stats().
+    """
+
+    def __init__(self, percentiles=DEFAULT_PERCENTILES, timer_factory=ArrayTimerSamples,
+                 set_factory=set, delete_gauges=False):
+        # type: (Sequence[float], Callable, Callable, bool) -> None
+        Aggregator.__init__(self, percentiles, timer_factory, set_factory, delete_gauges)
+
+    def summarize_timers(self, timers):
+        # type: (Dict[Any, Any]) -> Dict[Any, Dict[str, float]]
+        if numpy is None:
+            return Aggregator.summarize_timers(self, timers)
+        samples = {}
+        others = {}
+        for key, timer in timers.items():
+            if isinstance(timer, TimerSamples):
+                samples[key] = timer
+            else:
+                others[key] = timer
+        summaries = summarize_timers(samples, self._percentiles)
+        if others:
+            summaries.update(Aggregator.summarize_timers(self, others))
+        return summaries
+
+
+__all__ = ['ArrayTimerSamples', 'VectorizedAggregator', 'summarize_timers', 'numpy_available']
@@ -0,0 +1,399 @@
+"""
+statsdmetrics.sketches
+----------------------
+Mergeable sketches summarizing metric values with bounded memory
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+from math import ceil, log
+from zlib import crc32
+
+try:
+    from typing import Any, Dict, Iterable, Iterator, List, Sequence, Tuple
+except ImportError:
+    Any, Dict, Iterable, Iterator, List, Sequence, Tuple = None, None, None, None, None, None, None  # type: ignore
+
+try:
+    text_type = unicode  # type: ignore
+except NameError:
+    text_type = str
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+DEFAULT_MAX_BINS = 2048
+DEFAULT_PERCENTILES = (50, 90, 99)
+MIN_INDEXABLE_VALUE = 1e-9
+MAX_CACHED_INDEXES = 8192
+DEFAULT_PRECISION = 12
+MIN_PRECISION = 4
+MAX_PRECISION = 16
+_INFINITY = float('inf')
+_HASH_RANGE = float(1 << 32)
+# bin indexes of values (i.e integer milliseconds) per relative accuracy, shared by sketches
+_index_caches = {}  # type: Dict[float, Dict[float, int]]
+
+
+def percentile_name(percentile):
+    # type: (float) -> str
+    """Return the name of the percentile in timer statistics (i.e p99, p99.9)"""
+
+    return "p{:g}".format(percentile)
+
+
+class DDSketch(object):
+    """Quantile sketch with relative error guarantees (DDSketch), to summarize
+    timer values in a fixed amount of memory.
+
+    Values are counted in logarithmic bins, so any quantile is estimated
+    within the relative accuracy of the actual value (i.e 0.01 means the
+    p99 is within 1% of the exact p99). Count, sum, min and max are exact.
+    The number of bins is limited to max_bins by collapsing the lowest bins,
+    which only affects the accuracy of the lowest quantiles.
+
+    Sketches with the same relative accuracy can be merged (i.e the sketches
+    of multiple processes or flush intervals), and the merged sketch has the
+    same accuracy as a sketch of all the values.
+
+    The interface is the same as the timer samples of server aggregators,
+    so the sketch can be used as their timer factory:
+
+    >>> aggregator = Aggregator(timer_factory=DDSketch)
+    >>> aggregator = Aggregator(timer_factory=functools.partial(DDSketch, 0.02))
+    """
+
+    __slots__ = ('_relative_accuracy', '_max_bins', '_gamma', '_multiplier', '_indexes',
+                 '_bins', '_negative_bins', '_zeros', 'count', 'samples', 'sum', 'min', 'max')
+
+    def __init__(self, relative_accuracy=DEFAULT_RELATIVE_ACCURACY, max_bins=DEFAULT_MAX_BINS):
+        # type: (float, int) -> None
+        assert 0 < relative_accuracy < 1, "Sketch relative accuracy should be between 0 and 1"
+        max_bins = int(max_bins)
+        assert max_bins > 0, "Sketch max bins should be positive"
+        self._relative_accuracy = float(relative_accuracy)  # type: float
+        self._max_bins = max_bins  # type: int
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)  # type: float
+        self._multiplier = 1 / log(self._gamma)  # type: float
+        self._indexes = _index_caches.setdefault(self._multiplier, {})  # type: Dict[float, int]
+        self._bins = {}  # type: Dict[int, int]
+        self._negative_bins = {}  # type: Dict[int, int]
+        self._zeros = 0  # type: int
+        self.count = 0.0  # type: float
+        self.samples = 0  # type: int
+        self.sum = 0.0  # type: float
+        self.min = _INFINITY  # type: float
+        self.max = -_INFINITY  # type: float
+
+    @property
+    def relative_accuracy(self):
+        # type: () -> float
+        return self._relative_accuracy
+
+    @property
+    def max_bins(self):
+        # type: () -> int
+        return self._max_bins
+
+    @property
+    def bins(self):
+        # type: () -> int
+        """Number of the bins in use"""
+        return len(self._bins) + len(self._negative_bins) + (1 if self._zeros else 0)
+
+    def add(self, value, rate=1):
+        # type: (float, float) -> None
+        """Add a value, sampled at the rate (a value sampled at 0.1 counts as 10)"""
+
+        if value > MIN_INDEXABLE_VALUE:
+            index = self._indexes.get(value)
+            if index is None:
+                index = self._index(value)
+            bins = self._bins
+            if index in bins:
+                bins[index] += 1
+            else:
+                self._add_bin(bins, index)
+        elif value < -MIN_INDEXABLE_VALUE:
+            index = int(ceil(log(-value) * self._multiplier))
+            bins = self._negative_bins
+            if index in bins:
+                bins[index] += 1
+            else:
+                self._add_bin(bins, index)
+        else:
+            self._zeros += 1
+        self.count += 1.0 / rate
+        self.samples += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def update(self, values):
+        # type: (Sequence[float]) -> None
+        """Add the values"""
+
+        add = self.add
+        for value in values:
+            add(value)
+
+    def merge(self, other):
+        # type: (DDSketch) -> DDSketch
+        """Merge the other sketch into this sketch"""
+
+        assert self._gamma == other._gamma, "Can not merge sketches of different relative accuracy"
+        for bins, other_bins in ((self._bins, other._bins), (self._negative_bins, other._negative_bins)):
+            for index, count in other_bins.items():
+                bins[index] = bins.get(index, 0) + count
+            if len(bins) > self._max_bins:
+                self._collapse(bins)
+        self._zeros += other._zeros
+        self.count += other.count
+        self.samples += other.samples
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, quantile):
+        # type: (float) -> float
+        """Return the estimated value of the quantile (between 0 and 1), or 0 if the sketch is empty"""
+
+        assert 0 <= quantile <= 1, "Quantile should be between 0 and 1"
+        return self.quantiles((quantile,))[0]
+
+    def quantiles(self, quantiles):
+        # type: (Sequence[float]) -> List[float]
+        """Return the estimated values of the quantiles in a single pass over the bins"""
+
+        if not self.samples:
+            return [0] * len(quantiles)
+        # nearest rank of each quantile, as in exact percentiles
+        ranks = sorted(
+            (min(max(int(ceil(quantile * self.samples)) - 1, 0), self.samples - 1), position)
+            for position, quantile in enumerate(quantiles)
+        )
+        results = [0.0] * len(quantiles)
+        gamma = self._gamma
+        next_rank = 0
+        seen = 0
+        for sign, index, count in self._ordered_bins():
+            seen += count
+            if ranks[next_rank][0] >= seen:
+                continue
+            # representative value of the bin, computed only for the bins of the quantiles
+            value = sign * 2 * gamma ** index / (gamma + 1) if sign else 0.0
+            value = min(max(value, self.min), self.max)
+            while next_rank < len(ranks) and ranks[next_rank][0] < seen:
+                results[ranks[next_rank][1]] = value
+                next_rank += 1
+            if next_rank == len(ranks):
+                break
+        return results
+
+    def stats(self, percentiles=DEFAULT_PERCENTILES):
+        # type: (Sequence[float]) -> Dict[str, float]
+        """Return the statistics of the values (count, samples, sum, min, max, mean and percentiles)"""
+
+        samples = self.samples
+        stats = {
+            'count': self.count,
+            'samples': samples,
+            'sum': self.sum,
+            'min': self.min if samples else 0,
+            'max': self.max if samples else 0,
+            'mean': self.sum / samples if samples else 0,
+        }
+        values = self.quantiles([percentile / 100.0 for percentile in percentiles])
+        for percentile, value in zip(percentiles, values):
+            stats[percentile_name(percentile)] = value
+        return stats
+
+    def _ordered_bins(self):
+        # type: () -> Iterator[Tuple[int, int, int]]
+        # yield (sign, index, count) of the bins in ascending order of the values
+        negative_bins = self._negative_bins
+        for index in sorted(negative_bins, reverse=True):
+            yield -1, index, negative_bins[index]
+        if self._zeros:
+            yield 0, 0, self._zeros
+        bins = self._bins
+        for index in sorted(bins):
+            yield 1, index, bins[index]
+
+    def _index(self, value):
+        # type: (float) -> int
+        index = int(ceil(log(value) * self._multiplier))
+        if len(self._indexes) < MAX_CACHED_INDEXES:
+            self._indexes[value] = index
+        return index
+
+    def _add_bin(self, bins, index):
+        # type: (Dict[int, int], int) -> None
+        bins[index] = 1
+        if len(bins) > self._max_bins:
+            self._collapse(bins)
+
+    def _collapse(self, bins):
+        # type: (Dict[int, int]) -> None
+        # merge the bins of the lowest magnitudes, to keep max bins
+        indexes = sorted(bins)
+        excess = len(indexes) - self._max_bins
+        target = indexes[excess]
+        for index in indexes[:excess]:
+            bins[target] += bins.pop(index)
+
+    def __getstate__(self):
+        # type: () -> Tuple
+        # the shared cache of indexes is not pickled
+        return (self._relative_accuracy, self._max_bins, self._bins, self._negative_bins,
+                self._zeros, self.count, self.samples, self.sum, self.min, self.max)
+
+    def __setstate__(self, state):
+        # type: (Tuple) -> None
+        self.__init__(state[0], state[1])
+        (self._bins, self._negative_bins, self._zeros,
+         self.count, self.samples, self.sum, self.min, self.max) = state[2:]
+
+    def __len__(self):
+        # type: () -> int
+        return self.samples
+
+    def __repr__(self):
+        # type: () -> str
+        return "{}(relative_accuracy={!r}, samples={})".format(
+            self.__class__.__name__, self._relative_accuracy, self.samples)
+
+
+class HyperLogLog(object):
+    """Estimate the number of unique values of a set in a fixed amount of memory (HyperLogLog).
+
+    The sketch uses 2 ** precision registers of a byte each (4 KB with the
+    default precision of 12), regardless of the number of values. The standard
+    error of the estimate is 1.04 / sqrt(2 ** precision) (1.6% by default),
+    and small sets are counted by linear counting, which is nearly exact.
+
+    Values are hashed by a hash that is the same in all the processes, so sketches
+    of the same precision can be merged (i.e the sketches of multiple processes
+    or flush intervals), and the merged sketch estimates the size of the union.
+
+    The interface is the same as the builtin set as used by server aggregators
+    (add, update and len), so the sketch can be used as their set factory:
+
+    >>> aggregator = Aggregator(set_factory=HyperLogLog)
+    >>> aggregator = Aggregator(set_factory=functools.partial(HyperLogLog, 14))
+    """
+
+    __slots__ = ('_precision', '_shift', '_mask', '_registers')
+
+    def __init__(self, precision=DEFAULT_PRECISION):
+        # type: (int) -> None
+        precision = int(precision)
+        assert MIN_PRECISION <= precision <= MAX_PRECISION, \
+            "HyperLogLog precision should be between {} and {}".format(MIN_PRECISION, MAX_PRECISION)
+        self._precision = precision  # type: int
+        self._shift = 32 - precision  # type: int
+        self._mask = (1 << self._shift) - 1  # type: int
+        self._registers = bytearray(1 << precision)  # type: bytearray
+
+    @property
+    def precision(self):
+        # type: () -> int
+        return self._precision
+
+    @property
+    def registers(self):
+        # type: () -> int
+        """Number of the registers (bytes of memory used by the registers)"""
+        return len(self._registers)
+
+    @property
+    def relative_error(self):
+        # type: () -> float
+        """The standard error of the estimates, relative to the actual count"""
+        return 1.04 / len(self._registers) ** 0.5
+
+    def add(self, value):
+        # type: (Any) -> None
+        """Add a value (strings are hashed as UTF-8, other values as their str())"""
+
+        # 32 bit hash of the value, that is the same in all the processes (unlike hash()).
+        # CRC32 is fast but not well distributed for similar values (i.e user IDs),
+        # so the bits are mixed by a multiplicative (Fibonacci) hash.
+        if value.__class__ is not bytes:
+            value = value.encode('utf-8') if isinstance(value, text_type) else str(value).encode('utf-8')
+        hashed = (crc32(value) * 0x9e3779b1) & 0xffffffff
+        hashed ^= hashed >> 16
+        shift = self._shift
+        # position of the first 1 bit of the bits after the index
+        rank = shift + 1 - (hashed & self._mask).bit_length()
+        index = hashed >> shift
+        registers = self._registers
+        if rank > registers[index]:
+            registers[index] = rank
+
+    def update(self, values):
+        # type: (Iterable[Any]) -> None
+        """Add the values, or merge another HyperLogLog (as set.update() does with sets)"""
+
+        if isinstance(values, HyperLogLog):
+            self.merge(values)
+            return
+        add = self.add
+        for value in values:
+            add(value)
+
+    def merge(self, other):
+        # type: (HyperLogLog) -> HyperLogLog
+        """Merge the other sketch into this sketch, to estimate the size of their union"""
+
+        assert self._precision == other._precision, \
+            "Can not merge HyperLogLog sketches of different precision"
+        self._registers = bytearray(map(max, self._registers, other._registers))
+        return self
+
+    def count(self):
+        # type: () -> int
+        """Return the estimated number of unique values"""
+
+        registers = self._registers
+        size = len(registers)
+        # sum of 2 ** -register, counting each possible register value in a pass
+        harmonic_sum = 0.0
+        for rank in range(34 - self._precision):
+            registers_of_rank = registers.count(rank)
+            if registers_of_rank:
+                harmonic_sum += registers_of_rank * 2.0 ** -rank
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(size, 0.7213 / (1 + 1.079 / size))
+        estimate = alpha * size * size / harmonic_sum
+        if estimate <= 2.5 * size:
+            zeros = registers.count(0)
+            if zeros:
+                # linear counting is more accurate for small sets
+                estimate = size * log(size / float(zeros))
+        elif estimate > _HASH_RANGE / 30.0:
+            # correct the hash collisions of large sets
+            estimate = -_HASH_RANGE * log(1 - estimate / _HASH_RANGE)
+        return int(round(estimate))
+
+    def __getstate__(self):
+        # type: () -> Tuple[int, bytes]
+        return self._precision, bytes(self._registers)
+
+    def __setstate__(self, state):
+        # type: (Tuple[int, bytes]) -> None
+        self.__init__(state[0])
+        self._registers = bytearray(state[1])
+
+    def __len__(self):
+        # type: () -> int
+        return self.count()
+
+    def __repr__(self):
+        # type: () -> str
+        return "{}(precision={!r})".format(self.__class__.__name__, self._precision)
+
+
+__all__ = ['DDSketch', 'HyperLogLog', 'percentile_name']
@@ -8,6 +8,7 @@ For more information see LICENSE or README files, or
 https://opensource.org/licenses/MIT.
 """
 import sys
+import socket
 from os.path import dirname
 import unittest
 
@@ -27,10 +28,11 @@ class MockMixIn(object):
     """Base test case to patch socket module for tests"""
 
     def doMock(self):
-        patcher = mock.patch('statsdmetrics.client.socket.gethostbyname')
-        self.mock_gethost = patcher.start()
+        patcher = mock.patch('statsdmetrics.client.socket.getaddrinfo')
+        self.mock_getaddrinfo = patcher.start()
         self.addCleanup(patcher.stop)
-        self.mock_gethost.return_value = "127.0.0.2"
+        self.mock_getaddrinfo.side_effect = lambda host, port, *args: [
+            (socket.AF_INET, socket.SOCK_DGRAM, 17, "", ("127.0.0.2", port))]
 
         patcher = mock.patch('statsdmetrics.client.random')
         self.mock_random = patcher.start()
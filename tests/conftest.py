@@ -0,0 +1,18 @@
+"""
+tests.conftest
+--------------
+pytest configuration of the tests
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import sys
+
+collect_ignore = []
+
+if sys.version_info < (3, 5):
+    # async/await syntax can not be parsed
+    collect_ignore.append("test_client_aio.py")
+    collect_ignore.append("test_server_aio.py")
@@ -10,6 +10,7 @@ https://opensource.org/licenses/MIT.
 
 import platform
 import gc
+import socket
 import unittest
 from time import time, sleep
 import threading
@@ -20,8 +21,10 @@ try:
 except ImportError:
     import mock
 
-from statsdmetrics.client import (AutoClosingSharedSocket, Client, BatchClient)
+from statsdmetrics.client import (AutoClosingSharedSocket, MetricNameCache,
+                                  Client, BatchClient, ThreadSafeBatchClient)
 from statsdmetrics.client.timing import Chronometer, Stopwatch
+from statsdmetrics.client.encoding import TagSet
 from . import BaseTestCase, MockMixIn, ClientTestCaseMixIn, BatchClientTestCaseMixIn
 
 
@@ -102,8 +105,126 @@ class TestSharedSocket(MockMixIn, BaseTestCase):
         self.assertEqual(self.mock_close.call_count, 1)
 
 
+class TestMetricNameCache(BaseTestCase):
+
+    def test_init_and_properties(self):
+        cache = MetricNameCache(10)
+        self.assertEqual(cache.size, 10)
+        self.assertEqual(cache.hits, 0)
+        self.assertEqual(cache.misses, 0)
+        self.assertEqual(len(cache), 0)
+        self.assertRaises(AssertionError, MetricNameCache, -1)
+        self.assertRaises(ValueError, MetricNameCache, "not number")
+
+    def test_get_normalizes_and_prefixes_names(self):
+        cache = MetricNameCache()
+        self.assertEqual(cache.get("event name"), "event_name")
+        self.assertEqual(cache.get("db/query!", "region."), "region.db-query")
+        self.assertEqual(cache.get("event name"), "event_name")
+        self.assertEqual(cache.get("db/query!", "other."), "other.db-query")
+        self.assertEqual(cache.hits, 1)
+        self.assertEqual(cache.misses, 3)
+        self.assertEqual(len(cache), 3)
+
+    def test_least_recently_used_names_are_evicted(self):
+        cache = MetricNameCache(2)
+        cache.get("first")
+        cache.get("second")
+        cache.get("first")
+        cache.get("third")
+        self.assertEqual(len(cache), 2)
+        cache.get("first")
+        self.assertEqual(cache.hits, 2)
+        cache.get("second")
+        self.assertEqual(cache.misses, 4)
+
+    def test_zero_size_does_not_cache(self):
+        cache = MetricNameCache(0)
+        self.assertEqual(cache.get("event name"), "event_name")
+        self.assertEqual(cache.get("event name"), "event_name")
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.hits, 0)
+        self.assertEqual(cache.misses, 2)
+
+    def test_clear(self):
+        cache = MetricNameCache()
+        cache.get("event")
+        cache.get("event")
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.hits, 0)
+        self.assertEqual(cache.misses, 0)
+
+
 class TestClient(ClientTestCaseMixIn, BaseTestCase):
 
+    def test_name_cache(self):
+        client = Client("localhost", name_cache_size=16)
+        client._socket = self.mock_socket
+        self.assertIsInstance(client.name_cache, MetricNameCache)
+        self.assertEqual(client.name_cache.size, 16)
+        client.increment("event")
+        client.increment("event")
+        client.prefix = "region."
+        client.increment("event")
+        self.assertEqual(client.name_cache.hits, 1)
+        self.assertEqual(client.name_cache.misses, 2)
+        self.mock_sendto.assert_called_with(
+            "region.event:1|c".encode(),
+            ("127.0.0.2", 8125)
+        )
+
+    def test_batch_client_shares_name_cache(self):
+        client = Client("localhost", name_cache_size=16)
+        batch_client = client.batch_client()
+        self.assertIs(batch_client.name_cache, client.name_cache)
+        self.assertIs(batch_client.unit_client().name_cache, client.name_cache)
+
+    def test_metrics_with_tags(self):
+        client = Client("localhost")
+        client._socket = self.mock_socket
+        client.increment("event", tags={"env": "prod"})
+        self.mock_sendto.assert_called_with(b"event:1|c|#env:prod", ("127.0.0.2", 8125))
+        client.decrement("event", 2, 0.5, tags=["b", "a:1"])
+        self.mock_sendto.assert_called_with(b"event:-2|c|@0.5|#a:1,b", ("127.0.0.2", 8125))
+        tags = TagSet(["a"])
+        client.timing("query", 3, tags=tags)
+        self.mock_sendto.assert_called_with(b"query:3|ms|#a", ("127.0.0.2", 8125))
+        client.gauge("memory", 10, tags=tags)
+        self.mock_sendto.assert_called_with(b"memory:10|g|#a", ("127.0.0.2", 8125))
+        client.gauge_delta("memory", -1, tags=tags)
+        self.mock_sendto.assert_called_with(b"memory:-1|g|#a", ("127.0.0.2", 8125))
+        client.set("users", "first", tags=tags)
+        self.mock_sendto.assert_called_with(b"users:first|s|#a", ("127.0.0.2", 8125))
+        client.timing_since("query", time() - 1, tags=tags)
+        self.assertTrue(self.mock_sendto.call_args[0][0].endswith(b"|ms|#a"))
+        client.increment("event")
+        self.mock_sendto.assert_called_with(b"event:1|c", ("127.0.0.2", 8125))
+
+    def test_constant_tags(self):
+        client = Client("localhost")
+        client._socket = self.mock_socket
+        self.assertEqual(len(client.tags), 0)
+        client.tags = {"env": "prod"}
+        self.assertIsInstance(client.tags, TagSet)
+        self.assertEqual(client.tags.tags, ("env:prod",))
+        client.increment("event")
+        self.mock_sendto.assert_called_with(b"event:1|c|#env:prod", ("127.0.0.2", 8125))
+        tags = TagSet({"region": "eu"})
+        client.increment("event", tags=tags)
+        self.mock_sendto.assert_called_with(b"event:1|c|#env:prod,region:eu", ("127.0.0.2", 8125))
+        self.assertIs(client._tag_set(tags), client._tag_set(tags))
+        client.tags = None
+        client.increment("event", tags=tags)
+        self.mock_sendto.assert_called_with(b"event:1|c|#region:eu", ("127.0.0.2", 8125))
+
+    def test_batch_client_shares_constant_tags(self):
+        client = Client("localhost")
+        client.tags = ["env:prod"]
+        batch_client = client.batch_client()
+        self.assertIs(batch_client.tags, client.tags)
+        self.assertIs(batch_client.unit_client().tags, client.tags)
+
     def test_increment(self):
         client = Client("localhost")
         client._socket = self.mock_socket
@@ -309,8 +430,8 @@ class TestClient(ClientTestCaseMixIn, BaseTestCase):
             self.assertEqual(client.host, batch_client.host)
             self.assertEqual(client.port, batch_client.port)
             self.assertEqual(
-                client._remote_address,
-                batch_client._remote_address
+                client._resolver,
+                batch_client._resolver
             )
             self.assertEqual(
                 client._socket,
@@ -604,6 +725,20 @@ class TestBatchClient(BatchClientTestCaseMixIn, BaseTestCase):
         client.flush()
         self.assertEqual(self.mock_sendto.call_count, 0)
 
+    def test_batches_not_sent_are_kept_when_flush_fails(self):
+        client = BatchClient("localhost", batch_size=10)
+        client._socket = self.mock_socket
+        client.increment("first")
+        client.increment("second")
+        client.increment("third")
+        self.mock_sendto.side_effect = [None, socket.error("network is down")]
+        self.assertRaises(socket.error, client.flush)
+        self.assertEqual(self.mock_sendto.call_count, 2)
+        self.assertEqual(
+            list(client._batches),
+            [bytearray(b"second:1|c\n"), bytearray(b"third:1|c\n")]
+        )
+
     def test_create_unit_client(self):
         batch_client = BatchClient("localhost")
         batch_client._socket = self.mock_socket
@@ -612,8 +747,8 @@ class TestBatchClient(BatchClientTestCaseMixIn, BaseTestCase):
         self.assertEqual(batch_client.host, client.host)
         self.assertEqual(batch_client.port, client.port)
         self.assertEqual(
-            batch_client._remote_address,
-            client._remote_address
+            batch_client._resolver,
+            client._resolver
         )
         self.assertEqual(
             batch_client._socket,
@@ -664,5 +799,66 @@ class TestBatchClient(BatchClientTestCaseMixIn, BaseTestCase):
         request = request_args[0]
         self.assertRegex(request.decode(), "something:[1-9]\d{0,3}\|ms")
 
+
+class TestThreadSafeBatchClient(BatchClientTestCaseMixIn, BaseTestCase):
+
+    def setUp(self):
+        super(TestThreadSafeBatchClient, self).setUp()
+        self.clientClass = ThreadSafeBatchClient
+
+    def test_metrics_partitioned_into_batches(self):
+        client = ThreadSafeBatchClient("localhost", batch_size=20)
+        client._socket = self.mock_socket
+        client.increment("fit.a.batch.123")
+        client.timing("_", 1)
+        client.decrement("12")
+        client.set("ab", 'z')
+        client.flush()
+        expected_calls = [
+                mock.call(bytearray("fit.a.batch.123:1|c\n".encode()), ("127.0.0.2", 8125)),
+                mock.call(bytearray("_:1|ms\n12:-1|c\n".encode()), ("127.0.0.2", 8125)),
+                mock.call(bytearray("ab:z|s\n".encode()), ("127.0.0.2", 8125)),
+        ]
+        self.assertEqual(self.mock_sendto.mock_calls, expected_calls)
+
+    def test_clear(self):
+        client = ThreadSafeBatchClient("localhost")
+        client._socket = self.mock_socket
+        client.increment("first")
+        thread = threading.Thread(target=client.increment, args=["second"])
+        thread.start()
+        thread.join()
+        client.clear()
+        client.flush()
+        self.assertEqual(self.mock_sendto.call_count, 0)
+
+    def test_merge_buffers_of_multiple_threads(self):
+        client = ThreadSafeBatchClient("localhost", batch_size=256)
+        client._socket = self.mock_socket
+        start = threading.Event()
+
+        def send_metrics(name):
+            start.wait()
+            for _ in range(500):
+                client.increment(name)
+
+        threads = [threading.Thread(target=send_metrics, args=["event{}".format(index)])
+                   for index in range(4)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        client.flush()
+        for thread in threads:
+            thread.join()
+        client.flush()
+
+        sent = b"".join(bytes(call[0][0]) for call in self.mock_sendto.call_args_list)
+        for index in range(4):
+            self.assertEqual(sent.count("event{}:1|c\n".format(index).encode()), 500)
+        self.assertEqual(len(sent.splitlines()), 2000)
+        self.assertTrue(all(len(call[0][0]) < 256 for call in self.mock_sendto.call_args_list))
+        self.assertEqual(len(client._thread_buffers), 0)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,218 @@
+"""
+tests.test_client_aggregation
+-----------------------------
+unittests for statsdmetrics.client.aggregation module
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import unittest
+
+from statsdmetrics.client import Client, AggregatingBatchClient
+from statsdmetrics.client.aggregation import MetricAggregator
+from statsdmetrics.client.tcp import TCPClient, TCPAggregatingBatchClient
+from . import BaseTestCase, BatchClientTestCaseMixIn
+
+
+class TestMetricAggregator(BaseTestCase):
+
+    def test_counters_are_summed_per_rate(self):
+        aggregator = MetricAggregator()
+        aggregator.increment("event")
+        aggregator.increment("event", 4)
+        aggregator.increment("event", -2)
+        aggregator.increment("event", 3, 0.5)
+        aggregator.increment("event", 1, 0.5)
+        self.assertEqual(len(aggregator), 2)
+        self.assertEqual(
+            list(aggregator.requests()),
+            ["event:3|c", "event:4|c|@0.5"]
+        )
+        self.assertEqual(len(aggregator), 0)
+        self.assertEqual(list(aggregator.requests()), [])
+
+    def test_timer_samples_are_sent_as_multiple_values(self):
+        aggregator = MetricAggregator()
+        aggregator.timing("query", 10)
+        aggregator.timing("query", 12)
+        aggregator.timing("query", 10)
+        aggregator.timing("query", 7, 0.2)
+        self.assertEqual(
+            list(aggregator.requests()),
+            ["query:10|ms:12|ms:10|ms", "query:7|ms|@0.2"]
+        )
+
+    def test_metrics_are_aggregated_per_tags(self):
+        aggregator = MetricAggregator()
+        aggregator.increment("event", tags=("a",))
+        aggregator.increment("event", 2, tags=("a",))
+        aggregator.increment("event", tags=("b",))
+        aggregator.increment("event")
+        aggregator.timing("query", 10, tags=("a:b",))
+        aggregator.timing("query", 12, tags=("a:b",))
+        aggregator.gauge("memory", 10, ("a",))
+        aggregator.gauge_delta("memory", -20, ("a",))
+        aggregator.set("users", "first", ("a",))
+        self.assertEqual(
+            list(aggregator.requests()),
+            ["event:3|c|#a", "event:1|c|#b", "event:1|c", "query:10|ms:12|ms|#a:b",
+             "memory:0|g|#a", "memory:-10|g|#a", "users:first|s|#a"]
+        )
+        for milliseconds in range(10, 14):
+            aggregator.timing("query", milliseconds, tags=("a",))
+        self.assertEqual(
+            list(aggregator.requests(22)),
+            ["query:10|ms:11|ms|#a", "query:12|ms:13|ms|#a"]
+        )
+
+    def test_multiple_value_requests_are_split_by_max_size(self):
+        aggregator = MetricAggregator()
+        for milliseconds in range(10, 16):
+            aggregator.timing("query", milliseconds)
+        self.assertEqual(
+            list(aggregator.requests(20)),
+            ["query:10|ms:11|ms", "query:12|ms:13|ms", "query:14|ms:15|ms"]
+        )
+        aggregator.timing("a.very.long.timer.name", 10)
+        self.assertEqual(
+            list(aggregator.requests(10)),
+            ["a.very.long.timer.name:10|ms"]
+        )
+
+    def test_gauges_keep_last_value_and_apply_deltas(self):
+        aggregator = MetricAggregator()
+        aggregator.gauge("memory", 10)
+        aggregator.gauge("memory", 20)
+        aggregator.gauge_delta("memory", -5)
+        aggregator.gauge_delta("connections", 3)
+        aggregator.gauge_delta("connections", -5)
+        aggregator.gauge_delta("cpu", 5)
+        aggregator.gauge("cpu", 50)
+        aggregator.gauge("disk", 5)
+        aggregator.gauge_delta("disk", -8)
+        self.assertEqual(
+            list(aggregator.requests()),
+            ["memory:15|g", "connections:-2|g", "cpu:50|g", "disk:0|g", "disk:-3|g"]
+        )
+
+    def test_set_members_are_deduplicated(self):
+        aggregator = MetricAggregator()
+        aggregator.set("users", "first")
+        aggregator.set("users", "second")
+        aggregator.set("users", "first")
+        self.assertEqual(list(aggregator.requests()), ["users:first|s:second|s"])
+
+    def test_clear(self):
+        aggregator = MetricAggregator()
+        aggregator.increment("event")
+        aggregator.set("users", "first")
+        aggregator.clear()
+        self.assertEqual(len(aggregator), 0)
+        self.assertEqual(list(aggregator.requests()), [])
+
+
+class TestAggregatingBatchClient(BatchClientTestCaseMixIn, BaseTestCase):
+
+    def setUp(self):
+        super(TestAggregatingBatchClient, self).setUp()
+        self.clientClass = AggregatingBatchClient
+
+    def test_aggregates_metrics_on_flush(self):
+        client = AggregatingBatchClient("localhost", prefix="pre.")
+        client._socket = self.mock_socket
+        for _ in range(100):
+            client.increment("event")
+        client.decrement("event", 10)
+        client.increment("low.rate", rate=0.1)
+        client.timing("query", 10.5)
+        client.timing("query", 12)
+        client.gauge("memory", 2048)
+        client.gauge_delta("memory", -1024)
+        client.set("user", "first")
+        client.set("user", 10)
+        client.set("user", "first")
+        self.assertEqual(self.mock_sendto.call_count, 0)
+        client.flush()
+        self.mock_sendto.assert_called_once_with(
+            bytearray(
+                "pre.event:90|c\npre.query:10|ms:12|ms\npre.memory:1024|g\npre.user:first|s:10|s\n".encode()
+            ),
+            ("127.0.0.2", 8125)
+        )
+        self.mock_sendto.reset_mock()
+        client.flush()
+        self.assertEqual(self.mock_sendto.call_count, 0)
+
+    def test_aggregates_metrics_per_tags(self):
+        client = AggregatingBatchClient("localhost")
+        client._socket = self.mock_socket
+        client.tags = {"env": "prod"}
+        client.increment("event")
+        client.increment("event", tags=["a"])
+        client.increment("event", tags=["a"])
+        client.timing("query", 10)
+        client.timing("query", 12)
+        client.gauge("memory", 10, tags={"host": "a"})
+        client.gauge_delta("memory", 2, tags={"host": "a"})
+        client.set("user", "first", tags=["a"])
+        client.decrement("event")
+        client.flush()
+        self.mock_sendto.assert_called_once_with(
+            bytearray(
+                "event:0|c|#env:prod\nevent:2|c|#a,env:prod\nquery:10|ms:12|ms|#env:prod\n"
+                "memory:12|g|#env:prod,host:a\nuser:first|s|#a,env:prod\n".encode()
+            ),
+            ("127.0.0.2", 8125)
+        )
+
+    def test_validates_metric_values(self):
+        client = AggregatingBatchClient("localhost")
+        self.assertRaises(AssertionError, client.timing, "negative", -1)
+        self.assertRaises(AssertionError, client.gauge, "negative", -5)
+
+    def test_clear(self):
+        client = AggregatingBatchClient("localhost")
+        client._socket = self.mock_socket
+        client.increment("event")
+        client.timing("query", 2)
+        client.clear()
+        client.flush()
+        self.assertEqual(self.mock_sendto.call_count, 0)
+
+    def test_context_manager_flushes_aggregated_metrics(self):
+        client = Client("localhost")
+        client._socket = self.mock_socket
+        with client.batch_client(aggregate=True) as batch_client:
+            self.assertIsInstance(batch_client, AggregatingBatchClient)
+            batch_client.increment("event")
+            batch_client.increment("event")
+        self.mock_sendto.assert_called_once_with(
+            bytearray("event:2|c\n".encode()),
+            ("127.0.0.2", 8125)
+        )
+
+
+class TestTCPAggregatingBatchClient(BatchClientTestCaseMixIn, BaseTestCase):
+
+    def setUp(self):
+        super(TestTCPAggregatingBatchClient, self).setUp()
+        self.clientClass = TCPAggregatingBatchClient
+
+    def test_aggregates_metrics_on_flush(self):
+        client = TCPClient("localhost").batch_client(aggregate=True)
+        self.assertIsInstance(client, TCPAggregatingBatchClient)
+        client._socket = self.mock_socket
+        client.increment("event", 2)
+        client.increment("event", 3)
+        client.timing("query", 4)
+        client.timing("query", 5)
+        client.flush()
+        self.mock_sendall.assert_called_once_with(
+            bytearray("event:5|c\nquery:4|ms:5|ms\n".encode())
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,224 @@
+"""
+tests.test_client_aio
+---------------------
+unittests for statsdmetrics.client.aio module
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import sys
+import socket
+import unittest
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+from . import BaseTestCase
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from statsdmetrics.client.aio import (AsyncClient, AsyncBatchClient,
+                                          AsyncTCPClient, AsyncTCPBatchClient)
+
+requires_asyncio = unittest.skipIf(
+    sys.version_info < (3, 7), "asyncio clients are tested on Python 3.7+")
+
+
+class UDPReceiver(object):
+    def __init__(self):
+        self.requests = []
+
+    def connection_made(self, transport):
+        pass
+
+    def datagram_received(self, data, address):
+        self.requests.append(data)
+
+    def error_received(self, exc):
+        pass
+
+    def connection_lost(self, exc):
+        pass
+
+
+async def wait_for(condition, timeout=2):
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + timeout
+    while not condition() and loop.time() < deadline:
+        await asyncio.sleep(0.005)
+
+
+@requires_asyncio
+class TestAsyncClient(BaseTestCase):
+
+    async def start_server(self):
+        loop = asyncio.get_event_loop()
+        receiver = UDPReceiver()
+        transport, _ = await loop.create_datagram_endpoint(
+            lambda: receiver, local_addr=("127.0.0.1", 0))
+        return transport, receiver
+
+    def test_init_and_properties(self):
+        client = AsyncClient("127.0.0.1", 8111, "region", max_buffer_size=1024)
+        self.assertEqual(client.host, "127.0.0.1")
+        self.assertEqual(client.port, 8111)
+        self.assertEqual(client.prefix, "region")
+        self.assertEqual(client.max_buffer_size, 1024)
+        self.assertEqual(client.dropped, 0)
+        self.assertFalse(client.connected)
+        self.assertRaises(AssertionError, AsyncClient, "localhost", max_buffer_size=0)
+
+    def test_send_metrics(self):
+        async def run():
+            transport, receiver = await self.start_server()
+            port = transport.get_extra_info("sockname")[1]
+            async with AsyncClient("127.0.0.1", port, "pre.") as client:
+                self.assertTrue(client.connected)
+                client.increment("event")
+                client.timing("query", 10, 0.9)
+                client.gauge_delta("memory", -128)
+                await wait_for(lambda: len(receiver.requests) >= 3)
+            self.assertFalse(client.connected)
+            transport.close()
+            return receiver.requests
+
+        with mock.patch("statsdmetrics.client.random", return_value=0.3):
+            requests = asyncio.run(run())
+        self.assertEqual(
+            requests,
+            [b"pre.event:1|c", b"pre.query:10|ms|@0.9", b"pre.memory:-128|g"]
+        )
+
+    def test_metrics_are_pending_until_connected(self):
+        async def run():
+            transport, receiver = await self.start_server()
+            port = transport.get_extra_info("sockname")[1]
+            client = AsyncClient("127.0.0.1", port)
+            client.increment("event")
+            client.increment("second")
+            self.assertFalse(client.connected)
+            await wait_for(lambda: len(receiver.requests) >= 2)
+            self.assertTrue(client.connected)
+            client.close()
+            transport.close()
+            return receiver.requests
+
+        self.assertEqual(asyncio.run(run()), [b"event:1|c", b"second:1|c"])
+
+    def test_drop_metrics_when_buffer_is_full(self):
+        async def run():
+            client = AsyncClient("127.0.0.1", 8125, max_buffer_size=20)
+            client.increment("event")
+            client.increment("second.event")
+            client.increment("third.event")
+            dropped = client.dropped
+            client.close()
+            return dropped
+
+        self.assertEqual(asyncio.run(run()), 2)
+
+    def test_batch_client_flush(self):
+        async def run():
+            transport, receiver = await self.start_server()
+            port = transport.get_extra_info("sockname")[1]
+            client = AsyncClient("127.0.0.1", port)
+            async with client.batch_client(32) as batch_client:
+                self.assertIsInstance(batch_client, AsyncBatchClient)
+                self.assertIs(batch_client.name_cache, client.name_cache)
+                batch_client.increment("event")
+                batch_client.timing("query", 3)
+                batch_client.decrement("larger.than.the.batch")
+                self.assertEqual(receiver.requests, [])
+            self.assertTrue(client.connected)
+            self.assertIsInstance(batch_client.unit_client(), AsyncClient)
+            await wait_for(lambda: len(receiver.requests) >= 2)
+            client.close()
+            transport.close()
+            return receiver.requests
+
+        self.assertEqual(
+            asyncio.run(run()),
+            [b"event:1|c\nquery:3|ms\n", b"larger.than.the.batch:-1|c\n"]
+        )
+
+    def test_batch_client_does_not_flush_in_background(self):
+        client = AsyncBatchClient("localhost")
+        self.assertRaises(NotImplementedError, client.start_background_flush)
+
+    def test_batch_client_can_not_be_used_with_sync_with(self):
+        client = AsyncBatchClient("localhost")
+        client.increment("event")
+        with self.assertRaises(TypeError):
+            with client:
+                pass  # pragma: no cover
+        self.assertEqual(len(client._batches), 1)
+
+
+@requires_asyncio
+class TestAsyncTCPClient(BaseTestCase):
+
+    async def start_server(self):
+        received = bytearray()
+
+        async def handle(reader, writer):
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                received.extend(data)
+            writer.close()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0)
+        return server, received
+
+    def test_send_metrics(self):
+        async def run():
+            server, received = await self.start_server()
+            port = server.sockets[0].getsockname()[1]
+            async with AsyncTCPClient("127.0.0.1", port) as client:
+                client.increment("event")
+                client.set("user", "first")
+                await wait_for(lambda: len(received) >= 22)
+            server.close()
+            await server.wait_closed()
+            return bytes(received)
+
+        self.assertEqual(asyncio.run(run()), b"event:1|c\nuser:first|s\n")
+
+    def test_batch_client_flush(self):
+        async def run():
+            server, received = await self.start_server()
+            port = server.sockets[0].getsockname()[1]
+            client = AsyncTCPBatchClient("127.0.0.1", port, batch_size=16)
+            client.increment("event")
+            client.timing("query", 3)
+            self.assertFalse(client.connected)
+            await client.flush()
+            await wait_for(lambda: len(received) >= 22)
+            self.assertIsInstance(client.unit_client(), AsyncTCPClient)
+            client.close()
+            server.close()
+            await server.wait_closed()
+            return bytes(received)
+
+        self.assertEqual(asyncio.run(run()), b"event:1|c\nquery:3|ms\n")
+
+    def test_connection_errors_are_raised_on_connect(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        sock.close()
+
+        async def run():
+            client = AsyncTCPClient("127.0.0.1", port)
+            await client.connect()
+
+        self.assertRaises(OSError, asyncio.run, run())
+
+
+if __name__ == "__main__":
+    unittest.main()
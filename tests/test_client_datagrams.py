@@ -0,0 +1,109 @@
+"""
+tests.test_client_datagrams
+---------------------------
+unittests for statsdmetrics.client.datagrams module
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import socket
+import unittest
+
+from statsdmetrics.client import BatchClient
+from statsdmetrics.client import datagrams
+from statsdmetrics.client.datagrams import sendmmsg, supports_sendmmsg, sendmmsg_available
+from . import BaseTestCase, mock
+
+requires_sendmmsg = unittest.skipUnless(sendmmsg_available, "sendmmsg is not available")
+
+
+class TestSendmmsg(BaseTestCase):
+
+    def setUp(self):
+        self.receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.receiver.bind(("127.0.0.1", 0))
+        self.receiver.settimeout(2)
+        self.sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(self.receiver.close)
+        self.addCleanup(self.sender.close)
+
+    def receive(self, count):
+        return [self.receiver.recv(65536) for _ in range(count)]
+
+    def test_supports_sendmmsg(self):
+        self.assertEqual(sendmmsg_available, supports_sendmmsg(self.sender))
+        self.assertFalse(supports_sendmmsg(mock.MagicMock()))
+        tcp_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.addCleanup(tcp_socket.close)
+        self.assertFalse(supports_sendmmsg(tcp_socket))
+
+    @requires_sendmmsg
+    def test_send_datagrams(self):
+        payloads = [b"event:1|c\n", bytearray(b"query:10|ms\nquery:12|ms\n"), b"users:first|s"]
+        sent = sendmmsg(self.sender, payloads, self.receiver.getsockname())
+        self.assertEqual(sent, 3)
+        self.assertEqual(self.receive(3), [bytes(datagram) for datagram in payloads])
+        self.assertEqual(sendmmsg(self.sender, [], self.receiver.getsockname()), 0)
+
+    @requires_sendmmsg
+    def test_send_datagrams_in_multiple_calls(self):
+        payloads = ["event.{}:1|c".format(index).encode() for index in range(5)]
+        with mock.patch.object(datagrams, "MAX_MESSAGES", 2):
+            sent = sendmmsg(self.sender, payloads, self.receiver.getsockname())
+        self.assertEqual(sent, 5)
+        self.assertEqual(self.receive(5), payloads)
+
+    @requires_sendmmsg
+    def test_send_datagrams_over_ipv6(self):
+        try:
+            receiver = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+            receiver.bind(("::1", 0))
+        except (socket.error, OSError):
+            self.skipTest("IPv6 loopback is not available")
+        self.addCleanup(receiver.close)
+        receiver.settimeout(2)
+        sender = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+        self.addCleanup(sender.close)
+        self.assertEqual(sendmmsg(sender, [b"event:1|c", b"event:2|c"], receiver.getsockname()), 2)
+        self.assertEqual([receiver.recv(100), receiver.recv(100)], [b"event:1|c", b"event:2|c"])
+
+    @requires_sendmmsg
+    def test_errors_are_raised_when_nothing_is_sent(self):
+        self.assertRaises(socket.error, sendmmsg, self.sender, [b"x" * 70000], self.receiver.getsockname())
+
+    def test_raises_not_implemented_error_when_not_available(self):
+        with mock.patch.object(datagrams, "sendmmsg_available", False):
+            self.assertFalse(supports_sendmmsg(self.sender))
+            self.assertRaises(NotImplementedError, sendmmsg, self.sender, [b"x"], ("127.0.0.1", 8125))
+
+    @requires_sendmmsg
+    def test_batch_client_flushes_with_sendmmsg(self):
+        client = BatchClient("127.0.0.1", self.receiver.getsockname()[1], batch_size=30)
+        for index in range(4):
+            client.increment("event.{}".format(index))
+        with mock.patch("statsdmetrics.client.sendmmsg", wraps=sendmmsg) as mock_sendmmsg:
+            client.flush()
+        self.assertEqual(mock_sendmmsg.call_count, 1)
+        self.assertEqual(len(client._batches), 0)
+        self.assertEqual(
+            self.receive(2),
+            [b"event.0:1|c\nevent.1:1|c\n", b"event.2:1|c\nevent.3:1|c\n"]
+        )
+
+    def test_batch_client_falls_back_to_sendto(self):
+        client = BatchClient("127.0.0.1", self.receiver.getsockname()[1], batch_size=30)
+        for index in range(4):
+            client.increment("event.{}".format(index))
+        with mock.patch.object(datagrams, "sendmmsg_available", False):
+            client.flush()
+        self.assertEqual(len(client._batches), 0)
+        self.assertEqual(
+            self.receive(2),
+            [b"event.0:1|c\nevent.1:1|c\n", b"event.2:1|c\nevent.3:1|c\n"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+"""
+tests.test_client_encoding
+--------------------------
+unittests for statsdmetrics.client.encoding module
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import unittest
+
+from statsdmetrics import Counter, Timer, Gauge, GaugeDelta, Set
+from statsdmetrics.client.encoding import (encode_sample_rate, encode_counter, encode_timer,
+                                           encode_gauge, encode_gauge_delta, encode_set,
+                                           encode_tags, TagSet, create_tag_set)
+from . import BaseTestCase
+
+SAMPLE_RATES = (1, 0.5, 0.25, 0.001, 0.9)
+
+
+class TestEncoding(BaseTestCase):
+
+    def test_encode_sample_rate(self):
+        self.assertEqual(encode_sample_rate(1), b"")
+        self.assertEqual(encode_sample_rate(1.0), b"")
+        self.assertEqual(encode_sample_rate(0.5), b"|@0.5")
+        self.assertEqual(encode_sample_rate(0.125), b"|@0.125")
+
+    def test_encode_counter(self):
+        for count in (0, 1, -1, 10, -250):
+            for rate in SAMPLE_RATES:
+                self.assertEqual(
+                    encode_counter(b"event.name", count, rate),
+                    Counter("event.name", count, rate).to_request().encode()
+                )
+
+    def test_encode_timer(self):
+        for milliseconds in (0, 1, 10, 3600):
+            for rate in SAMPLE_RATES:
+                self.assertEqual(
+                    encode_timer(b"query", milliseconds, rate),
+                    Timer("query", milliseconds, rate).to_request().encode()
+                )
+
+    def test_encode_gauge(self):
+        for value in (0, 1, 102400, 0.5, 12.75):
+            for rate in SAMPLE_RATES:
+                self.assertEqual(
+                    encode_gauge(b"memory", value, rate),
+                    Gauge("memory", value, rate).to_request().encode()
+                )
+
+    def test_encode_gauge_of_float_subclass_as_float(self):
+        class Float(float):
+            def __repr__(self):
+                return "Float({})".format(float(self))
+
+            __str__ = __repr__
+
+        self.assertEqual(encode_gauge(b"cpu", Float(1.5)), b"cpu:1.5|g")
+        self.assertEqual(encode_gauge_delta(b"cpu", Float(-1.5)), b"cpu:-1.5|g")
+
+    def test_encode_gauge_delta(self):
+        for delta in (0, 1, -1, 256, -128, 0.5, -2.25):
+            for rate in SAMPLE_RATES:
+                self.assertEqual(
+                    encode_gauge_delta(b"memory", delta, rate),
+                    GaugeDelta("memory", delta, rate).to_request().encode()
+                )
+
+    def test_encode_set(self):
+        for value in ("first", "127.0.0.1", "12"):
+            for rate in SAMPLE_RATES:
+                self.assertEqual(
+                    encode_set(b"ip", value, rate),
+                    Set("ip", value, rate).to_request().encode()
+                )
+
+
+class TestTagSet(BaseTestCase):
+
+    def test_encode_tags(self):
+        self.assertEqual(encode_tags(()), b"")
+        self.assertEqual(encode_tags(("a:b",)), b"|#a:b")
+        self.assertEqual(encode_tags(("a:b", "c")), b"|#a:b,c")
+
+    def test_tag_set_is_normalized_and_encoded(self):
+        tags = TagSet({"region": "eu", "canary": None, "bad|name": "x,y"})
+        self.assertEqual(tags.tags, ("bad_name:x_y", "canary", "region:eu"))
+        self.assertEqual(tags.encoded, b"|#bad_name:x_y,canary,region:eu")
+        self.assertEqual(len(tags), 3)
+        self.assertEqual(list(tags), ["bad_name:x_y", "canary", "region:eu"])
+        self.assertEqual(TagSet().encoded, b"")
+        self.assertEqual(len(TagSet()), 0)
+        self.assertEqual(
+            Counter("event", 1, 0.5, tags.tags).to_request().encode(),
+            encode_counter(b"event", 1, 0.5) + tags.encoded
+        )
+
+    def test_tag_set_union(self):
+        tags = TagSet(["b", "a"])
+        empty = TagSet()
+        self.assertIs(tags.union(empty), tags)
+        self.assertIs(empty.union(tags), tags)
+        self.assertEqual(tags.union(TagSet(["c", "a"])).tags, ("a", "b", "c"))
+
+    def test_create_tag_set_is_cached(self):
+        tags = TagSet(["a"])
+        self.assertIs(create_tag_set(tags), tags)
+        self.assertIs(create_tag_set({"env": "prod"}), create_tag_set({"env": "prod"}))
+        self.assertIs(create_tag_set(("a", "b")), create_tag_set(("a", "b")))
+        self.assertIs(create_tag_set(["a", "b"]), create_tag_set(("a", "b")))
+        self.assertEqual(create_tag_set("a:b").tags, ("a:b",))
+        self.assertEqual(create_tag_set(tag for tag in ["b", "a"]).tags, ("a", "b"))
+        self.assertEqual(create_tag_set({"env": ["x"]}).tags, ("env:['x']",))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,243 @@
+"""
+tests.test_client_flusher
+-------------------------
+unittests for statsdmetrics.client.flusher module
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import unittest
+import threading
+from time import time, sleep
+
+from statsdmetrics.client import (BatchClient, AggregatingBatchClient, ThreadSafeBatchClient,
+                                  DROP_NEWEST, DROP_OLDEST)
+from statsdmetrics.client.flusher import BackgroundFlusher
+from statsdmetrics.client.tcp import TCPBatchClient
+from . import BaseTestCase, MockMixIn
+
+
+class TestBackgroundFlusher(MockMixIn, BaseTestCase):
+
+    def setUp(self):
+        self.doMock()
+
+    def create_client(self, client_class=BatchClient, **kwargs):
+        client = client_class("localhost", **kwargs)
+        client._socket = self.mock_socket
+        self.addCleanup(client.stop_background_flush, False)
+        return client
+
+    def wait_for_calls(self, mock_method, count, timeout=2):
+        deadline = time() + timeout
+        while mock_method.call_count < count and time() < deadline:
+            sleep(0.005)
+
+    def test_init_and_properties(self):
+        client = self.create_client(batch_size=100)
+        flusher = BackgroundFlusher(client)
+        self.assertGreater(flusher.interval, 0)
+        self.assertEqual(flusher.threshold, 800)
+        self.assertGreater(flusher.queue_size, 0)
+        self.assertEqual(flusher.drop_policy, DROP_NEWEST)
+        self.assertEqual(flusher.dropped, 0)
+        self.assertEqual(flusher.errors, 0)
+        self.assertFalse(flusher.running)
+
+        flusher = BackgroundFlusher(client, 20, 2048, 10, DROP_OLDEST)
+        self.assertEqual(flusher.interval, 20)
+        self.assertEqual(flusher.threshold, 2048)
+        self.assertEqual(flusher.queue_size, 10)
+        self.assertEqual(flusher.drop_policy, DROP_OLDEST)
+
+    def test_invalid_settings(self):
+        client = self.create_client()
+        self.assertRaises(AssertionError, BackgroundFlusher, client, 0)
+        self.assertRaises(AssertionError, BackgroundFlusher, client, threshold=-1)
+        self.assertRaises(AssertionError, BackgroundFlusher, client, queue_size=0)
+        self.assertRaises(AssertionError, BackgroundFlusher, client, drop_policy="all")
+
+    def test_flush_periodically(self):
+        client = self.create_client()
+        client.start_background_flush(interval=10)
+        self.assertTrue(client.background_flusher.running)
+        client.increment("event")
+        client.timing("query", 2)
+        self.wait_for_calls(self.mock_sendto, 1)
+        self.mock_sendto.assert_called_once_with(
+            bytearray("event:1|c\nquery:2|ms\n".encode()),
+            ("127.0.0.2", 8125)
+        )
+
+    def test_flush_when_threshold_reached(self):
+        client = self.create_client()
+        client.start_background_flush(interval=60000, threshold=20)
+        client.increment("event")
+        self.assertEqual(self.mock_sendto.call_count, 0)
+        client.increment("second.event")
+        self.wait_for_calls(self.mock_sendto, 1)
+        self.mock_sendto.assert_called_once_with(
+            bytearray("event:1|c\nsecond.event:1|c\n".encode()),
+            ("127.0.0.2", 8125)
+        )
+
+    def test_flush_waits_for_background_flush(self):
+        client = self.create_client(TCPBatchClient)
+        client.start_background_flush(interval=60000)
+        client.increment("event")
+        self.assertEqual(self.mock_sendall.call_count, 0)
+        client.flush()
+        self.mock_sendall.assert_called_once_with(bytearray("event:1|c\n".encode()))
+
+    def test_flush_aggregating_client(self):
+        client = self.create_client(AggregatingBatchClient)
+        client.start_background_flush(interval=60000)
+        client.increment("event")
+        client.increment("event")
+        with client:
+            client.timing("query", 2)
+        self.mock_sendto.assert_called_once_with(
+            bytearray("event:2|c\nquery:2|ms\n".encode()),
+            ("127.0.0.2", 8125)
+        )
+
+    def test_drop_newest_when_queue_is_full(self):
+        client = self.create_client()
+        client.start_background_flush(interval=60000, queue_size=2)
+        client.increment("first")
+        client.increment("second")
+        client.increment("third")
+        self.assertEqual(client.background_flusher.dropped, 1)
+        client.flush()
+        self.mock_sendto.assert_called_once_with(
+            bytearray("first:1|c\nsecond:1|c\n".encode()),
+            ("127.0.0.2", 8125)
+        )
+
+    def test_drop_oldest_when_queue_is_full(self):
+        client = self.create_client()
+        client.start_background_flush(interval=60000, queue_size=2, drop_policy=DROP_OLDEST)
+        client.increment("first")
+        client.increment("second")
+        client.increment("third")
+        self.assertEqual(client.background_flusher.dropped, 1)
+        client.flush()
+        self.mock_sendto.assert_called_once_with(
+            bytearray("second:1|c\nthird:1|c\n".encode()),
+            ("127.0.0.2", 8125)
+        )
+
+    def test_clear(self):
+        client = self.create_client()
+        client.start_background_flush(interval=60000)
+        client.increment("event")
+        client.clear()
+        client.flush()
+        self.assertEqual(self.mock_sendto.call_count, 0)
+
+    def test_stop_flushes_queued_metrics(self):
+        client = self.create_client()
+        client.start_background_flush(interval=60000)
+        flusher = client.background_flusher
+        client.increment("event")
+        client.stop_background_flush()
+        self.assertFalse(flusher.running)
+        self.assertIsNone(client.background_flusher)
+        self.mock_sendto.assert_called_once_with(
+            bytearray("event:1|c\n".encode()),
+            ("127.0.0.2", 8125)
+        )
+        self.mock_sendto.reset_mock()
+        client.increment("event")
+        self.assertEqual(self.mock_sendto.call_count, 0)
+        client.flush()
+        self.assertEqual(self.mock_sendto.call_count, 1)
+
+    def test_stop_without_flush_drops_queued_metrics(self):
+        client = self.create_client()
+        client.start_background_flush(interval=60000)
+        client.increment("event")
+        client.stop_background_flush(flush=False)
+        self.assertEqual(self.mock_sendto.call_count, 0)
+
+    def test_flush_errors_are_counted(self):
+        client = self.create_client()
+        client.start_background_flush(interval=60000)
+        self.mock_sendto.side_effect = OSError("mock error")
+        client.increment("event")
+        client.flush()
+        self.assertEqual(client.background_flusher.errors, 1)
+        self.assertTrue(client.background_flusher.running)
+        self.assertEqual(len(client._batches), 0)
+
+    def test_unexpected_flush_errors_do_not_stop_the_thread(self):
+        client = self.create_client()
+        client.start_background_flush(interval=60000)
+        self.mock_sendto.side_effect = ValueError("mock error")
+        client.increment("event")
+        client.flush()
+        self.assertEqual(client.background_flusher.errors, 1)
+        self.assertTrue(client.background_flusher.running)
+
+        self.mock_sendto.side_effect = None
+        client.increment("second.event")
+        client.flush()
+        self.mock_sendto.assert_called_with(bytearray(b"second.event:1|c\n"), ("127.0.0.2", 8125))
+
+    def test_buffer_and_flush_directly_when_flusher_is_not_running(self):
+        client = self.create_client()
+        client.start_background_flush(interval=60000)
+        flusher = client.background_flusher
+        # stop the thread without detaching the flusher from the client
+        flusher.stop()
+        flusher.enqueue(b"left.in.queue:1|c")
+        self.assertFalse(flusher.running)
+
+        client.increment("event")
+        self.assertEqual(len(client._batches), 1)
+        client.flush()
+        self.mock_sendto.assert_called_once_with(
+            bytearray(b"event:1|c\nleft.in.queue:1|c\n"), ("127.0.0.2", 8125))
+
+    def test_thread_safe_client_enqueues_to_flusher(self):
+        client = self.create_client(ThreadSafeBatchClient)
+        client.start_background_flush(interval=60000, threshold=10000, queue_size=2)
+        for _ in range(100):
+            client.increment("event")
+        self.assertEqual(client.background_flusher.dropped, 98)
+        client.flush()
+        self.mock_sendto.assert_called_once_with(
+            bytearray(b"event:1|c\nevent:1|c\n"), ("127.0.0.2", 8125))
+
+    def test_thread_safe_client_flushes_when_threshold_reached(self):
+        client = self.create_client(ThreadSafeBatchClient)
+        client.start_background_flush(interval=60000, threshold=20)
+        client.increment("event")
+        client.increment("second.event")
+        self.wait_for_calls(self.mock_sendto, 1)
+        self.mock_sendto.assert_called_once_with(
+            bytearray(b"event:1|c\nsecond.event:1|c\n"), ("127.0.0.2", 8125))
+
+    def test_enqueue_from_multiple_threads(self):
+        client = self.create_client(TCPBatchClient, batch_size=64)
+        client.start_background_flush(interval=5, threshold=128)
+
+        def send_metrics():
+            for _ in range(200):
+                client.increment("event")
+
+        threads = [threading.Thread(target=send_metrics) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        client.flush()
+
+        sent = b"".join(bytes(call[0][0]) for call in self.mock_sendall.call_args_list)
+        self.assertEqual(sent.count(b"event:1|c\n"), 800)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+"""
+tests.test_client_handles
+-------------------------
+unittests for statsdmetrics.client.handles module
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import unittest
+
+from statsdmetrics.client import Client, BatchClient, AggregatingBatchClient
+from statsdmetrics.client.tcp import TCPClient
+from statsdmetrics.client.sampling import CountingSampler
+from statsdmetrics.client.handles import CounterHandle, TimerHandle, GaugeHandle, SetHandle
+from . import BaseTestCase, MockMixIn
+
+
+class TestMetricHandles(MockMixIn, BaseTestCase):
+
+    def setUp(self):
+        self.doMock()
+        self.client = Client("localhost", prefix="region.")
+        self.client._socket = self.mock_socket
+
+    def requests(self):
+        return [call[0][0] for call in self.mock_sendto.call_args_list]
+
+    def test_handle_properties(self):
+        handle = self.client.counter_handle("api requests")
+        self.assertIsInstance(handle, CounterHandle)
+        self.assertIs(handle.client, self.client)
+        self.assertEqual(handle.name, "api requests")
+        self.assertEqual(handle.metric_name, "region.api_requests")
+        self.assertIsInstance(self.client.timer_handle("query"), TimerHandle)
+        self.assertIsInstance(self.client.gauge_handle("memory"), GaugeHandle)
+        self.assertIsInstance(self.client.set_handle("users"), SetHandle)
+
+    def test_counter_handle(self):
+        handle = self.client.counter_handle("api.requests")
+        handle.inc()
+        handle.inc(3)
+        handle.dec()
+        handle.dec(2, 0.5)
+        handle.inc(rate=0.2)
+        self.assertEqual(self.requests(), [
+            b"region.api.requests:1|c",
+            b"region.api.requests:3|c",
+            b"region.api.requests:-1|c",
+            b"region.api.requests:-2|c|@0.5",
+        ])
+
+    def test_timer_handle(self):
+        handle = self.client.timer_handle("db.query")
+        handle.timing(12)
+        handle.timing(3.8, 0.5)
+        self.assertRaises(AssertionError, handle.timing, -1)
+        self.assertEqual(self.requests(), [b"region.db.query:12|ms", b"region.db.query:3|ms|@0.5"])
+
+    def test_gauge_handle(self):
+        handle = self.client.gauge_handle("memory")
+        handle.set(1024)
+        handle.set(10.5, 0.5)
+        handle.delta(-128)
+        handle.delta(2.5)
+        self.assertRaises(AssertionError, handle.set, -1)
+        self.assertEqual(self.requests(), [
+            b"region.memory:1024|g",
+            b"region.memory:10.5|g|@0.5",
+            b"region.memory:-128|g",
+            b"region.memory:+2.5|g",
+        ])
+
+    def test_set_handle(self):
+        handle = self.client.set_handle("users")
+        handle.add("first")
+        handle.add(2)
+        self.assertEqual(self.requests(), [b"region.users:first|s", b"region.users:2|s"])
+
+    def test_handle_requests_are_the_same_as_client_requests(self):
+        self.client.increment("event", 3, 0.5)
+        self.client.timing("query", 10)
+        self.client.gauge("memory", 1.5)
+        self.client.gauge_delta("memory", -3)
+        self.client.set("users", "first")
+        client_requests = self.requests()
+        self.mock_sendto.reset_mock()
+        self.client.counter_handle("event").inc(3, 0.5)
+        self.client.timer_handle("query").timing(10)
+        self.client.gauge_handle("memory").set(1.5)
+        self.client.gauge_handle("memory").delta(-3)
+        self.client.set_handle("users").add("first")
+        self.assertEqual(self.requests(), client_requests)
+
+    def test_handles_with_tags(self):
+        self.client.tags = {"env": "prod"}
+        counter = self.client.counter_handle("api.requests", tags=["a"])
+        self.assertEqual(counter.tags, ("a", "env:prod"))
+        counter.inc()
+        counter.dec(2, 0.5)
+        self.client.timer_handle("query").timing(3)
+        self.client.gauge_handle("memory", {"host": "b"}).delta(-1)
+        self.client.set_handle("users", ["a"]).add("first")
+        self.assertEqual(self.requests(), [
+            b"region.api.requests:1|c|#a,env:prod",
+            b"region.api.requests:-2|c|@0.5|#a,env:prod",
+            b"region.query:3|ms|#env:prod",
+            b"region.memory:-1|g|#env:prod,host:b",
+            b"region.users:first|s|#a,env:prod",
+        ])
+        self.client.increment("api.requests", tags=["a"])
+        self.assertEqual(self.requests()[-1], b"region.api.requests:1|c|#a,env:prod")
+
+    def test_handles_use_the_client_sampler(self):
+        self.client.sampler = CountingSampler()
+        handle = self.client.counter_handle("event")
+        for _ in range(4):
+            handle.inc(rate=0.5)
+        self.assertEqual(self.requests(), [b"region.event:1|c|@0.5", b"region.event:1|c|@0.5"])
+
+    def test_handles_keep_the_prefix_of_creation(self):
+        handle = self.client.counter_handle("event")
+        self.client.prefix = "other."
+        handle.inc()
+        self.assertEqual(self.requests(), [b"region.event:1|c"])
+
+    def test_batch_client_handles(self):
+        client = BatchClient("localhost", batch_size=64)
+        client.counter_handle("event").inc()
+        client.timer_handle("query").timing(3)
+        self.assertEqual(bytes(client._batches[0]), b"event:1|c\nquery:3|ms\n")
+
+    def test_tcp_client_handles(self):
+        client = TCPClient("localhost")
+        client._socket = self.mock_socket
+        client.counter_handle("event").inc(2)
+        self.mock_sendall.assert_called_once_with(b"event:2|c\n")
+
+    def test_aggregating_client_handles_aggregate(self):
+        client = AggregatingBatchClient("localhost")
+        counter = client.counter_handle("event")
+        counter.inc()
+        counter.inc(3)
+        counter.dec()
+        client.timer_handle("query").timing(3)
+        client.timer_handle("query").timing(5)
+        gauge = client.gauge_handle("memory")
+        gauge.set(10)
+        gauge.delta(-2)
+        client.set_handle("users").add("first")
+        self.assertEqual(len(client._batches), 0)
+        requests = sorted(str(request) for request in client._aggregator.requests())
+        self.assertEqual(requests, ["event:3|c", "memory:8|g", "query:3|ms:5|ms", "users:first|s"])
+
+    def test_aggregating_client_handles_aggregate_with_tags(self):
+        client = AggregatingBatchClient("localhost")
+        client.counter_handle("event", ["a"]).inc()
+        client.increment("event", tags=["a"])
+        client.counter_handle("event").inc()
+        self.assertEqual(list(client._aggregator.requests()), ["event:2|c|#a", "event:1|c"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,171 @@
+"""
+tests.test_client_resolver
+--------------------------
+unittests for statsdmetrics.client.resolver module
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import socket
+import unittest
+from time import time, sleep
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+from statsdmetrics.client import Client, BatchClient
+from statsdmetrics.client import resolver
+from statsdmetrics.client.resolver import Resolver, address_family
+from . import BaseTestCase
+
+
+def address_info(*addresses):
+    return [
+        (socket.AF_INET6 if ":" in address[0] else socket.AF_INET, socket.SOCK_DGRAM, 17, "", address)
+        for address in addresses
+    ]
+
+
+def has_ipv6():
+    if not socket.has_ipv6:
+        return False
+    try:
+        sock = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+        sock.bind(("::1", 0))
+        sock.close()
+    except socket.error:
+        return False
+    return True
+
+
+class TestResolver(BaseTestCase):
+
+    def setUp(self):
+        patcher = mock.patch("statsdmetrics.client.resolver.socket.getaddrinfo")
+        self.mock_getaddrinfo = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_getaddrinfo.return_value = address_info(("10.0.0.1", 8125))
+
+        patcher = mock.patch("statsdmetrics.client.resolver.clock")
+        self.mock_clock = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_clock.return_value = 100.0
+
+    def wait_for_refresh(self, resolver_, timeout=2):
+        deadline = time() + timeout
+        while resolver_._refreshing and time() < deadline:
+            sleep(0.005)
+
+    def test_init_and_properties(self):
+        resolver_ = Resolver("stats.example.org", 8125)
+        self.assertEqual(resolver_.host, "stats.example.org")
+        self.assertEqual(resolver_.port, 8125)
+        self.assertEqual(resolver_.ttl, resolver.DEFAULT_TTL)
+        self.assertEqual(resolver_.errors, 0)
+        self.assertEqual(self.mock_getaddrinfo.call_count, 0)
+        self.assertRaises(AssertionError, Resolver, "localhost", 8125, ttl=0)
+        self.assertRaises(AssertionError, Resolver, "localhost", 8125, retry_delay=0)
+
+    def test_address_family(self):
+        self.assertEqual(address_family(("127.0.0.1", 8125)), socket.AF_INET)
+        self.assertEqual(address_family(("::1", 8125, 0, 0)), socket.AF_INET6)
+
+    def test_resolve_once_and_cache_addresses(self):
+        resolver_ = Resolver("stats.example.org", 8125)
+        self.assertEqual(resolver_.address(), ("10.0.0.1", 8125))
+        self.assertEqual(resolver_.address(), ("10.0.0.1", 8125))
+        self.assertEqual(resolver_.addresses, [("10.0.0.1", 8125)])
+        self.mock_getaddrinfo.assert_called_once_with(
+            "stats.example.org", 8125, socket.AF_UNSPEC, socket.SOCK_DGRAM)
+
+    def test_resolve_errors_are_raised_before_first_resolution(self):
+        self.mock_getaddrinfo.side_effect = socket.gaierror("mock error")
+        resolver_ = Resolver("stats.example.org", 8125)
+        self.assertRaises(socket.gaierror, resolver_.address)
+
+    def test_rotate_addresses(self):
+        self.mock_getaddrinfo.return_value = address_info(
+            ("10.0.0.1", 8125), ("10.0.0.2", 8125), ("10.0.0.1", 8125), ("10.0.0.3", 8125))
+        resolver_ = Resolver("stats.example.org", 8125)
+        addresses = [resolver_.address()[0] for _ in range(6)]
+        self.assertEqual(sorted(addresses[:3]), ["10.0.0.1", "10.0.0.2", "10.0.0.3"])
+        self.assertEqual(addresses[:3], addresses[3:])
+
+    def test_ipv4_addresses_are_preferred(self):
+        self.mock_getaddrinfo.return_value = address_info(
+            ("::1", 8125, 0, 0), ("10.0.0.1", 8125), ("::2", 8125, 0, 0))
+        resolver_ = Resolver("stats.example.org", 8125)
+        self.assertEqual(resolver_.addresses, [("10.0.0.1", 8125)])
+
+    def test_ipv6_addresses_are_used_without_ipv4_addresses(self):
+        self.mock_getaddrinfo.return_value = address_info(("::1", 8125, 0, 0), ("::2", 8125, 0, 0))
+        resolver_ = Resolver("stats.example.org", 8125)
+        self.assertEqual(resolver_.addresses, [("::1", 8125, 0, 0), ("::2", 8125, 0, 0)])
+
+    def test_refresh_expired_addresses_in_background(self):
+        resolver_ = Resolver("stats.example.org", 8125, ttl=1000)
+        self.assertEqual(resolver_.address(), ("10.0.0.1", 8125))
+        self.mock_getaddrinfo.return_value = address_info(("10.0.0.2", 8125))
+        self.mock_clock.return_value = 100.5
+        self.assertEqual(resolver_.address(), ("10.0.0.1", 8125))
+        self.assertEqual(self.mock_getaddrinfo.call_count, 1)
+
+        self.mock_clock.return_value = 101.0
+        resolver_.address()
+        self.wait_for_refresh(resolver_)
+        self.assertEqual(self.mock_getaddrinfo.call_count, 2)
+        self.assertEqual(resolver_.address(), ("10.0.0.2", 8125))
+        self.assertAlmostEqual(resolver_._expires, 102.0)
+
+    def test_keep_addresses_when_refresh_fails(self):
+        resolver_ = Resolver("stats.example.org", 8125, ttl=1000, retry_delay=100)
+        resolver_.address()
+        self.mock_getaddrinfo.side_effect = socket.gaierror("mock error")
+        self.mock_clock.return_value = 101.0
+        self.assertEqual(resolver_.address(), ("10.0.0.1", 8125))
+        self.wait_for_refresh(resolver_)
+        self.assertEqual(resolver_.errors, 1)
+        self.assertEqual(resolver_.address(), ("10.0.0.1", 8125))
+        self.assertAlmostEqual(resolver_._expires, 101.1)
+
+    def test_client_sends_to_rotating_addresses(self):
+        self.mock_getaddrinfo.return_value = address_info(("10.0.0.1", 8125), ("10.0.0.2", 8125))
+        client = Client("stats.example.org")
+        client._socket = mock.MagicMock()
+        client.increment("event")
+        client.increment("event")
+        addresses = sorted(call[0][1] for call in client._socket.sendto.call_args_list)
+        self.assertEqual(addresses, [("10.0.0.1", 8125), ("10.0.0.2", 8125)])
+        self.assertIs(client.batch_client().resolver, client.resolver)
+
+
+@unittest.skipUnless(has_ipv6(), "IPv6 is not available")
+class TestIPv6(BaseTestCase):
+
+    def setUp(self):
+        self.server = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+        self.server.bind(("::1", 0))
+        self.server.settimeout(2)
+        self.addCleanup(self.server.close)
+        self.port = self.server.getsockname()[1]
+
+    def test_client_sends_to_ipv6_address(self):
+        client = Client("::1", self.port)
+        client.increment("event")
+        self.assertEqual(self.server.recv(1024), b"event:1|c")
+
+    def test_batch_client_sends_to_ipv6_address(self):
+        client = BatchClient("::1", self.port, batch_size=16)
+        client.increment("event")
+        client.increment("second.event")
+        client.flush()
+        self.assertEqual(self.server.recv(1024), b"event:1|c\n")
+        self.assertEqual(self.server.recv(1024), b"second.event:1|c\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
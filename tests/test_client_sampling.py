@@ -0,0 +1,207 @@
+"""
+tests.test_client_sampling
+--------------------------
+unittests for statsdmetrics.client.sampling module
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import unittest
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+from statsdmetrics.client import Client, BatchClient, AggregatingBatchClient
+from statsdmetrics.client.sampling import (AbstractSampler, RandomSampler, CountingSampler,
+                                           RateTableSampler, AdaptiveSampler)
+from . import BaseTestCase, MockMixIn
+
+
+class TestRandomSampler(BaseTestCase):
+
+    def test_sample(self):
+        sampler = RandomSampler()
+        self.assertIsInstance(sampler, AbstractSampler)
+        self.assertEqual(sampler.sample("event", 1), 1)
+        with mock.patch("statsdmetrics.client.sampling.random", return_value=0.3):
+            self.assertEqual(sampler.sample("event", 0.5), 0.5)
+            self.assertEqual(sampler.sample("event", 0.2), 0)
+
+
+class TestCountingSampler(BaseTestCase):
+
+    def sent(self, sampler, name, rate, calls):
+        return len([rate for _ in range(calls) if sampler.sample(name, rate)])
+
+    def test_init_and_properties(self):
+        self.assertEqual(CountingSampler(10).max_names, 10)
+        self.assertRaises(AssertionError, CountingSampler, 0)
+
+    def test_sample_exactly_one_in_n(self):
+        sampler = CountingSampler()
+        decisions = [sampler.sample("event", 0.25) for _ in range(8)]
+        self.assertEqual(decisions, [0.25, 0, 0, 0, 0.25, 0, 0, 0])
+        self.assertEqual(self.sent(sampler, "query", 0.1, 1000), 100)
+        self.assertEqual(self.sent(sampler, "memory", 0.3, 1000), 300)
+        self.assertEqual(self.sent(sampler, "user", 1, 10), 10)
+
+    def test_names_are_counted_separately(self):
+        sampler = CountingSampler()
+        self.assertEqual(sampler.sample("event", 0.5), 0.5)
+        self.assertEqual(sampler.sample("query", 0.5), 0.5)
+        self.assertEqual(sampler.sample("event", 0.5), 0)
+        self.assertEqual(sampler.sample("query", 0.5), 0)
+
+    def test_counts_are_bounded(self):
+        sampler = CountingSampler(max_names=3)
+        for index in range(10):
+            sampler.sample("event.{}".format(index), 0.5)
+        self.assertLessEqual(len(sampler._credits), 3)
+
+
+class TestRateTableSampler(BaseTestCase):
+
+    def test_init_and_properties(self):
+        sampler = RateTableSampler({"event": 0.5}, default=0.8)
+        self.assertEqual(sampler.rates, {"event": 0.5})
+        self.assertEqual(sampler.default, 0.8)
+        self.assertRaises(AssertionError, RateTableSampler, {"event": 0})
+        self.assertRaises(AssertionError, RateTableSampler, {"event": 1.5})
+        self.assertRaises(AssertionError, RateTableSampler, {}, default=0)
+
+    def test_sample_with_rates_of_the_table(self):
+        sampler = RateTableSampler({"event": 0.5}, sampler=CountingSampler())
+        self.assertEqual([sampler.sample("event", 1) for _ in range(4)], [0.5, 0, 0.5, 0])
+        self.assertEqual(sampler.sample("query", 1), 1)
+        self.assertEqual(sampler.sample("query", 0.2), 0.2)
+
+    def test_sample_with_default_rate(self):
+        sampler = RateTableSampler({"event": 0.5}, default=0.1, sampler=CountingSampler())
+        self.assertEqual([sampler.sample("query", 1) for _ in range(10)].count(0.1), 1)
+
+    def test_set_rate(self):
+        sampler = RateTableSampler({})
+        sampler.set_rate("event", 0.2)
+        self.assertEqual(sampler.rates, {"event": 0.2})
+        sampler.set_rate("event", None)
+        self.assertEqual(sampler.rates, {})
+        self.assertRaises(AssertionError, sampler.set_rate, "event", 2)
+
+    def test_sample_randomly_by_default(self):
+        sampler = RateTableSampler({"event": 0.5})
+        with mock.patch("statsdmetrics.client.sampling.random", return_value=0.3):
+            self.assertEqual(sampler.sample("event", 1), 0.5)
+        with mock.patch("statsdmetrics.client.sampling.random", return_value=0.7):
+            self.assertEqual(sampler.sample("event", 1), 0)
+
+
+class TestAdaptiveSampler(BaseTestCase):
+
+    def setUp(self):
+        patcher = mock.patch("statsdmetrics.client.sampling.clock")
+        self.mock_clock = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_clock.return_value = 100.0
+
+    def call(self, sampler, name, calls, duration=1.0, rate=1):
+        start = self.mock_clock.return_value
+        sent = 0
+        for index in range(calls):
+            self.mock_clock.return_value = start + duration * index / calls
+            if sampler.sample(name, rate):
+                sent += 1
+        self.mock_clock.return_value = start + duration
+        return sent
+
+    def test_init_and_properties(self):
+        sampler = AdaptiveSampler(budget=100, interval=500, min_rate=0.01)
+        self.assertEqual(sampler.budget, 100)
+        self.assertEqual(sampler.interval, 500)
+        self.assertEqual(sampler.min_rate, 0.01)
+        self.assertEqual(sampler.rate_factor("event"), 1)
+        self.assertRaises(AssertionError, AdaptiveSampler, budget=0)
+        self.assertRaises(AssertionError, AdaptiveSampler, interval=0)
+        self.assertRaises(AssertionError, AdaptiveSampler, min_rate=0)
+
+    def test_names_under_budget_are_not_sampled(self):
+        sampler = AdaptiveSampler(budget=100)
+        self.assertEqual(self.call(sampler, "event", 50), 50)
+        self.assertEqual(self.call(sampler, "event", 80), 80)
+        self.assertEqual(sampler.rate_factor("event"), 1)
+
+    def test_names_over_budget_are_sampled_down(self):
+        sampler = AdaptiveSampler(budget=100)
+        self.assertEqual(self.call(sampler, "event", 1000), 1000)
+        sent = self.call(sampler, "event", 1000)
+        self.assertAlmostEqual(sampler.rate_factor("event"), 0.1, places=2)
+        self.assertLessEqual(abs(sent - 100), 2)
+        # the other names are not affected
+        self.assertEqual(self.call(sampler, "query", 10), 10)
+
+    def test_rates_are_restored_when_calls_drop(self):
+        sampler = AdaptiveSampler(budget=100)
+        self.call(sampler, "event", 1000)
+        self.call(sampler, "event", 1000)
+        self.assertLess(sampler.rate_factor("event"), 1)
+        self.call(sampler, "event", 50)
+        self.assertEqual(self.call(sampler, "event", 50), 50)
+        self.assertEqual(sampler.rate_factor("event"), 1)
+
+    def test_lowered_rates_are_sent(self):
+        sampler = AdaptiveSampler(budget=10, min_rate=0.05)
+        self.call(sampler, "event", 1000, rate=0.5)
+        rates = set(sampler.sample("event", 0.5) for _ in range(100))
+        self.assertEqual(rates, set([0, 0.05]))
+
+
+class TestClientSampling(MockMixIn, BaseTestCase):
+
+    def setUp(self):
+        self.doMock()
+
+    def test_clients_sample_randomly_by_default(self):
+        client = Client("localhost")
+        client._socket = self.mock_socket
+        self.assertIsNone(client.sampler)
+        client.increment("event", rate=0.5)
+        client.increment("event", rate=0.2)
+        self.mock_sendto.assert_called_once_with(b"event:1|c|@0.5", ("127.0.0.2", 8125))
+
+    def test_clients_send_metrics_with_rates_of_the_sampler(self):
+        client = Client("localhost")
+        client._socket = self.mock_socket
+        client.sampler = RateTableSampler({"event": 0.5, "query": 0.25}, sampler=CountingSampler())
+        client.increment("event")
+        client.increment("event")
+        client.timing("query", 3)
+        client.gauge("memory", 10)
+        self.assertEqual(
+            [call[0][0] for call in self.mock_sendto.call_args_list],
+            [b"event:1|c|@0.5", b"query:3|ms|@0.25", b"memory:10|g"]
+        )
+
+    def test_batch_clients_share_the_sampler(self):
+        client = Client("localhost")
+        client.sampler = CountingSampler()
+        batch_client = client.batch_client()
+        self.assertIs(batch_client.sampler, client.sampler)
+        self.assertIs(batch_client.unit_client().sampler, client.sampler)
+        batch_client.increment("event", rate=0.5)
+        batch_client.increment("event", rate=0.5)
+        self.assertEqual(bytes(batch_client._batches[0]), b"event:1|c|@0.5\n")
+
+    def test_aggregating_clients_sample(self):
+        client = AggregatingBatchClient("localhost")
+        client.sampler = CountingSampler()
+        for _ in range(4):
+            client.increment("event", rate=0.5)
+        self.assertEqual([str(request) for request in client._aggregator.requests()],
+                         ["event:2|c|@0.5"])
+
+
+if __name__ == "__main__":
+    unittest.main()
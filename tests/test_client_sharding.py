@@ -0,0 +1,183 @@
+"""
+tests.test_client_sharding
+--------------------------
+unittests for statsdmetrics.client.sharding module
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import socket
+import unittest
+
+from statsdmetrics.client import BatchClient
+from statsdmetrics.client.tcp import TCPBatchClient
+from statsdmetrics.client.sharding import HashRing, ShardedClient
+from . import BaseTestCase, MockMixIn
+
+NAMES = ["metric.{}".format(index).encode() for index in range(5000)]
+
+
+class TestHashRing(BaseTestCase):
+
+    def test_init_and_properties(self):
+        ring = HashRing(["a", "b"], replicas=10)
+        self.assertEqual(ring.replicas, 10)
+        self.assertEqual(ring.nodes, ["a", "b"])
+        self.assertEqual(len(ring), 2)
+        self.assertIn("a", ring)
+        self.assertNotIn("c", ring)
+        self.assertRaises(AssertionError, HashRing, replicas=0)
+
+    def test_get_is_stable(self):
+        ring = HashRing(["a", "b", "c"])
+        other_ring = HashRing(["c", "a", "b"])
+        for name in NAMES[:100]:
+            self.assertEqual(ring.get(name), ring.get(name))
+            self.assertEqual(ring.get(name), other_ring.get(name))
+
+    def test_keys_are_spread_over_nodes(self):
+        ring = HashRing(["a", "b", "c", "d"])
+        counts = {}
+        for name in NAMES:
+            node = ring.get(name)
+            counts[node] = counts.get(node, 0) + 1
+        self.assertEqual(sorted(counts), ["a", "b", "c", "d"])
+        for count in counts.values():
+            self.assertGreater(count, len(NAMES) / 4 * 0.7)
+            self.assertLess(count, len(NAMES) / 4 * 1.3)
+
+    def test_adding_node_only_moves_keys_to_the_new_node(self):
+        nodes = ["node{}".format(index) for index in range(10)]
+        ring = HashRing(nodes)
+        before = dict((name, ring.get(name)) for name in NAMES)
+        ring.add("node10")
+        moved = [name for name in NAMES if ring.get(name) != before[name]]
+        self.assertTrue(all(ring.get(name) == "node10" for name in moved))
+        self.assertLess(len(moved), len(NAMES) / 11 * 1.5)
+
+    def test_removing_node_only_moves_keys_of_the_node(self):
+        nodes = ["node{}".format(index) for index in range(10)]
+        ring = HashRing(nodes)
+        before = dict((name, ring.get(name)) for name in NAMES)
+        ring.remove("node3")
+        for name in NAMES:
+            if before[name] != "node3":
+                self.assertEqual(ring.get(name), before[name])
+            else:
+                self.assertNotEqual(ring.get(name), "node3")
+
+    def test_add_existing_and_remove_missing_nodes(self):
+        ring = HashRing(["a"], replicas=4)
+        ring.add("a")
+        self.assertEqual(ring.nodes, ["a"])
+        self.assertEqual(len(ring._points), 4)
+        self.assertRaises(KeyError, ring.remove, "b")
+
+    def test_get_from_empty_ring_fails(self):
+        self.assertRaises(LookupError, HashRing().get, b"name")
+
+
+class TestShardedClient(MockMixIn, BaseTestCase):
+
+    def setUp(self):
+        self.doMock()
+
+    def test_init_and_properties(self):
+        client = ShardedClient([("10.0.0.1", 8125), "10.0.0.2"], "region.", batch_size=1024)
+        self.assertEqual(client.prefix, "region.")
+        self.assertEqual(client.batch_size, 1024)
+        self.assertIsNone(client.remote_address)
+        self.assertEqual(client.ring.nodes, ["10.0.0.1:8125", "10.0.0.2:8125"])
+        shards = client.shards
+        self.assertEqual(len(shards), 2)
+        for shard in shards:
+            self.assertIsInstance(shard, BatchClient)
+            self.assertEqual(shard.batch_size, 1024)
+            self.assertIs(shard.name_cache, client.name_cache)
+        self.assertRaises(AssertionError, ShardedClient, ["10.0.0.1"], batch_size=0)
+        self.assertRaises(AssertionError, ShardedClient, ["10.0.0.1", "10.0.0.1"])
+
+    def test_client_class(self):
+        client = ShardedClient(["10.0.0.1", "10.0.0.2"], client_class=TCPBatchClient)
+        for shard in client.shards:
+            self.assertIsInstance(shard, TCPBatchClient)
+
+    def test_metrics_of_a_name_are_buffered_in_its_shard(self):
+        client = ShardedClient(["10.0.0.1", "10.0.0.2", "10.0.0.3"], "region.")
+        client.increment("event")
+        client.increment("event", 2)
+        client.timing("query", 3)
+        client.gauge("memory", 1024)
+        client.set("user", "first")
+
+        buffered = {}
+        for shard in client.shards:
+            buffered[shard.host] = b"".join(shard._batches)
+        self.assertEqual(b"".join(sorted(buffered.values())).count(b"\n"), 5)
+        event_shard = client.shard("event")
+        self.assertIn(b"region.event:1|c\nregion.event:2|c\n", bytes(buffered[event_shard.host]))
+        self.assertIn(b"region.query:3|ms\n", bytes(buffered[client.shard("query").host]))
+        self.assertIs(client.shard("event"), client.shard("event"))
+        # names are normalized before sharding
+        self.assertIs(client.shard("event"), event_shard)
+
+    def test_flush_and_clear_all_shards(self):
+        client = ShardedClient(["10.0.0.1", "10.0.0.2"])
+        for index in range(20):
+            client.increment("event.{}".format(index))
+        for shard in client.shards:
+            shard._socket = self.mock_socket
+        client.flush()
+        requests = b"".join(call[0][0] for call in self.mock_sendto.call_args_list)
+        self.assertEqual(requests.count(b"\n"), 20)
+        self.assertEqual(sum(len(shard._batches) for shard in client.shards), 0)
+
+        client.increment("event")
+        client.clear()
+        self.assertEqual(sum(len(shard._batches) for shard in client.shards), 0)
+
+    def test_context_manager_flushes(self):
+        client = ShardedClient(["10.0.0.1"])
+        client.shards[0]._socket = self.mock_socket
+        with client:
+            client.increment("event")
+        self.mock_sendto.assert_called_once_with(bytearray(b"event:1|c\n"), ("127.0.0.2", 8125))
+
+    def test_add_server(self):
+        client = ShardedClient(["10.0.0.{}".format(index) for index in range(1, 5)])
+        names = ["metric.{}".format(index) for index in range(500)]
+        before = dict((name, client.shard(name).host) for name in names)
+        shard = client.add_server("10.0.0.5", 8126)
+        self.assertEqual((shard.host, shard.port), ("10.0.0.5", 8126))
+        self.assertEqual(len(client.shards), 5)
+        moved = [name for name in names if client.shard(name).host != before[name]]
+        self.assertTrue(moved)
+        self.assertTrue(all(client.shard(name) is shard for name in moved))
+        self.assertRaises(AssertionError, client.add_server, "10.0.0.5", 8126)
+
+    def test_remove_server_flushes_the_shard(self):
+        client = ShardedClient(["10.0.0.1", "10.0.0.2"])
+        removed = client.shard("event")
+        removed._socket = self.mock_socket
+        client.increment("event")
+        self.assertIs(client.remove_server(removed.host, removed.port), removed)
+        self.mock_sendto.assert_called_once_with(bytearray(b"event:1|c\n"), ("127.0.0.2", 8125))
+        self.assertEqual(len(client.shards), 1)
+        self.assertIsNot(client.shard("event"), removed)
+        self.assertRaises(KeyError, client.remove_server, removed.host, removed.port)
+
+    def test_routes_are_bounded(self):
+        client = ShardedClient(["10.0.0.1", "10.0.0.2"], name_cache_size=4)
+        for index in range(10):
+            client.increment("event.{}".format(index))
+        self.assertLessEqual(len(client._routes), 4)
+
+    def test_sending_without_shards_fails(self):
+        client = ShardedClient([])
+        self.assertRaises(LookupError, client.increment, "event")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,6 +9,8 @@ https://opensource.org/licenses/MIT.
 """
 
 import gc
+import socket
+import threading
 import unittest
 from datetime import datetime
 from time import time, sleep
@@ -20,7 +22,11 @@ try:
 except ImportError:
     import mock
 
-from statsdmetrics.client.tcp import TCPClient, TCPBatchClient
+from statsdmetrics.client import tcp
+from statsdmetrics.client import DROP_OLDEST
+from statsdmetrics.client.tcp import (TCPClient, TCPBatchClient, TCPThreadSafeBatchClient,
+                                      TCPConnection, NonBlockingTCPConnection,
+                                      NonBlockingTCPClient, NonBlockingTCPBatchClient)
 from . import ClientTestCaseMixIn, BatchClientTestCaseMixIn, BaseTestCase
 
 
@@ -414,8 +420,8 @@ class TestTCPBatchClient(BatchClientTestCaseMixIn, BaseTestCase):
         self.assertEqual(batch_client.host, client.host)
         self.assertEqual(batch_client.port, client.port)
         self.assertEqual(
-            batch_client._remote_address,
-            client._remote_address
+            batch_client._resolver,
+            client._resolver
         )
         self.assertEqual(
             batch_client._socket,
@@ -465,5 +471,357 @@ class TestTCPBatchClient(BatchClientTestCaseMixIn, BaseTestCase):
         request = request_args[0]
         self.assertRegex(request.decode(), "something:[1-9]\d{0,3}\|ms")
 
+
+class TestTCPBatchClientSendmsg(BaseTestCase):
+
+    def setUp(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(1)
+        self.addCleanup(self.server.close)
+        self.client = TCPBatchClient("127.0.0.1", self.server.getsockname()[1], batch_size=25)
+        self.assertTrue(self.client.connection.connect())
+        self.connection, _ = self.server.accept()
+        self.connection.settimeout(2)
+        self.addCleanup(self.connection.close)
+        if not self.client._socket.supports_sendmsg:
+            self.skipTest("sendmsg is not available")
+
+    def receive(self, size):
+        received = bytearray()
+        while len(received) < size:
+            received.extend(self.connection.recv(size - len(received)))
+        return bytes(received)
+
+    def send_metrics(self):
+        for index in range(6):
+            self.client.increment("event.{}".format(index))
+        self.assertEqual(len(self.client._batches), 3)
+        return "".join("event.{}:1|c\n".format(index) for index in range(6)).encode()
+
+    def test_flush_sends_all_batches_in_a_single_call(self):
+        expected = self.send_metrics()
+        sendmsg = mock.MagicMock(wraps=self.client._socket._socket.sendmsg)
+        self.client._socket.sendmsg = sendmsg
+        self.client.flush()
+        self.assertEqual(sendmsg.call_count, 1)
+        self.assertEqual(len(self.client._batches), 0)
+        self.assertEqual(self.receive(len(expected)), expected)
+
+    def test_flush_continues_partial_writes(self):
+        expected = self.send_metrics()
+        sock = self.client._socket._socket
+
+        def send_few_bytes(buffers):
+            return sock.send(bytes(buffers[0])[:5])
+
+        self.client._socket.sendmsg = send_few_bytes
+        with mock.patch.object(tcp, "MAX_SENDMSG_BUFFERS", 2):
+            self.client.flush()
+        self.assertEqual(len(self.client._batches), 0)
+        self.assertEqual(self.receive(len(expected)), expected)
+
+    def test_unsent_requests_remain_when_flush_fails(self):
+        self.send_metrics()
+        # the first batch and part of event.3 in the second batch are sent
+        sendmsg = mock.MagicMock(side_effect=[37, socket.error("connection reset")])
+        self.client._socket.sendmsg = sendmsg
+        self.assertRaises(socket.error, tcp._sendmsg_batches, self.client._socket, self.client._batches)
+        self.assertEqual(
+            list(self.client._batches),
+            [bytearray(b"event.3:1|c\n"), bytearray(b"event.4:1|c\nevent.5:1|c\n")]
+        )
+        self.client._batches.clear()
+        self.client.increment("reused")
+        self.assertEqual(list(self.client._batches), [bytearray(b"reused:1|c\n")])
+
+
+class TestTCPConnection(BaseTestCase):
+
+    def setUp(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(("127.0.0.1", 0))
+        self.port = sock.getsockname()[1]
+        sock.close()
+        self.server = None
+
+    def tearDown(self):
+        if self.server is not None:
+            self.server.close()
+
+    def start_server(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(("127.0.0.1", self.port))
+        self.server.listen(1)
+        self.server.settimeout(2)
+
+    def accept(self):
+        connection, _ = self.server.accept()
+        connection.settimeout(2)
+        self.addCleanup(connection.close)
+        return connection
+
+    def receive(self, connection, size):
+        received = bytearray()
+        while len(received) < size:
+            data = connection.recv(size - len(received))
+            if not data:
+                break
+            received.extend(data)
+        return bytes(received)
+
+    def test_init_and_properties(self):
+        connection = TCPConnection("127.0.0.1", self.port)
+        self.assertFalse(connection.connected)
+        self.assertFalse(connection.closed)
+        self.assertEqual(connection.timeout, tcp.DEFAULT_TIMEOUT)
+        self.assertEqual(connection.reconnect_delay, tcp.DEFAULT_RECONNECT_DELAY)
+        self.assertEqual(connection.max_reconnect_delay, tcp.DEFAULT_MAX_RECONNECT_DELAY)
+        self.assertEqual(connection.retry_buffer_size, tcp.DEFAULT_RETRY_BUFFER_SIZE)
+        self.assertEqual(connection.dropped, 0)
+        self.assertEqual(connection.errors, 0)
+        self.assertEqual(connection.retry_buffer_used, 0)
+
+        connection = TCPConnection("127.0.0.1", self.port, 500, 10, 1000, 128, DROP_OLDEST)
+        self.assertEqual(connection.timeout, 500)
+        self.assertEqual(connection.reconnect_delay, 10)
+        self.assertEqual(connection.max_reconnect_delay, 1000)
+        self.assertEqual(connection.retry_buffer_size, 128)
+        self.assertEqual(connection.drop_policy, DROP_OLDEST)
+
+    def test_invalid_settings(self):
+        self.assertRaises(AssertionError, TCPConnection, "127.0.0.1", self.port, timeout=0)
+        self.assertRaises(AssertionError, TCPConnection, "127.0.0.1", self.port, reconnect_delay=0)
+        self.assertRaises(AssertionError, TCPConnection, "127.0.0.1", self.port, max_reconnect_delay=-1)
+        self.assertRaises(AssertionError, TCPConnection, "127.0.0.1", self.port, retry_buffer_size=-1)
+        self.assertRaises(AssertionError, TCPConnection, "127.0.0.1", self.port, drop_policy="all")
+
+    def test_client_connects_on_first_request(self):
+        self.start_server()
+        client = TCPClient("127.0.0.1", self.port)
+        self.assertIsInstance(client.connection, TCPConnection)
+        self.assertFalse(client.connection.connected)
+        client.increment("event")
+        self.assertTrue(client.connection.connected)
+        self.assertEqual(self.receive(self.accept(), 10), b"event:1|c\n")
+
+    def test_requests_are_kept_while_disconnected(self):
+        client = TCPClient("127.0.0.1", self.port)
+        client.increment("event")
+        client.timing("query", 2)
+        connection = client.connection
+        self.assertFalse(connection.connected)
+        self.assertEqual(connection.errors, 1)
+        self.assertEqual(connection.retry_buffer_used, 21)
+
+        self.start_server()
+        self.assertTrue(connection.connect())
+        client.increment("second.event")
+        self.assertEqual(connection.retry_buffer_used, 0)
+        self.assertEqual(
+            self.receive(self.accept(), 38),
+            b"event:1|c\nquery:2|ms\nsecond.event:1|c\n"
+        )
+
+    def test_batch_client_reconnects_after_connection_is_lost(self):
+        self.start_server()
+        client = TCPBatchClient("127.0.0.1", self.port)
+        client.increment("event")
+        client.flush()
+        server_connection = self.accept()
+        self.assertEqual(self.receive(server_connection, 10), b"event:1|c\n")
+
+        lost_socket = mock.MagicMock()
+        lost_socket.sendall.side_effect = socket.error("connection reset")
+        client.connection._socket = lost_socket
+        client.increment("lost")
+        client.flush()
+        self.assertFalse(client.connection.connected)
+        self.assertEqual(client.connection.errors, 1)
+        self.assertEqual(len(client._batches), 0)
+
+        client.increment("event")
+        client.flush()
+        self.assertTrue(client.connection.connected)
+        self.assertEqual(self.receive(self.accept(), 19), b"lost:1|c\nevent:1|c\n")
+
+    def test_reconnect_with_exponential_backoff(self):
+        connection = TCPConnection("127.0.0.1", self.port, reconnect_delay=100, max_reconnect_delay=300)
+        with mock.patch.object(tcp, "clock", return_value=10.0), \
+                mock.patch.object(tcp, "random", return_value=0.5):
+            connection.sendall(b"event:1|c\n")
+            self.assertEqual(connection.errors, 1)
+            self.assertAlmostEqual(connection._next_connect_time, 10.075)
+            connection.sendall(b"event:1|c\n")
+            self.assertEqual(connection.errors, 1)
+
+        with mock.patch.object(tcp, "clock", return_value=10.1), \
+                mock.patch.object(tcp, "random", return_value=0.0):
+            connection.sendall(b"event:1|c\n")
+            self.assertEqual(connection.errors, 2)
+            self.assertAlmostEqual(connection._next_connect_time, 10.2)
+            self.assertFalse(connection.connect())
+            self.assertAlmostEqual(connection._next_connect_time, 10.25)
+            self.assertFalse(connection.connect())
+            self.assertAlmostEqual(connection._next_connect_time, 10.25)
+
+        self.start_server()
+        self.assertTrue(connection.connect())
+        self.assertEqual(connection._current_reconnect_delay, 100)
+        self.assertEqual(self.receive(self.accept(), 30), b"event:1|c\n" * 3)
+
+    def test_drop_newest_when_retry_buffer_is_full(self):
+        connection = TCPConnection("127.0.0.1", self.port, retry_buffer_size=25)
+        connection.sendall(b"first:1|c\n")
+        connection.sendall(b"second:1|c\n")
+        connection.sendall(b"third:1|c\n")
+        self.assertEqual(connection.dropped, 1)
+        self.assertEqual(list(connection._retry_buffer), [b"first:1|c\n", b"second:1|c\n"])
+
+    def test_drop_oldest_when_retry_buffer_is_full(self):
+        connection = TCPConnection("127.0.0.1", self.port, retry_buffer_size=25, drop_policy=DROP_OLDEST)
+        connection.sendall(b"first:1|c\n")
+        connection.sendall(b"second:1|c\n")
+        connection.sendall(b"third:1|c\n")
+        self.assertEqual(connection.dropped, 1)
+        self.assertEqual(list(connection._retry_buffer), [b"second:1|c\n", b"third:1|c\n"])
+        self.assertEqual(connection.retry_buffer_used, 21)
+
+    def test_close_drops_retry_buffer(self):
+        connection = TCPConnection("127.0.0.1", self.port)
+        connection.sendall(b"first:1|c\nsecond:1|c\n")
+        connection.close()
+        self.assertTrue(connection.closed)
+        self.assertEqual(connection.dropped, 2)
+        self.assertEqual(connection.retry_buffer_used, 0)
+        self.assertFalse(connection.connect())
+
+
+class TestNonBlockingTCPClient(BaseTestCase):
+
+    def setUp(self):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen(1)
+        self.server.settimeout(2)
+        self.addCleanup(self.server.close)
+        self.port = self.server.getsockname()[1]
+
+    def receive(self, size):
+        connection, _ = self.server.accept()
+        connection.settimeout(2)
+        self.addCleanup(connection.close)
+        received = bytearray()
+        while len(received) < size:
+            data = connection.recv(size - len(received))
+            if not data:
+                break
+            received.extend(data)
+        return bytes(received)
+
+    def block_sending(self, connection):
+        sending = threading.Event()
+        unblock = threading.Event()
+        send = connection._send
+
+        def blocking_send(batches):
+            sending.set()
+            unblock.wait(2)
+            send(batches)
+
+        connection._send = blocking_send
+        self.addCleanup(unblock.set)
+        return sending, unblock
+
+    def test_init_and_properties(self):
+        connection = NonBlockingTCPConnection("127.0.0.1", self.port, send_buffer_size=1024)
+        self.assertEqual(connection.send_buffer_size, 1024)
+        self.assertEqual(connection.send_buffer_used, 0)
+        self.assertRaises(AssertionError, NonBlockingTCPConnection, "127.0.0.1", self.port,
+                          send_buffer_size=0)
+        client = NonBlockingTCPClient("127.0.0.1", self.port)
+        self.assertIsInstance(client.connection, NonBlockingTCPConnection)
+        self.assertIs(client.batch_client().connection, client.connection)
+
+    def test_requests_are_sent_in_helper_thread(self):
+        client = NonBlockingTCPClient("127.0.0.1", self.port)
+        client.increment("event")
+        client.timing("query", 2)
+        self.assertTrue(client.connection.flush(2))
+        self.assertEqual(self.receive(21), b"event:1|c\nquery:2|ms\n")
+
+    def test_batch_client_flush_does_not_wait_for_socket(self):
+        client = NonBlockingTCPBatchClient("127.0.0.1", self.port, batch_size=16)
+        sending, unblock = self.block_sending(client.connection)
+        client.increment("event")
+        client.increment("second.event")
+        client.flush()
+        self.assertEqual(len(client._batches), 0)
+        self.assertTrue(sending.wait(2))
+        unblock.set()
+        self.assertTrue(client.connection.flush(2))
+        self.assertEqual(self.receive(27), b"event:1|c\nsecond.event:1|c\n")
+
+    def test_drop_newest_when_send_buffer_is_full(self):
+        client = NonBlockingTCPClient("127.0.0.1", self.port)
+        connection = client.connection
+        connection.send_buffer_size = 22
+        sending, unblock = self.block_sending(connection)
+        client.increment("event")
+        self.assertTrue(sending.wait(2))
+        for _ in range(3):
+            client.increment("second")
+        self.assertEqual(connection.dropped, 1)
+        self.assertEqual(connection.send_buffer_used, 22)
+        unblock.set()
+        self.assertTrue(connection.flush(2))
+        self.assertEqual(self.receive(32), b"event:1|c\nsecond:1|c\nsecond:1|c\n")
+
+    def test_drop_oldest_when_send_buffer_is_full(self):
+        client = NonBlockingTCPClient("127.0.0.1", self.port)
+        connection = client.connection
+        connection.send_buffer_size = 22
+        connection.drop_policy = DROP_OLDEST
+        sending, unblock = self.block_sending(connection)
+        client.increment("event")
+        self.assertTrue(sending.wait(2))
+        for index in range(3):
+            client.increment("event{}".format(index))
+        self.assertEqual(connection.dropped, 1)
+        unblock.set()
+        self.assertTrue(connection.flush(2))
+        self.assertEqual(self.receive(32), b"event:1|c\nevent1:1|c\nevent2:1|c\n")
+
+    def test_close_sends_buffered_requests(self):
+        connection = NonBlockingTCPConnection("127.0.0.1", self.port)
+        connection.sendall(b"event:1|c\n")
+        connection.close()
+        self.assertTrue(connection.closed)
+        self.assertFalse(connection._thread.is_alive())
+        self.assertEqual(self.receive(10), b"event:1|c\n")
+        connection.sendall(b"event:1|c\n")
+        self.assertEqual(connection.dropped, 1)
+
+
+class TestTCPThreadSafeBatchClient(BatchClientTestCaseMixIn, BaseTestCase):
+
+    def setUp(self):
+        super(TestTCPThreadSafeBatchClient, self).setUp()
+        self.clientClass = TCPThreadSafeBatchClient
+
+    def test_merge_buffers_of_multiple_threads(self):
+        client = TCPThreadSafeBatchClient("localhost")
+        client._socket = self.mock_socket
+        client.increment("main")
+        thread = threading.Thread(target=client.timing, args=["thread", 3])
+        thread.start()
+        thread.join()
+        client.flush()
+        self.mock_sendall.assert_called_once_with(
+            bytearray("main:1|c\nthread:3|ms\n".encode())
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
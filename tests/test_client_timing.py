@@ -51,7 +51,7 @@ class TestChronometer(BaseTestCase):
         self.assertEqual(self.chronometer.since("event", start_time), self.chronometer)
         self.assertEqual(self.request_mock.call_count, 1)
         (request,) = self.request_mock.call_args[0]
-        self.assertRegex('event:[1-9]\d{0,3}\|ms', request)
+        self.assertRegex(request.decode(), "event:[1-9]\d{0,3}\|ms")
 
         self.request_mock.reset_mock()
         self.assertEqual(self.chronometer.since("event", start_time, rate=0), self.chronometer)
@@ -72,7 +72,7 @@ class TestChronometer(BaseTestCase):
         self.assertEqual(self.request_mock.call_count, 1)
         request_args = self.request_mock.call_args[0]
         self.assertEqual(len(request_args), 1)
-        request = request_args[0]
+        request = request_args[0].decode()
         self.assertRegex(request, "event:[1-9]\d{0,3}\|ms")
     
         self.request_mock.reset_mock()
@@ -92,7 +92,7 @@ class TestChronometer(BaseTestCase):
         request_args = self.request_mock.call_args[0]
         self.assertEqual(len(request_args), 1)
         (request,) = request_args
-        self.assertRegex(request, "with_args:[1-9]\d{0,3}\|ms")
+        self.assertRegex(request.decode(), "with_args:[1-9]\d{0,3}\|ms")
         self.assertEqual(args_passed, [("arg1", "arg2"), dict(named_arg="named_value")])
 
         with self.assertRaises(AssertionError):
@@ -113,7 +113,7 @@ class TestChronometer(BaseTestCase):
         self.assertEqual(self.request_mock.call_count, 1)
         request_args = self.request_mock.call_args[0]
         self.assertEqual(len(request_args), 1)
-        request = request_args[0]
+        request = request_args[0].decode()
         self.assertRegex(request, "event:[1-9]\d{0,3}\|ms")
 
         self.request_mock.reset_mock()
@@ -183,7 +183,7 @@ class TestStopwatch(BaseTestCase):
         self.assertEqual(self.request_mock.call_count, 1)
         request_args = self.request_mock.call_args[0]
         self.assertEqual(len(request_args), 1)
-        request = request_args[0]
+        request = request_args[0].decode()
         self.assertRegex(request, "timed_event:[1-9]\d{0,3}\|ms")
 
         self.request_mock.reset_mock()
@@ -198,7 +198,7 @@ class TestStopwatch(BaseTestCase):
         self.assertEqual(self.request_mock.call_count, 1)
         request_args = self.request_mock.call_args[0]
         self.assertEqual(len(request_args), 1)
-        request = request_args[0]
+        request = request_args[0].decode()
         self.assertRegex(request, "timed_event:[1-9]\d{0,3}\|ms")
 
         self.request_mock.reset_mock()
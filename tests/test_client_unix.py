@@ -0,0 +1,221 @@
+"""
+tests.test_client_unix
+----------------------
+unittests for statsdmetrics.client.unix module
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+from statsdmetrics.client import datagrams
+from . import BaseTestCase
+
+requires_unix_sockets = unittest.skipUnless(
+    hasattr(socket, "AF_UNIX"), "Unix domain sockets are not available")
+
+if hasattr(socket, "AF_UNIX"):
+    from statsdmetrics.client.unix import (UnixDatagramClient, UnixDatagramBatchClient,
+                                           UnixStreamClient, UnixStreamBatchClient,
+                                           UnixDatagramSocket, UnixStreamConnection)
+
+
+class UnixSocketTestCase(BaseTestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, "statsd.sock")
+
+
+@requires_unix_sockets
+class TestUnixDatagramClient(UnixSocketTestCase):
+
+    def setUp(self):
+        super(TestUnixDatagramClient, self).setUp()
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.server.bind(self.path)
+        self.server.settimeout(2)
+        self.addCleanup(self.server.close)
+
+    def test_init_and_properties(self):
+        client = UnixDatagramClient(self.path, "region.")
+        self.assertEqual(client.path, self.path)
+        self.assertEqual(client.host, self.path)
+        self.assertEqual(client.remote_address, self.path)
+        self.assertIsNone(client.port)
+        self.assertIsNone(client.resolver)
+        self.assertEqual(client.prefix, "region.")
+        self.assertIsInstance(client.socket, UnixDatagramSocket)
+        self.assertEqual(client.socket.dropped, 0)
+
+    def test_send_metrics(self):
+        client = UnixDatagramClient(self.path, "region.")
+        client.increment("event")
+        client.timing("query", 3)
+        client.gauge_delta("memory", -128)
+        self.assertEqual(self.server.recv(1024), b"region.event:1|c")
+        self.assertEqual(self.server.recv(1024), b"region.query:3|ms")
+        self.assertEqual(self.server.recv(1024), b"region.memory:-128|g")
+
+    def test_drop_metrics_when_server_is_not_listening(self):
+        client = UnixDatagramClient(self.path + ".missing")
+        client.increment("event")
+        client.increment("event")
+        self.assertEqual(client.socket.dropped, 2)
+
+    def test_drop_metrics_when_server_is_not_receiving(self):
+        client = UnixDatagramClient(self.path)
+        sent = 0
+        # sending does not block when the server buffer is full
+        while client.socket.dropped == 0 and sent < 1000000:
+            client.increment("event")
+            sent += 1
+        self.assertEqual(client.socket.dropped, 1)
+
+    def test_batch_client(self):
+        client = UnixDatagramClient(self.path, "region.")
+        batch_client = client.batch_client(32)
+        self.assertIsInstance(batch_client, UnixDatagramBatchClient)
+        self.assertIs(batch_client.socket, client.socket)
+        self.assertEqual(batch_client.path, self.path)
+        self.assertEqual(batch_client.prefix, "region.")
+        self.assertEqual(batch_client.batch_size, 32)
+        unit_client = batch_client.unit_client()
+        self.assertIsInstance(unit_client, UnixDatagramClient)
+        self.assertIs(unit_client.socket, client.socket)
+
+    def test_batch_client_flush(self):
+        client = UnixDatagramBatchClient(self.path, batch_size=24)
+        client.increment("event")
+        client.timing("query", 3)
+        client.decrement("larger.than.the.batch")
+        client.flush()
+        self.assertEqual(self.server.recv(1024), b"event:1|c\nquery:3|ms\n")
+        self.assertEqual(self.server.recv(1024), b"larger.than.the.batch:-1|c\n")
+        self.assertEqual(len(client._batches), 0)
+
+    @unittest.skipUnless(datagrams.sendmmsg_available, "sendmmsg is not available")
+    def test_batch_client_flushes_with_sendmmsg(self):
+        client = UnixDatagramBatchClient(self.path, batch_size=12)
+        client.increment("event")
+        client.increment("second")
+        with mock.patch("statsdmetrics.client.unix.sendmmsg", wraps=datagrams.sendmmsg) as mock_sendmmsg:
+            client.flush()
+        self.assertEqual(mock_sendmmsg.call_count, 1)
+        self.assertEqual(self.server.recv(1024), b"event:1|c\n")
+        self.assertEqual(self.server.recv(1024), b"second:1|c\n")
+
+    def test_batch_client_flush_without_sendmmsg(self):
+        client = UnixDatagramBatchClient(self.path, batch_size=12)
+        client.increment("event")
+        client.increment("second")
+        with mock.patch.object(datagrams, "sendmmsg_available", False):
+            client.flush()
+        self.assertEqual(self.server.recv(1024), b"event:1|c\n")
+        self.assertEqual(self.server.recv(1024), b"second:1|c\n")
+
+    def test_batch_client_drops_metrics_when_server_is_not_listening(self):
+        client = UnixDatagramBatchClient(self.path + ".missing", batch_size=16)
+        client.increment("event")
+        client.increment("second")
+        client.increment("third")
+        client.flush()
+        self.assertEqual(client.socket.dropped, 3)
+        self.assertEqual(len(client._batches), 0)
+
+
+@requires_unix_sockets
+class TestUnixStreamClient(UnixSocketTestCase):
+
+    def setUp(self):
+        super(TestUnixStreamClient, self).setUp()
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.path)
+        self.server.listen(1)
+        self.server.settimeout(2)
+        self.addCleanup(self.server.close)
+        self.received = bytearray()
+        self.server_thread = None
+
+    def receive(self):
+        def run():
+            connection, _ = self.server.accept()
+            try:
+                while True:
+                    data = connection.recv(4096)
+                    if not data:
+                        break
+                    self.received.extend(data)
+            finally:
+                connection.close()
+
+        self.server_thread = threading.Thread(target=run)
+        self.server_thread.start()
+
+    def wait_for_server(self):
+        self.server_thread.join(2)
+        return bytes(self.received)
+
+    def test_init_and_properties(self):
+        client = UnixStreamClient(self.path, "region.")
+        self.assertEqual(client.path, self.path)
+        self.assertIsNone(client.port)
+        self.assertIsNone(client.resolver)
+        self.assertIsInstance(client.connection, UnixStreamConnection)
+        self.assertEqual(client.connection.path, self.path)
+        self.assertFalse(client.connection.connected)
+
+    def test_send_metrics(self):
+        self.receive()
+        client = UnixStreamClient(self.path, "region.")
+        client.increment("event")
+        client.set("user", "first")
+        self.assertTrue(client.connection.connected)
+        client.connection.close()
+        self.assertEqual(self.wait_for_server(), b"region.event:1|c\nregion.user:first|s\n")
+
+    def test_batch_client_flush(self):
+        self.receive()
+        client = UnixStreamClient(self.path).batch_client(16)
+        self.assertIsInstance(client, UnixStreamBatchClient)
+        self.assertIsInstance(client.unit_client(), UnixStreamClient)
+        client.increment("event")
+        client.timing("query", 3)
+        client.decrement("larger.than.the.batch")
+        client.flush()
+        client.connection.close()
+        self.assertEqual(self.wait_for_server(),
+                         b"event:1|c\nquery:3|ms\nlarger.than.the.batch:-1|c\n")
+
+    def test_retry_buffer_is_sent_when_server_is_listening(self):
+        client = UnixStreamBatchClient(self.path + ".missing")
+        client.increment("event")
+        client.flush()
+        self.assertFalse(client.connection.connected)
+        self.assertEqual(client.connection.errors, 1)
+        self.assertEqual(client.connection.retry_buffer_used, len(b"event:1|c\n"))
+
+        os.rename(self.path, self.path + ".missing")
+        self.receive()
+        self.assertTrue(client.connection.connect())
+        client.increment("second")
+        client.flush()
+        client.connection.close()
+        self.assertEqual(self.wait_for_server(), b"event:1|c\nsecond:1|c\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
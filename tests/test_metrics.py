@@ -9,12 +9,24 @@ https://opensource.org/licenses/MIT.
 """
 
 import unittest
+from random import Random
+from re import sub
 
 from statsdmetrics import (Counter, Timer,
                            Gauge, Set, GaugeDelta,
                            normalize_metric_name,
-                           parse_metric_from_request
+                           parse_metric_from_request,
+                           parse_metrics,
+                           normalize_tags
                            )
+from statsdmetrics.metrics import normalize_metric_name_regex_subs, unichr
+
+
+def normalize_metric_name_multi_pass(name):
+    """Reference implementation of normalizing names, using multiple regex passes"""
+    for regex, replacement in normalize_metric_name_regex_subs:
+        name = sub(regex, replacement, name)
+    return name
 
 
 class TestMetrics(unittest.TestCase):
@@ -24,6 +36,10 @@ class TestMetrics(unittest.TestCase):
             normalize_metric_name("metric.good.name")
         )
 
+    def test_normalize_metric_names_keeps_type_of_names(self):
+        self.assertIsInstance(normalize_metric_name("metric name"), str)
+        self.assertIsInstance(normalize_metric_name(u"metric name"), type(u""))
+
     def test_normalize_metric_names_replaces_spaces(self):
         self.assertEqual(
             "metric_name_with_spaces",
@@ -42,6 +58,36 @@ class TestMetrics(unittest.TestCase):
             normalize_metric_name("#+name?with~invalid!chars(and)all*&")
         )
 
+    def test_normalize_metric_names_collapses_white_spaces(self):
+        self.assertEqual(
+            "metric_name__with-tabs",
+            normalize_metric_name("metric \t name \n!\r with/tabs")
+        )
+
+    def test_normalize_metric_names_handles_unicode(self):
+        self.assertEqual(
+            u"m\u00e9tric_\u043d\u0430me-x",
+            normalize_metric_name(u"m\u00e9tric\u3000\u043d\u0430me\\x\u2603")
+        )
+
+    def test_normalize_metric_names_matches_multi_pass_normalization(self):
+        random = Random(8125)
+        alphabet = u" \t\n\r\x0b\x0c\x1c\x00/\\.-_!@#:|aZ09\u00a0\u2028\u3000\u00e9\u0660\u2603"
+        for _ in range(5000):
+            length = random.randint(0, 24)
+            chars = []
+            for __ in range(length):
+                if random.random() < 0.7:
+                    chars.append(random.choice(alphabet))
+                else:
+                    chars.append(unichr(random.randint(1, 0x2fff)))
+            name = u"".join(chars)
+            self.assertEqual(
+                normalize_metric_name_multi_pass(name),
+                normalize_metric_name(name),
+                "normalizing {!r} is different from multi pass normalization".format(name)
+            )
+
     def test_parse_metric_from_request_requires_string(self):
         self.assertRaises(AssertionError, parse_metric_from_request, 10)
         self.assertRaises(AssertionError, parse_metric_from_request, 2.2)
@@ -206,6 +252,135 @@ class TestMetrics(unittest.TestCase):
         self.assertRaises(
             ValueError, parse_metric_from_request, "invalid_rate:-2.8|g@_")
 
+    def test_parse_metrics_from_payload(self):
+        payload = b"sales:10|c\ndb query?:2.4|ms|@0.5\ncpu:45.3|g\nmem:-2048|g\nhost:127.0.0.1|s\n"
+        self.assertEqual(
+            [Counter("sales", 10), Timer("db query?", 2.4, 0.5), Gauge("cpu", 45.3),
+             GaugeDelta("mem", -2048), Set("host", "127.0.0.1")],
+            list(parse_metrics(payload))
+        )
+        self.assertEqual([Counter("sales", 2, 0.2)], list(parse_metrics(u"sales:2|c|@0.2")))
+        self.assertEqual([], list(parse_metrics(b"")))
+
+    def test_parse_metrics_matches_parse_metric_from_request(self):
+        requests = ["sales:10|c", "with rate?:0|c|@1", "float_rate:345|c|@0.2",
+                    "exact:1|ms", "db_query_float_rate:23.5|ms|@0.5", "cpu_usage:45.3|g",
+                    "mem usage?:-2048|g|@1", "delta:+23.3|g|@0.5", "host:127.0.0.1|s",
+                    " spaced name :4|c"]
+        for request in requests:
+            expected = parse_metric_from_request(request)
+            metrics = list(parse_metrics(request.encode()))
+            self.assertEqual(1, len(metrics))
+            self.assertEqual(type(expected), type(metrics[0]))
+            self.assertEqual(expected, metrics[0])
+            self.assertEqual(expected.to_request(), metrics[0].to_request())
+
+    def test_parse_metrics_with_multiple_values(self):
+        self.assertEqual(
+            [Timer("query", 1), Timer("query", 2.5), Timer("query", 3, 0.5), Counter("event", 2)],
+            list(parse_metrics(b"query:1|ms:2.5|ms:3|ms|@0.5\nevent:2|c"))
+        )
+
+    def test_parse_metrics_skips_malformed_lines(self):
+        payload = (b"sales:10|c\ninvalid_request\nmissing_type:2|\nfloat_counter:2.2|c\n"
+                   b"negative_timer:-2|ms\ninvalid_rate:2|c|@0\n:2|c\nquery:1|ms:x|ms\n"
+                   b"bad\xffname:1|c\nevent:1|c")
+        self.assertEqual([Counter("sales", 10), Counter("event", 1)], list(parse_metrics(payload)))
+
+    def test_parse_metrics_collects_malformed_lines(self):
+        errors = []
+        metrics = parse_metrics(b"sales:10|c\n\ninvalid_type:2|X\nquery:1|ms:x|ms\nevent:1|c\n", errors)
+        self.assertEqual([], errors)
+        self.assertEqual([Counter("sales", 10), Counter("event", 1)], list(metrics))
+        self.assertEqual(["invalid_type:2|X", "query:1|ms:x|ms"], [line for line, _ in errors])
+        for _, error in errors:
+            self.assertIsInstance(error, ValueError)
+
+        errors = []
+        self.assertEqual(
+            [Counter("event", 1)],
+            list(parse_metrics(b"bad\xffname:1|c\nevent:1|c", errors))
+        )
+        self.assertEqual(1, len(errors))
+        self.assertIsInstance(errors[0][1], ValueError)
+
+    def test_normalize_tags(self):
+        self.assertEqual((), normalize_tags(None))
+        self.assertEqual((), normalize_tags({}))
+        self.assertEqual(("env:prod",), normalize_tags("env:prod"))
+        self.assertEqual(("canary", "env:prod", "region:eu"),
+                         normalize_tags({"region": "eu", "env": "prod", "canary": None}))
+        self.assertEqual(("a:1", "b"), normalize_tags(["b", "a:1", "b", ""]))
+        self.assertEqual(("a_b_c_d",), normalize_tags(["a|b,c\nd"]))
+        self.assertRaises(AssertionError, normalize_tags, [1])
+
+    def test_metrics_with_tags(self):
+        counter = Counter("event", 2, 0.5, {"env": "prod", "canary": None})
+        self.assertEqual(("canary", "env:prod"), counter.tags)
+        self.assertEqual("event:2|c|@0.5|#canary,env:prod", counter.to_request())
+        self.assertEqual("query:10|ms|#a:b", Timer("query", 10, tags=["a:b"]).to_request())
+        self.assertEqual("memory:1024|g|#a", Gauge("memory", 1024, tags="a").to_request())
+        self.assertEqual("users:first|s|#a", Set("users", "first", tags=("a",)).to_request())
+        self.assertEqual("memory:-128|g|#a", GaugeDelta("memory", -128, tags=["a"]).to_request())
+        self.assertEqual((), Counter("event").tags)
+        self.assertEqual("event:0|c", Counter("event").to_request())
+        self.assertEqual(Counter("event", 1, tags=["b", "a"]), Counter("event", 1, tags=["a", "b"]))
+        self.assertNotEqual(Counter("event", 1, tags=["a"]), Counter("event", 1))
+        self.assertNotEqual(Timer("query", 1, tags=["a"]), Timer("query", 1, tags=["b"]))
+
+    def test_parse_metric_with_tags_from_request(self):
+        self.assertEqual(
+            Counter("event", 2, 0.5, ["env:prod", "canary"]),
+            parse_metric_from_request("event:2|c|@0.5|#env:prod,canary")
+        )
+        self.assertEqual(
+            Counter("event", 2, 0.5, ["env:prod", "canary"]),
+            parse_metric_from_request("event:2|c|#env:prod,canary|@0.5")
+        )
+        self.assertEqual(
+            GaugeDelta("memory", -128, 1, ["url:http://host"]),
+            parse_metric_from_request("memory:-128|g|#url:http://host")
+        )
+        self.assertEqual(
+            ("a:b:c", "d"),
+            parse_metric_from_request("users:first|s|#d,a:b:c").tags
+        )
+        self.assertRaises(ValueError, parse_metric_from_request, "event:2|c|x")
+        self.assertRaises(ValueError, parse_metric_from_request, "event:2|c:3|c")
+
+    def test_parse_metrics_with_tags(self):
+        self.assertEqual(
+            [Counter("event", 2, 0.5, ["a:b", "c"]), Timer("query", 1, 1, ["a:b"]),
+             Timer("query", 2.5, 1, ["a:b"]), Counter("plain", 1)],
+            list(parse_metrics(b"event:2|c|#c,a:b|@0.5\nquery:1|ms:2.5|ms|#a:b\nplain:1|c"))
+        )
+        for request in ("event:2|c|@0.5|#a:b,c", "query:1.5|ms|#url:http://host", "host:1.2.3.4|s|#a"):
+            metrics = list(parse_metrics(request))
+            self.assertEqual([parse_metric_from_request(request)], metrics)
+            self.assertEqual(request, metrics[0].to_request())
+
+    def test_parse_metrics_tags_are_aggregatable(self):
+        metrics = list(parse_metrics(b"event:1|c|#b,a\nevent:1|c|#a,b\nevent:1|c|#a"))
+        keys = set((metric.name, metric.tags) for metric in metrics)
+        self.assertEqual({("event", ("a", "b")), ("event", ("a",))}, keys)
+
+    def test_metrics_have_no_instance_dict(self):
+        metrics = (Counter("event", 2), Timer("query", 10), Gauge("memory", 1024),
+                   Set("users", "first"), GaugeDelta("memory", -128))
+        for metric in metrics:
+            self.assertFalse(hasattr(metric, '__dict__'))
+            self.assertRaises(AttributeError, setattr, metric, 'other', 1)
+
+    def test_create_metrics_from_trusted_data(self):
+        self.assertEqual(Counter("event", 2, 0.5), Counter._from_trusted("event", 2, 0.5))
+        self.assertEqual(Timer("query", 10), Timer._from_trusted("query", 10))
+        self.assertEqual(Gauge("memory", 1024.5, 0.2), Gauge._from_trusted("memory", 1024.5, 0.2))
+        self.assertEqual(Set("users", "first"), Set._from_trusted("users", "first"))
+        self.assertEqual(GaugeDelta("memory", -128), GaugeDelta._from_trusted("memory", -128))
+        self.assertEqual("event:2|c|@0.5", Counter._from_trusted("event", 2, 0.5).to_request())
+        self.assertEqual(Counter("event", 2, 1, ["a"]), Counter._from_trusted("event", 2, 1, ("a",)))
+        self.assertIsInstance(Counter._from_trusted("event", 2), Counter)
+
 
 class TestCounter(unittest.TestCase):
     def test_counter_constructor(self):
@@ -0,0 +1,305 @@
+"""
+tests.test_server
+-----------------
+unittests for statsdmetrics.server package
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import io
+import socket
+import unittest
+from threading import Thread
+from time import sleep, time
+
+from statsdmetrics import Counter, Timer, Gauge, GaugeDelta, Set
+from statsdmetrics.server import Server, MemoryBackend, StreamBackend, AbstractBackend
+from statsdmetrics.server.aggregation import Aggregator, Aggregates, TimerSamples, Summary
+from statsdmetrics.server.backends import format_key
+from . import BaseTestCase
+
+
+class CustomCounter(Counter):
+    pass
+
+
+def wait_for(condition, timeout=2):
+    deadline = time() + timeout
+    while not condition() and time() < deadline:
+        sleep(0.005)
+
+
+class TestTimerSamples(BaseTestCase):
+
+    def test_stats(self):
+        timer = TimerSamples()
+        for value in range(1, 101):
+            timer.add(float(value))
+        timer.add(50, 0.5)
+        self.assertEqual(len(timer), 101)
+        stats = timer.stats((50, 90, 99.9))
+        self.assertEqual(stats['count'], 102)
+        self.assertEqual(stats['samples'], 101)
+        self.assertEqual(stats['sum'], 5100)
+        self.assertEqual(stats['min'], 1)
+        self.assertEqual(stats['max'], 100)
+        self.assertAlmostEqual(stats['mean'], 5100 / 101.0)
+        self.assertEqual(stats['p50'], 50)
+        self.assertEqual(stats['p90'], 90)
+        self.assertEqual(stats['p99.9'], 100)
+
+    def test_stats_of_no_samples(self):
+        stats = TimerSamples().stats((50,))
+        self.assertEqual(stats, {'count': 0, 'samples': 0, 'sum': 0, 'min': 0, 'max': 0, 'mean': 0, 'p50': 0})
+
+    def test_merge(self):
+        first = TimerSamples()
+        first.add(1)
+        second = TimerSamples()
+        second.add(3, 0.5)
+        self.assertIs(first.merge(second), first)
+        self.assertEqual(first.values, [1, 3])
+        self.assertEqual(first.count, 3)
+
+
+class TestAggregates(BaseTestCase):
+
+    def test_add_metrics(self):
+        aggregates = Aggregates()
+        aggregates.add(Counter("event", 2))
+        aggregates.add(Counter("event", 1, 0.5))
+        aggregates.add(Counter("event", 1, tags=["a"]))
+        aggregates.add(Timer("query", 10))
+        aggregates.add(Gauge("memory", 10))
+        aggregates.add(GaugeDelta("memory", -2))
+        aggregates.add(GaugeDelta("cpu", 3))
+        aggregates.add(Set("users", "first"))
+        aggregates.add(Set("users", "first"))
+        self.assertEqual(aggregates.counters, {("event", ()): 4, ("event", ("a",)): 1})
+        self.assertEqual(aggregates.gauges[("memory", ())][:2], [10, -2])
+        self.assertEqual(aggregates.gauges[("cpu", ())][:2], [None, 3])
+        self.assertEqual(aggregates.sets, {("users", ()): {"first"}})
+        self.assertEqual(aggregates.timers[("query", ())].values, [10])
+        self.assertEqual(aggregates.metrics, 9)
+        self.assertEqual(len(aggregates), 6)
+        self.assertRaises(ValueError, aggregates.add, CustomCounter("event", 1))
+
+    def test_merge(self):
+        first = Aggregates()
+        first.add(Counter("event", 2))
+        first.add(Timer("query", 10))
+        first.add(Set("users", "first"))
+        first.add(Gauge("memory", 10))
+        first.add(GaugeDelta("cpu", 1))
+        second = Aggregates()
+        second.add(Counter("event", 3))
+        second.add(Counter("other", 1))
+        second.add(Timer("query", 20))
+        second.add(Set("users", "second"))
+        second.add(Set("users", "first"))
+        second.add(GaugeDelta("memory", 5))
+        second.add(GaugeDelta("cpu", 2))
+        self.assertIs(first.merge(second), first)
+        self.assertEqual(first.counters, {("event", ()): 5, ("other", ()): 1})
+        self.assertEqual(first.timers[("query", ())].values, [10, 20])
+        self.assertEqual(first.sets[("users", ())], {"first", "second"})
+        self.assertEqual(first.gauges[("memory", ())][:2], [10, 5])
+        self.assertEqual(first.gauges[("cpu", ())][:2], [None, 3])
+        self.assertEqual(first.metrics, 12)
+
+    def test_merge_gauges_keeps_the_last_value(self):
+        first = Aggregates()
+        first.gauges[("memory", ())] = [10, 1, 100.0]
+        second = Aggregates()
+        second.gauges[("memory", ())] = [20, 2, 200.0]
+        first.merge(second)
+        self.assertEqual(first.gauges[("memory", ())], [20, 2, 200.0])
+        older = Aggregates()
+        older.gauges[("memory", ())] = [5, 1, 50.0]
+        first.merge(older)
+        self.assertEqual(first.gauges[("memory", ())], [20, 2, 200.0])
+        deltas = Aggregates()
+        deltas.gauges[("memory", ())] = [None, -4, 0]
+        self.assertEqual(deltas.merge(first).gauges[("memory", ())], [20, -2, 200.0])
+
+
+class TestAggregator(BaseTestCase):
+
+    def test_add_payload_and_flush(self):
+        aggregator = Aggregator(percentiles=(50, 90))
+        self.assertEqual(aggregator.percentiles, (50, 90))
+        added = aggregator.add_payload(
+            b"event:1|c\nevent:2|c|@0.5\nquery:10|ms:20|ms|#a:b\nmemory:10|g\nmemory:-3|g\n"
+            b"users:1|s\nusers:2|s\nusers:1|s\nbad line\nevent:x|c\n"
+        )
+        self.assertEqual(added, 9)
+        self.assertEqual(aggregator.bad_lines, 2)
+        self.assertEqual(aggregator.aggregates.metrics, 9)
+        summary = aggregator.flush()
+        self.assertIsInstance(summary, Summary)
+        self.assertEqual(summary.metrics, 9)
+        self.assertEqual(summary.counters, {("event", ()): 5})
+        self.assertEqual(summary.gauges, {("memory", ()): 7})
+        self.assertEqual(summary.sets, {("users", ()): 2})
+        stats = summary.timers[("query", ("a:b",))]
+        self.assertEqual(stats['count'], 2)
+        self.assertEqual(stats['p50'], 10)
+        self.assertEqual(stats['p90'], 20)
+        self.assertGreaterEqual(summary.interval, 0)
+        self.assertEqual(len(aggregator.aggregates), 0)
+
+    def test_gauges_are_kept_between_flushes(self):
+        aggregator = Aggregator()
+        aggregator.add(Gauge("memory", 10))
+        aggregator.flush()
+        aggregator.add(GaugeDelta("memory", 5))
+        self.assertEqual(aggregator.flush().gauges, {("memory", ()): 15})
+        self.assertEqual(aggregator.flush().gauges, {("memory", ()): 15})
+        aggregator = Aggregator(delete_gauges=True)
+        aggregator.add(Gauge("memory", 10))
+        self.assertEqual(aggregator.flush().gauges, {("memory", ()): 10})
+        self.assertEqual(aggregator.flush().gauges, {})
+
+    def test_take_and_merge(self):
+        worker = Aggregator()
+        worker.add_payload(b"event:1|c")
+        aggregates = worker.take()
+        self.assertEqual(aggregates.counters, {("event", ()): 1})
+        self.assertEqual(worker.flush().counters, {})
+        coordinator = Aggregator()
+        coordinator.add_payload(b"event:2|c")
+        coordinator.merge(aggregates)
+        self.assertEqual(coordinator.flush().counters, {("event", ()): 3})
+
+    def test_percentiles_should_be_valid(self):
+        self.assertRaises(AssertionError, Aggregator, (0,))
+        self.assertRaises(AssertionError, Aggregator, (101,))
+
+    def test_counter_rates(self):
+        summary = Summary(0, 2, {("event", ()): 10}, {}, {}, {}, 10)
+        self.assertEqual(summary.counter_rates, {("event", ()): 5})
+        summary.interval = 0
+        self.assertEqual(summary.counter_rates, {("event", ()): 10})
+
+
+class TestBackends(BaseTestCase):
+
+    def test_format_key(self):
+        self.assertEqual(format_key(("event", ())), "event")
+        self.assertEqual(format_key(("event", ("a:b:c", "d"))), "event;a=b:c;d")
+
+    def test_memory_backend(self):
+        backend = MemoryBackend(2)
+        self.assertIsNone(backend.last)
+        summaries = [Summary(index, 1, {}, {}, {}, {}, 0) for index in range(3)]
+        for summary in summaries:
+            backend.flush(summary)
+        self.assertEqual(backend.summaries, summaries[1:])
+        self.assertIs(backend.last, summaries[2])
+        self.assertRaises(AssertionError, MemoryBackend, 0)
+
+    def test_stream_backend(self):
+        stream = io.StringIO()
+        backend = StreamBackend(stream, prefix="stats.")
+        self.assertEqual(backend.prefix, "stats.")
+        summary = Summary(
+            1000.5, 2,
+            {("event", ("a:b",)): 4}, {("memory", ()): 10.5}, {("users", ()): 3},
+            {("query", ()): {'count': 1, 'max': 10}}, 6
+        )
+        backend.flush(summary)
+        self.assertEqual(stream.getvalue().splitlines(), [
+            "stats.counters.event;a=b.count 4 1000",
+            "stats.counters.event;a=b.rate 2 1000",
+            "stats.gauges.memory 10.5 1000",
+            "stats.sets.users.count 3 1000",
+            "stats.timers.query.count 1 1000",
+            "stats.timers.query.max 10 1000",
+        ])
+
+
+class FailingBackend(AbstractBackend):
+    def flush(self, summary):
+        raise RuntimeError("backend failed")
+
+
+class TestServer(BaseTestCase):
+
+    def setUp(self):
+        self.backend = MemoryBackend()
+        self.server = Server(backends=[FailingBackend(), self.backend], port=0, tcp_port=0,
+                             flush_interval=60000)
+        self.addCleanup(self.server.close)
+
+    def start(self):
+        thread = Thread(target=self.server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.shutdown)
+        wait_for(lambda: self.server.running)
+        return thread
+
+    def test_init_and_properties(self):
+        self.assertEqual(self.server.address[0], "127.0.0.1")
+        self.assertGreater(self.server.address[1], 0)
+        self.assertGreater(self.server.tcp_address[1], 0)
+        self.assertEqual(self.server.flush_interval, 60000)
+        self.assertEqual(len(self.server.backends), 2)
+        self.assertIsInstance(self.server.aggregator, Aggregator)
+        self.assertFalse(self.server.running)
+        self.assertRaises(AssertionError, Server, port=0, flush_interval=0)
+        with Server(port=0) as server:
+            self.assertIsNone(server.tcp_address)
+
+    def test_receive_datagrams(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(sock.close)
+        sock.sendto(b"event:1|c\nquery:10|ms", self.server.address)
+        sock.sendto(b"event:2|c\nbad", self.server.address)
+        self.server.serve(200)
+        self.assertEqual(self.server.datagrams, 2)
+        self.assertEqual(self.server.aggregator.bad_lines, 1)
+        summary = self.server.flush()
+        self.assertEqual(summary.counters, {("event", ()): 3})
+        self.assertIs(self.backend.last, summary)
+        self.assertEqual(self.server.backend_errors, 1)
+
+    def test_receive_tcp_streams(self):
+        thread = self.start()
+        connection = socket.create_connection(self.server.tcp_address)
+        connection.sendall(b"event:1|c\nque")
+        sleep(0.05)
+        connection.sendall(b"ry:10|ms\nevent:2|c")
+        connection.close()
+        wait_for(lambda: self.server.aggregator.aggregates.metrics >= 3)
+        self.server.shutdown()
+        thread.join()
+        self.assertEqual(self.backend.last.counters, {("event", ()): 3})
+        self.assertEqual(self.backend.last.timers[("query", ())]["max"], 10)
+
+    def test_flush_every_interval(self):
+        self.server._flush_interval = 50
+        self.start()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(sock.close)
+        sock.sendto(b"event:1|c", self.server.address)
+        wait_for(lambda: len(self.backend.summaries) >= 2)
+        self.assertGreaterEqual(len(self.backend.summaries), 2)
+        self.assertEqual(sum(summary.metrics for summary in self.backend.summaries), 1)
+
+    def test_shutdown_flushes(self):
+        thread = self.start()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(sock.close)
+        sock.sendto(b"event:1|c", self.server.address)
+        wait_for(lambda: self.server.datagrams >= 1)
+        self.server.shutdown()
+        thread.join()
+        self.assertFalse(self.server.running)
+        self.assertEqual(self.backend.last.counters, {("event", ()): 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+tests.test_server_aio
+---------------------
+unittests for statsdmetrics.server.aio module
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import sys
+import socket
+import unittest
+
+from . import BaseTestCase
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    from statsdmetrics.server import MemoryBackend
+    from statsdmetrics.server.aio import AsyncServer
+
+requires_asyncio = unittest.skipIf(
+    sys.version_info < (3, 7), "asyncio servers are tested on Python 3.7+")
+
+
+async def wait_for(condition, timeout=2):
+    loop = asyncio.get_event_loop()
+    deadline = loop.time() + timeout
+    while not condition() and loop.time() < deadline:
+        await asyncio.sleep(0.005)
+
+
+@requires_asyncio
+class TestAsyncServer(BaseTestCase):
+
+    def test_init(self):
+        server = AsyncServer(port=0, flush_interval=1000)
+        self.assertIsNone(server.address)
+        self.assertIsNone(server.tcp_address)
+        self.assertFalse(server.running)
+        self.assertEqual(server.flush_interval, 1000)
+        self.assertRaises(AssertionError, AsyncServer, port=0, flush_interval=-1)
+
+    def test_receive_datagrams_and_streams(self):
+        backend = MemoryBackend()
+
+        async def run():
+            async with AsyncServer(backends=[backend], port=0, tcp_port=0, flush_interval=60000) as server:
+                self.assertTrue(server.running)
+                sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                sock.sendto(b"event:1|c\nquery:10|ms", server.address)
+                sock.close()
+                reader, writer = await asyncio.open_connection(*server.tcp_address)
+                writer.write(b"event:2|c\nusers:a|s\nmem")
+                await writer.drain()
+                await asyncio.sleep(0.05)
+                writer.write(b"ory:5|g")
+                writer.close()
+                await wait_for(lambda: server.aggregator.aggregates.metrics >= 5)
+                self.assertEqual(server.datagrams, 1)
+            self.assertFalse(server.running)
+            await server.close()
+
+        asyncio.run(run())
+        summary = backend.last
+        self.assertEqual(summary.counters, {("event", ()): 3})
+        self.assertEqual(summary.gauges, {("memory", ()): 5})
+        self.assertEqual(summary.sets, {("users", ()): 1})
+        self.assertEqual(summary.timers[("query", ())]["max"], 10)
+
+    def test_flush_periodically(self):
+        backend = MemoryBackend()
+
+        async def run():
+            server = AsyncServer(backends=[backend], port=0, flush_interval=20)
+            serving = asyncio.ensure_future(server.serve_forever())
+            await wait_for(lambda: server.address is not None)
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.sendto(b"event:1|c", server.address)
+            sock.close()
+            await wait_for(lambda: len(backend.summaries) >= 2)
+            await server.close()
+            await serving
+
+        asyncio.run(run())
+        self.assertGreaterEqual(len(backend.summaries), 3)
+        self.assertEqual(sum(summary.metrics for summary in backend.summaries), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+tests.test_server_multiprocess
+------------------------------
+unittests for statsdmetrics.server.multiprocess module
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import socket
+import unittest
+from threading import Thread
+from time import sleep, time
+
+from statsdmetrics.server import MemoryBackend
+from statsdmetrics.server.aggregation import Aggregator
+from statsdmetrics.server.multiprocess import MultiProcessServer
+from . import BaseTestCase
+
+requires_reuse_port = unittest.skipUnless(
+    hasattr(socket, 'SO_REUSEPORT'), "SO_REUSEPORT is not supported")
+
+
+def send_from_clients(address, payloads):
+    # each client socket is kept on one worker, so use many to reach all the workers
+    for payload in payloads:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.sendto(payload, address)
+        sock.close()
+
+
+@requires_reuse_port
+class TestMultiProcessServer(BaseTestCase):
+
+    def setUp(self):
+        self.backend = MemoryBackend()
+        self.server = MultiProcessServer(
+            Aggregator(percentiles=(50, 99)), [self.backend], port=0, tcp_port=0,
+            flush_interval=60000, workers=3)
+        self.addCleanup(self.server.close)
+
+    def wait_for_datagrams(self, count, timeout=5):
+        # the workers report the datagrams on flush, so keep merging
+        deadline = time() + timeout
+        while self.server.datagrams < count and time() < deadline:
+            self.server._collect("take")
+            sleep(0.01)
+
+    def test_init(self):
+        self.assertEqual(self.server.workers, 3)
+        self.assertIsNone(self.server.address)
+        self.assertFalse(self.server.running)
+        self.assertRaises(AssertionError, MultiProcessServer, port=0, workers=0)
+        self.assertGreater(MultiProcessServer(port=0).workers, 0)
+
+    def test_merge_metrics_of_workers(self):
+        self.server.start()
+        self.assertTrue(self.server.running)
+        self.assertGreater(self.server.address[1], 0)
+        self.assertGreater(self.server.tcp_address[1], 0)
+        payloads = [
+            "event:1|c\nevent:1|c|@0.5|#a:b\nquery:{0}|ms\nusers:{1}|s\nbad".format(index, index % 40).encode()
+            for index in range(1, 101)
+        ]
+        send_from_clients(self.server.address, payloads)
+        connection = socket.create_connection(self.server.tcp_address)
+        connection.sendall(b"event:10|c\nmemory:5|g\nmemory:+3|g\n")
+        connection.close()
+        self.wait_for_datagrams(100)
+        summary = self.server.flush()
+        self.assertIs(self.backend.last, summary)
+        self.assertEqual(self.server.datagrams, 100)
+        self.assertEqual(self.server.bad_lines, 100)
+        self.assertEqual(summary.counters, {("event", ()): 110, ("event", ("a:b",)): 200})
+        self.assertEqual(summary.sets, {("users", ()): 40})
+        self.assertEqual(summary.gauges, {("memory", ()): 8})
+        stats = summary.timers[("query", ())]
+        self.assertEqual(stats["count"], 100)
+        self.assertEqual(stats["sum"], 5050)
+        self.assertEqual(stats["min"], 1)
+        self.assertEqual(stats["max"], 100)
+        self.assertEqual(stats["p50"], 50)
+        self.assertEqual(stats["p99"], 99)
+
+    def test_gauges_of_a_client_keep_order(self):
+        self.server.start()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(sock.close)
+        for value in range(1, 21):
+            sock.sendto("memory:{}|g".format(value).encode(), self.server.address)
+        self.wait_for_datagrams(20)
+        sock.sendto(b"memory:-5|g", self.server.address)
+        self.wait_for_datagrams(21)
+        self.assertEqual(self.server.flush().gauges, {("memory", ()): 15})
+
+    def test_serve_forever_flushes_on_shutdown(self):
+        self.server.start()
+        send_from_clients(self.server.address, [b"event:1|c"] * 20)
+        thread = Thread(target=self.server.serve_forever)
+        thread.start()
+        sleep(0.2)
+        self.server.shutdown()
+        thread.join()
+        self.assertFalse(self.server.running)
+        self.assertEqual(self.backend.last.counters, {("event", ()): 20})
+
+    def test_start_fails_if_workers_can_not_bind(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.addCleanup(sock.close)
+        sock.bind(("127.0.0.1", 0))
+        server = MultiProcessServer(port=sock.getsockname()[1], workers=2)
+        self.assertRaises(socket.error, server.start)
+        self.assertFalse(server.running)
+
+
+if __name__ == "__main__":
+    unittest.main()
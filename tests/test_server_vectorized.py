@@ -0,0 +1,162 @@
+"""
+tests.test_server_vectorized
+----------------------------
+unittests for statsdmetrics.server.vectorized module
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import pickle
+import random
+import unittest
+from array import array
+
+try:
+    import unittest.mock as mock
+except ImportError:
+    import mock
+
+from statsdmetrics import Timer
+from statsdmetrics.sketches import DDSketch
+from statsdmetrics.server.aggregation import Aggregator, TimerSamples
+from statsdmetrics.server.vectorized import (ArrayTimerSamples, VectorizedAggregator,
+                                             summarize_timers, numpy_available)
+from . import BaseTestCase
+
+requires_numpy = unittest.skipUnless(numpy_available, "NumPy is not installed")
+
+
+def create_timers(timer_factory, names=20, samples=500):
+    generator = random.Random(5)
+    timers = {}
+    for index in range(names * samples):
+        key = ("timer{}".format(index % names), ())
+        timer = timers.get(key)
+        if timer is None:
+            timer = timers[key] = timer_factory()
+        timer.add(generator.randint(0, 10000) / 10.0, generator.choice((1, 1, 0.5)))
+    return timers
+
+
+class TestArrayTimerSamples(BaseTestCase):
+
+    def test_add_and_merge(self):
+        timer = ArrayTimerSamples()
+        self.assertEqual(timer.values, array('d'))
+        timer.add(10)
+        timer.add(20, 0.5)
+        self.assertEqual(timer.values, array('d', [10, 20]))
+        self.assertEqual(timer.count, 3)
+        self.assertEqual(len(timer), 2)
+        other = TimerSamples()
+        other.add(5)
+        self.assertIs(timer.merge(other), timer)
+        self.assertEqual(timer.values, array('d', [10, 20, 5]))
+        self.assertEqual(timer.count, 4)
+
+    def test_stats(self):
+        timer = ArrayTimerSamples()
+        timer.add(10)
+        timer.add(30)
+        timer.add(20)
+        self.assertEqual(timer.stats((50,)), {
+            'count': 3, 'samples': 3, 'sum': 60, 'min': 10, 'max': 30, 'mean': 20, 'p50': 20})
+
+    def test_pickle(self):
+        timer = ArrayTimerSamples()
+        timer.add(10, 0.5)
+        copy = pickle.loads(pickle.dumps(timer, 2))
+        self.assertEqual(copy.values, array('d', [10]))
+        self.assertEqual(copy.count, 2)
+
+
+@requires_numpy
+class TestSummarizeTimers(BaseTestCase):
+
+    def assertSummariesEqual(self, summaries, expected):
+        self.assertEqual(set(summaries), set(expected))
+        for key, stats in expected.items():
+            self.assertEqual(set(summaries[key]), set(stats))
+            for name, value in stats.items():
+                self.assertAlmostEqual(summaries[key][name], value, places=6)
+
+    def test_same_as_timer_samples_stats(self):
+        percentiles = (1, 50, 90, 99, 99.9, 100)
+        timers = create_timers(ArrayTimerSamples)
+        expected = dict((key, timer.stats(percentiles)) for key, timer in timers.items())
+        self.assertSummariesEqual(summarize_timers(timers, percentiles), expected)
+
+    def test_timers_with_lists_of_values(self):
+        timers = create_timers(TimerSamples, names=3, samples=10)
+        expected = dict((key, timer.stats()) for key, timer in timers.items())
+        self.assertSummariesEqual(summarize_timers(timers), expected)
+
+    def test_single_and_empty_timers(self):
+        single = ArrayTimerSamples()
+        single.add(7)
+        empty = ArrayTimerSamples()
+        summaries = summarize_timers({("single", ()): single, ("empty", ()): empty}, (50, 99))
+        self.assertEqual(summaries[("single", ())], {
+            'count': 1, 'samples': 1, 'sum': 7, 'min': 7, 'max': 7, 'mean': 7, 'p50': 7, 'p99': 7})
+        self.assertEqual(summaries[("empty", ())], empty.stats((50, 99)))
+        self.assertEqual(summarize_timers({}), {})
+
+    def test_buffers_of_timers_are_not_changed(self):
+        timer = ArrayTimerSamples()
+        timer.add(3)
+        timer.add(1)
+        timer.add(2)
+        summarize_timers({("timer", ()): timer})
+        self.assertEqual(timer.values, array('d', [3, 1, 2]))
+
+    def test_requires_numpy(self):
+        with mock.patch("statsdmetrics.server.vectorized.numpy", None):
+            self.assertRaises(NotImplementedError, summarize_timers, {})
+
+
+class TestVectorizedAggregator(BaseTestCase):
+
+    def create_aggregators(self, **kwargs):
+        aggregator = Aggregator(percentiles=(50, 90, 99), **kwargs)
+        vectorized = VectorizedAggregator(percentiles=(50, 90, 99), **kwargs)
+        generator = random.Random(9)
+        for index in range(5000):
+            timer = Timer("timer{}".format(index % 50), generator.randint(0, 2000), generator.choice((1, 0.1)))
+            aggregator.add(timer)
+            vectorized.add(timer)
+        return aggregator, vectorized
+
+    def assertSameTimers(self, expected, summaries):
+        self.assertEqual(set(summaries), set(expected))
+        for key, stats in expected.items():
+            for name, value in stats.items():
+                self.assertAlmostEqual(summaries[key][name], value, places=6)
+
+    def test_timer_factory(self):
+        aggregator = VectorizedAggregator()
+        aggregator.add_payload(b"timer:10|ms")
+        self.assertIsInstance(aggregator.aggregates.timers[("timer", ())], ArrayTimerSamples)
+
+    @requires_numpy
+    def test_summarize_timers_with_numpy(self):
+        aggregator, vectorized = self.create_aggregators()
+        expected = aggregator.flush().timers
+        with mock.patch("statsdmetrics.server.aggregation.TimerSamples.stats") as stats:
+            summaries = vectorized.flush().timers
+        stats.assert_not_called()
+        self.assertSameTimers(expected, summaries)
+
+    def test_summarize_timers_without_numpy(self):
+        aggregator, vectorized = self.create_aggregators()
+        with mock.patch("statsdmetrics.server.vectorized.numpy", None):
+            self.assertSameTimers(aggregator.flush().timers, vectorized.flush().timers)
+
+    def test_summarize_timers_of_other_factories(self):
+        aggregator, vectorized = self.create_aggregators(timer_factory=DDSketch)
+        self.assertSameTimers(aggregator.flush().timers, vectorized.flush().timers)
+
+
+if __name__ == "__main__":
+    unittest.main()
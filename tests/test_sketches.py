@@ -0,0 +1,247 @@
+"""
+tests.test_sketches
+-------------------
+unittests for statsdmetrics.sketches module
+
+:license: released under the terms of the MIT license.
+For more information see LICENSE or README files, or
+https://opensource.org/licenses/MIT.
+"""
+
+import pickle
+import random
+import unittest
+from functools import partial
+
+from statsdmetrics.sketches import DDSketch, HyperLogLog, percentile_name
+from statsdmetrics.server.aggregation import Aggregator, TimerSamples
+from . import BaseTestCase
+
+
+class TestDDSketch(BaseTestCase):
+
+    def setUp(self):
+        self.random = random.Random(7)
+        self.values = [self.random.lognormvariate(3, 1.5) for _ in range(20000)]
+
+    def assertRelativeError(self, estimated, exact, relative_accuracy):
+        self.assertLessEqual(abs(estimated - exact), exact * relative_accuracy + 1e-9)
+
+    def test_init(self):
+        sketch = DDSketch(0.02, 100)
+        self.assertEqual(sketch.relative_accuracy, 0.02)
+        self.assertEqual(sketch.max_bins, 100)
+        self.assertEqual(sketch.bins, 0)
+        self.assertEqual(len(sketch), 0)
+        self.assertRaises(AssertionError, DDSketch, 0)
+        self.assertRaises(AssertionError, DDSketch, 1)
+        self.assertRaises(AssertionError, DDSketch, 0.01, 0)
+
+    def test_percentile_name(self):
+        self.assertEqual(percentile_name(99), "p99")
+        self.assertEqual(percentile_name(99.9), "p99.9")
+
+    def test_stats_of_empty_sketch(self):
+        self.assertEqual(
+            DDSketch().stats((50,)),
+            {'count': 0, 'samples': 0, 'sum': 0, 'min': 0, 'max': 0, 'mean': 0, 'p50': 0}
+        )
+        self.assertEqual(DDSketch().quantile(0.5), 0)
+
+    def test_quantiles_are_within_relative_accuracy(self):
+        percentiles = (1, 25, 50, 90, 99, 99.9, 100)
+        for relative_accuracy in (0.01, 0.05):
+            sketch = DDSketch(relative_accuracy)
+            samples = TimerSamples()
+            for value in self.values:
+                sketch.add(value)
+                samples.add(value)
+            estimated = sketch.stats(percentiles)
+            exact = samples.stats(percentiles)
+            for percentile in percentiles:
+                name = percentile_name(percentile)
+                self.assertRelativeError(estimated[name], exact[name], relative_accuracy)
+            for name in ('count', 'samples', 'min', 'max'):
+                self.assertEqual(estimated[name], exact[name])
+            self.assertAlmostEqual(estimated['sum'], exact['sum'], places=3)
+            self.assertLess(sketch.bins, 1000)
+
+    def test_add_with_sample_rate(self):
+        sketch = DDSketch()
+        sketch.add(10, 0.1)
+        sketch.add(20)
+        self.assertEqual(sketch.count, 11)
+        self.assertEqual(sketch.samples, 2)
+        self.assertEqual(sketch.sum, 30)
+
+    def test_zero_and_negative_values(self):
+        sketch = DDSketch()
+        sketch.update([-100, -10, 0, 0, 10, 100])
+        self.assertEqual(sketch.min, -100)
+        self.assertEqual(sketch.max, 100)
+        self.assertRelativeError(-sketch.quantile(0), 100, 0.01)
+        self.assertRelativeError(-sketch.quantile(0.3), 10, 0.01)
+        self.assertEqual(sketch.quantile(0.5), 0)
+        self.assertRelativeError(sketch.quantile(0.7), 10, 0.01)
+        self.assertEqual(sketch.quantile(1), 100)
+        self.assertRaises(AssertionError, sketch.quantile, 1.1)
+
+    def test_quantiles_are_clamped_to_min_and_max(self):
+        sketch = DDSketch(0.1)
+        sketch.add(10)
+        self.assertEqual(sketch.quantiles([0, 0.5, 1]), [10, 10, 10])
+
+    def test_max_bins_collapses_lowest_bins(self):
+        sketch = DDSketch(0.01, max_bins=400)
+        sketch.update(self.values)
+        self.assertEqual(sketch.bins, 400)
+        self.assertEqual(sketch.samples, len(self.values))
+        exact = sorted(self.values)
+        self.assertRelativeError(sketch.quantile(0.99), exact[int(len(exact) * 0.99) - 1], 0.01)
+        self.assertRelativeError(sketch.quantile(1), exact[-1], 0.01)
+        # the lowest values are merged into the lowest bin that is kept
+        self.assertGreater(sketch.quantile(0.01), exact[int(len(exact) * 0.01) - 1] * 1.01)
+
+    def test_merge(self):
+        merged = DDSketch()
+        whole = DDSketch()
+        for chunk in range(4):
+            sketch = DDSketch()
+            values = self.values[chunk::4]
+            sketch.update(values)
+            self.assertIs(merged.merge(sketch), merged)
+        whole.update(self.values)
+        merged_stats = merged.stats()
+        whole_stats = whole.stats()
+        self.assertAlmostEqual(merged_stats.pop('sum'), whole_stats.pop('sum'), places=3)
+        self.assertAlmostEqual(merged_stats.pop('mean'), whole_stats.pop('mean'), places=6)
+        self.assertEqual(merged_stats, whole_stats)
+        self.assertEqual(DDSketch().merge(DDSketch()).stats(), DDSketch().stats())
+        self.assertRaises(AssertionError, merged.merge, DDSketch(0.05))
+
+    def test_merge_collapses_bins(self):
+        sketch = DDSketch(0.01, max_bins=10)
+        other = DDSketch(0.01, max_bins=1000)
+        other.update(self.values)
+        sketch.merge(other)
+        self.assertLessEqual(sketch.bins, 10)
+        self.assertEqual(sketch.samples, len(self.values))
+
+    def test_pickle(self):
+        sketch = DDSketch(0.02)
+        sketch.update(self.values[:100] + [0, -1])
+        copy = pickle.loads(pickle.dumps(sketch, 2))
+        self.assertEqual(copy.relative_accuracy, 0.02)
+        self.assertEqual(copy.stats(), sketch.stats())
+        copy.add(5)
+        self.assertEqual(copy.samples, sketch.samples + 1)
+
+    def test_repr(self):
+        self.assertEqual(repr(DDSketch(0.02)), "DDSketch(relative_accuracy=0.02, samples=0)")
+
+    def test_timer_factory_of_aggregator(self):
+        aggregator = Aggregator(percentiles=(50, 99), timer_factory=partial(DDSketch, 0.02))
+        aggregator.add_payload(b"\n".join(
+            "query:{}|ms".format(value).encode() for value in range(1, 1001)))
+        aggregates = aggregator.take()
+        other = Aggregator(timer_factory=partial(DDSketch, 0.02))
+        other.add_payload(b"query:2000|ms|@0.5")
+        aggregator.merge(aggregates)
+        aggregator.merge(other.take())
+        stats = aggregator.flush().timers[("query", ())]
+        self.assertEqual(stats['count'], 1002)
+        self.assertEqual(stats['samples'], 1001)
+        self.assertEqual(stats['max'], 2000)
+        self.assertRelativeError(stats['p50'], 501, 0.02)
+        self.assertRelativeError(stats['p99'], 991, 0.02)
+
+
+class TestHyperLogLog(BaseTestCase):
+
+    def assertEstimate(self, sketch, count, errors=3):
+        self.assertLessEqual(abs(len(sketch) - count), count * sketch.relative_error * errors)
+
+    def test_init(self):
+        sketch = HyperLogLog(10)
+        self.assertEqual(sketch.precision, 10)
+        self.assertEqual(sketch.registers, 1024)
+        self.assertAlmostEqual(sketch.relative_error, 0.0325)
+        self.assertEqual(HyperLogLog().registers, 4096)
+        self.assertRaises(AssertionError, HyperLogLog, 3)
+        self.assertRaises(AssertionError, HyperLogLog, 17)
+
+    def test_count_small_sets(self):
+        sketch = HyperLogLog()
+        self.assertEqual(len(sketch), 0)
+        sketch.add("first")
+        sketch.add("first")
+        self.assertEqual(len(sketch), 1)
+        sketch.update(["user{}".format(index) for index in range(50)])
+        self.assertEqual(sketch.count(), 51)
+
+    def test_count_large_sets(self):
+        for precision in (8, 12, 14):
+            sketch = HyperLogLog(precision)
+            sketch.update("user-{}".format(index) for index in range(100000))
+            # duplicates do not change the estimate
+            count = len(sketch)
+            sketch.update("user-{}".format(index) for index in range(1000))
+            self.assertEqual(len(sketch), count)
+            self.assertEstimate(sketch, 100000)
+            self.assertEqual(sketch.registers, 2 ** precision)
+
+    def test_values_of_different_types(self):
+        sketch = HyperLogLog()
+        sketch.update([u"user", b"user", "user"])
+        self.assertEqual(len(sketch), 1)
+        sketch.add(10)
+        sketch.add("10")
+        self.assertEqual(len(sketch), 2)
+        sketch.add(u"\u00e5")
+        self.assertEqual(len(sketch), 3)
+
+    def test_merge(self):
+        first = HyperLogLog()
+        first.update("user-{}".format(index) for index in range(0, 30000))
+        second = HyperLogLog()
+        second.update("user-{}".format(index) for index in range(20000, 50000))
+        union = HyperLogLog()
+        union.update("user-{}".format(index) for index in range(50000))
+        self.assertIs(first.merge(second), first)
+        self.assertEqual(first.count(), union.count())
+        self.assertEstimate(first, 50000)
+        self.assertRaises(AssertionError, first.merge, HyperLogLog(10))
+
+    def test_update_with_sketch_merges(self):
+        sketch = HyperLogLog()
+        sketch.add("first")
+        other = HyperLogLog()
+        other.update(["first", "second"])
+        sketch.update(other)
+        self.assertEqual(len(sketch), 2)
+
+    def test_pickle(self):
+        sketch = HyperLogLog(10)
+        sketch.update(range(1000))
+        copy = pickle.loads(pickle.dumps(sketch, 2))
+        self.assertEqual(copy.precision, 10)
+        self.assertEqual(len(copy), len(sketch))
+        self.assertLess(len(pickle.dumps(sketch, 2)), 1200)
+
+    def test_repr(self):
+        self.assertEqual(repr(HyperLogLog(10)), "HyperLogLog(precision=10)")
+
+    def test_set_factory_of_aggregator(self):
+        aggregator = Aggregator(set_factory=HyperLogLog)
+        aggregator.add_payload(b"\n".join(
+            "users:{}|s".format(index).encode() for index in range(10000)))
+        other = Aggregator(set_factory=HyperLogLog)
+        other.add_payload(b"\n".join(
+            "users:{}|s".format(index).encode() for index in range(5000, 20000)))
+        aggregator.merge(other.take())
+        users = aggregator.flush().sets[("users", ())]
+        self.assertLessEqual(abs(users - 20000), 20000 * HyperLogLog().relative_error * 3)
+
+
+if __name__ == "__main__":
+    unittest.main()